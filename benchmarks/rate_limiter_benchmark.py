@@ -0,0 +1,70 @@
+"""
+NEONPAY rate limiter benchmark
+
+Compares memory use and throughput of the sliding window and GCRA
+rate limiter algorithms under many distinct users.
+
+Usage (from the repository root):
+    PYTHONPATH=. python benchmarks/rate_limiter_benchmark.py [--users N] [--hits N]
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Dict
+
+from neonpay.security import ActionType, RateLimitAlgorithm, RateLimiter
+
+
+def _make_limiter(algorithm: RateLimitAlgorithm) -> RateLimiter:
+    limiter = RateLimiter(algorithm)
+    limiter.set_limit(ActionType.API_CALL, 100, 60)
+    return limiter
+
+
+def _drive(limiter: RateLimiter, users: int, hits: int) -> None:
+    for _ in range(hits):
+        for user_id in range(1, users + 1):
+            limiter.is_allowed(user_id, ActionType.API_CALL)
+
+
+def run(algorithm: RateLimitAlgorithm, users: int, hits: int) -> Dict[str, float]:
+    """Benchmark one algorithm and return its measurements"""
+    # Throughput is measured without tracemalloc, which slows allocations
+    limiter = _make_limiter(algorithm)
+    started = time.perf_counter()
+    _drive(limiter, users, hits)
+    elapsed = time.perf_counter() - started
+
+    limiter = _make_limiter(algorithm)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    _drive(limiter, users, hits)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": users * hits / elapsed,
+        "memory_mb": (current - baseline) / (1024 * 1024),
+        "bytes_per_key": (current - baseline) / max(1, len(limiter)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rate limiter benchmark")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--hits", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {args.hits} API calls (limit 100/60s)")
+    print(f"{'algorithm':<16}{'ops/sec':>14}{'memory MB':>12}{'bytes/key':>12}")
+    for algorithm in RateLimitAlgorithm:
+        result = run(algorithm, args.users, args.hits)
+        print(
+            f"{algorithm.value:<16}{result['ops_per_sec']:>14,.0f}"
+            f"{result['memory_mb']:>12.1f}{result['bytes_per_key']:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -28,8 +28,32 @@ from .backup import (
     SyncManager,
 )
 
+# Pre-checkout validation
+from .checkout import PreCheckoutPipeline, PreCheckoutRequest
+
+# Connection pool
+from .connection_pool import (
+    ConnectionPoolConfig,
+    ConnectionPoolManager,
+    close_connection_pool,
+    get_connection_pool,
+)
+
 # Core classes
-from .core import BotLibrary, NeonPayCore, PaymentResult, PaymentStage, PaymentStatus
+from .core import (
+    BotLibrary,
+    BulkPaymentResult,
+    NeonPayCore,
+    PaymentResult,
+    PaymentStage,
+    PaymentStatus,
+)
+
+# Payment deduplication
+from .dedup import PaymentDeduplicator
+
+# Payment callback dispatch
+from .dispatch import CallbackDispatcher
 
 # Errors
 from .errors import StarsPaymentError  # Legacy compatibility
@@ -38,6 +62,7 @@ from .errors import (
     ConfigurationError,
     NeonPayError,
     PaymentError,
+    RateLimitError,
     ValidationError,
 )
 
@@ -74,11 +99,22 @@ from .notifications import (
 from .payments import NeonStars
 
 # Promotions system
-from .promotions import DiscountType, PromoCode, PromoSystem
+from .promotions import (
+    DiscountType,
+    PromoCampaign,
+    PromoCode,
+    PromoReservation,
+    PromoSystem,
+)
+
+# Outbound scheduler
+from .scheduler import OutboundScheduler, SendPriority
 
 # Security system
+from .ipfilter import IPBlocklist
 from .security import (
     ActionType,
+    RateLimitAlgorithm,
     RateLimiter,
     SecurityEvent,
     SecurityManager,
@@ -86,6 +122,9 @@ from .security import (
     UserSecurityProfile,
 )
 
+# Storage backends
+from .storage import MemoryStorage, SQLiteStorage, StorageBackend
+
 # Subscriptions system
 from .subscriptions import (
     Subscription,
@@ -199,9 +238,14 @@ __all__ = [
     "PaymentResult",
     "PaymentStatus",
     "BotLibrary",
+    "BulkPaymentResult",
+    "PaymentDeduplicator",
+    "CallbackDispatcher",
     # Promotions
     "PromoSystem",
     "PromoCode",
+    "PromoReservation",
+    "PromoCampaign",
     "DiscountType",
     # Subscriptions
     "SubscriptionManager",
@@ -212,10 +256,22 @@ __all__ = [
     # Security
     "SecurityManager",
     "RateLimiter",
+    "RateLimitAlgorithm",
     "SecurityEvent",
     "UserSecurityProfile",
     "ThreatLevel",
     "ActionType",
+    "IPBlocklist",
+    # Storage
+    "StorageBackend",
+    "MemoryStorage",
+    "SQLiteStorage",
+    # Pre-checkout validation
+    "PreCheckoutPipeline",
+    "PreCheckoutRequest",
+    # Outbound scheduler
+    "OutboundScheduler",
+    "SendPriority",
     # Analytics
     "AnalyticsManager",
     "AnalyticsPeriod",
@@ -254,6 +310,11 @@ __all__ = [
     "ConflictResolution",
     "SyncResult",
     "SyncConflict",
+    # Connection pool
+    "ConnectionPoolManager",
+    "ConnectionPoolConfig",
+    "get_connection_pool",
+    "close_connection_pool",
     # Multi-bot Analytics
     "MultiBotAnalyticsManager",
     "MultiBotEvent",
@@ -280,6 +341,7 @@ __all__ = [
     "ConfigurationError",
     "AdapterError",
     "ValidationError",
+    "RateLimitError",
     "StarsPaymentError",
     # Legacy
     "NeonStars",
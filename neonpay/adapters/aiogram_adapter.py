@@ -5,14 +5,15 @@ Supports Aiogram v3.0+ with Telegram Stars payments
 
 import json
 import logging
-from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
 
 if TYPE_CHECKING:
     from aiogram import Bot, Dispatcher
-    from aiogram.types import PreCheckoutQuery, Message
+    from aiogram.types import LabeledPrice, PreCheckoutQuery, Message
 
 from ..core import PaymentAdapter, PaymentResult, PaymentStage, PaymentStatus
 from ..errors import NeonPayError
+from .invoice_cache import InvoiceCache
 
 logger = logging.getLogger(__name__)
 
@@ -30,22 +31,27 @@ class AiogramAdapter(PaymentAdapter):
         self.bot = bot
         self.dispatcher = dispatcher
         self._handlers_setup = False
+        self._invoice_cache = InvoiceCache(self._build_prices)
         # callback теперь async
         self._payment_callback: Optional[Callable[[PaymentResult], Awaitable[None]]] = (
             None
         )
 
+    @staticmethod
+    def _build_prices(stage: PaymentStage) -> List["LabeledPrice"]:
+        """Build the price list shared by every user of a stage"""
+        from aiogram.types import LabeledPrice
+
+        return [LabeledPrice(label=stage.label, amount=stage.price)]
+
     async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
         """Send payment invoice using Aiogram"""
         try:
-            from aiogram.types import LabeledPrice
-
-            prices = [LabeledPrice(label=stage.label, amount=stage.price)]
+            prepared = self._invoice_cache.get(stage)
+            prices = prepared.request
             photo = stage.photo_url if stage.photo_url else None
 
-            payload = json.dumps(
-                {"user_id": user_id, "amount": stage.price, **(stage.payload or {})}
-            )
+            payload = prepared.user_payload(user_id, stage.price, stage.payload or {})
 
             await self.bot.send_invoice(
                 chat_id=user_id,
@@ -91,8 +97,11 @@ class AiogramAdapter(PaymentAdapter):
     ) -> None:
         """Handle pre-checkout query"""
         try:
+            ok, error = await self._check_pre_checkout_query(pre_checkout_query)
             await self.bot.answer_pre_checkout_query(
-                pre_checkout_query_id=pre_checkout_query.id, ok=True
+                pre_checkout_query_id=pre_checkout_query.id,
+                ok=ok,
+                **({} if ok else {"error_message": error}),
             )
         except Exception as e:
             logger.error(f"Error handling pre-checkout query: {e}")
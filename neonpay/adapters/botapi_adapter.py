@@ -7,10 +7,11 @@ import asyncio
 import json
 import logging
 import threading
-from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 
 from ..core import PaymentAdapter, PaymentResult, PaymentStage, PaymentStatus
 from ..errors import NeonPayError
+from .invoice_cache import InvoiceCache
 
 logger = logging.getLogger(__name__)
 
@@ -27,16 +28,20 @@ class BotAPIAdapter(PaymentAdapter):
         """
         self.bot = bot
         self._handlers_setup = False
+        self._invoice_cache = InvoiceCache(self._build_prices)
         self._payment_callback: Optional[
             Callable[[PaymentResult], Union[None, Awaitable[None]]]
         ] = None
 
+    @staticmethod
+    def _build_prices(stage: PaymentStage) -> List[Dict[str, Any]]:
+        """Build the price list shared by every user of a stage"""
+        return [{"label": stage.label, "amount": stage.price}]
+
     async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
         """Send payment invoice using official Bot API"""
-        payload_data = {"user_id": user_id, "amount": stage.price}
-        if stage.payload:
-            payload_data.update(stage.payload)
-        payload = json.dumps(payload_data)
+        prepared = self._invoice_cache.get(stage)
+        payload = prepared.user_payload(user_id, stage.price, stage.payload or {})
 
         try:
             await self._call_async(
@@ -47,7 +52,7 @@ class BotAPIAdapter(PaymentAdapter):
                 payload=payload,
                 provider_token="",  # Empty for Telegram Stars  # nosec B106
                 currency="XTR",
-                prices=[{"label": stage.label, "amount": stage.price}],
+                prices=prepared.request,
                 photo_url=stage.photo_url,
                 start_parameter=stage.start_parameter,
             )
@@ -68,10 +73,12 @@ class BotAPIAdapter(PaymentAdapter):
     async def handle_pre_checkout_query(self, query: Any) -> None:
         """Handle pre-checkout query"""
         try:
+            ok, error = await self._check_pre_checkout_query(query)
             await self._call_async(
                 self.bot.answer_pre_checkout_query,
                 pre_checkout_query_id=query.id,
-                ok=True,
+                ok=ok,
+                **({} if ok else {"error_message": error}),
             )
         except Exception as e:
             logger.error(f"Error handling pre-checkout query: {e}")
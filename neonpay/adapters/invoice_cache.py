@@ -0,0 +1,152 @@
+"""
+NEONPAY Invoice Cache - Pre-encoded invoice parts per payment stage
+Adapters encode the invariant parts of an invoice once per stage and
+splice in only the per-user fields on each send
+"""
+
+import json
+import threading
+import weakref
+from collections import OrderedDict
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from ..core import PaymentStage
+
+# Fields the adapters put in front of the stage payload
+_USER_FIELDS = ("user_id", "amount")
+
+# Payload fields unique to a single send, such as the reservation of a
+# promo code applied to a stage; stages carrying one are never reused
+_PER_SEND_FIELDS = ("promo_reservation",)
+
+
+def _forget(collected: List[int], key: int, _ref: "weakref.ref[Any]") -> None:
+    """Weakref callback queueing the key of a collected stage"""
+    collected.append(key)
+
+
+class PreparedInvoice:
+    """Invariant parts of the invoice for one payment stage"""
+
+    __slots__ = ("request", "payload_json", "_payload_tail", "_fixed_payload")
+
+    def __init__(self, stage: "PaymentStage", request: Any) -> None:
+        payload = stage.payload or {}
+        self.request = request
+        self.payload_json = json.dumps(payload)
+
+        # Encoded payload entries after the per-user fields, e.g. ', "a": 1}'
+        self._payload_tail: Optional[str] = None
+        self._fixed_payload: Optional[str] = None
+        if all(field in payload for field in _USER_FIELDS):
+            # The stage overrides both per-user fields
+            self._fixed_payload = json.dumps(payload)
+        elif not any(field in payload for field in _USER_FIELDS):
+            self._payload_tail = (
+                ", " + self.payload_json[1:] if payload else self.payload_json[1:]
+            )
+
+    def user_payload(self, user_id: int, amount: int, payload: Dict[str, Any]) -> str:
+        """
+        Get the invoice payload for a user
+
+        Same result as ``json.dumps({"user_id": ..., "amount": ..., **payload})``.
+        """
+        if self._fixed_payload is not None:
+            return self._fixed_payload
+        if (
+            self._payload_tail is not None
+            and type(user_id) is int
+            and type(amount) is int
+        ):
+            return f'{{"user_id": {user_id}, "amount": {amount}' + self._payload_tail
+        return json.dumps({"user_id": user_id, "amount": amount, **payload})
+
+
+class InvoiceCache:
+    """
+    Bounded cache of prepared invoices keyed by payment stage
+
+    Payment stages are immutable, so a changed stage is a new object and
+    gets a fresh entry. Entries are dropped when their stage is garbage
+    collected or, least recently used first, when the cache is full.
+    One-off stages derived for a single send, e.g. with a promo code
+    reservation in the payload, are prepared without being cached so they
+    do not evict reusable entries.
+    """
+
+    def __init__(
+        self,
+        build_request: Callable[["PaymentStage"], Any],
+        max_size: int = 1024,
+    ) -> None:
+        if max_size <= 0:
+            raise ValueError("Cache size must be positive")
+
+        self._build_request = build_request
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        # id(stage) -> (weak reference to the stage, prepared invoice)
+        self._entries: "OrderedDict[int, Tuple[weakref.ref, PreparedInvoice]]" = (
+            OrderedDict()
+        )
+        # Keys of collected stages; weakref callbacks must not take the lock
+        self._collected: List[int] = []
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+
+    def get(self, stage: "PaymentStage") -> PreparedInvoice:
+        """Get the prepared invoice for a stage, building it on first use"""
+        payload = stage.payload
+        if payload and any(field in payload for field in _PER_SEND_FIELDS):
+            with self._lock:
+                self._bypassed += 1
+            return PreparedInvoice(stage, self._build_request(stage))
+
+        key = id(stage)
+        with self._lock:
+            entry = self._entries.get(key)
+            # An id can be reused after its stage is collected
+            if entry is not None and entry[0]() is stage:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+
+        prepared = PreparedInvoice(stage, self._build_request(stage))
+        ref = weakref.ref(stage, partial(_forget, self._collected, key))
+        with self._lock:
+            self._purge_collected()
+            self._misses += 1
+            self._entries[key] = (ref, prepared)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return prepared
+
+    def _purge_collected(self) -> None:
+        while self._collected:
+            key = self._collected.pop()
+            entry = self._entries.get(key)
+            # The id may already belong to a newer stage
+            if entry is not None and entry[0]() is None:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all prepared invoices"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            self._purge_collected()
+            return {
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "bypassed": self._bypassed,
+            }
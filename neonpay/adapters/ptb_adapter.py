@@ -98,7 +98,11 @@ class PythonTelegramBotAdapter(PaymentAdapter):
         if not query:
             return
         try:
-            await query.answer(ok=True)
+            ok, error = await self._check_pre_checkout_query(query)
+            if ok:
+                await query.answer(ok=True)
+            else:
+                await query.answer(ok=False, error_message=error)
         except Exception as e:
             logger.error(f"Error handling pre-checkout query: {e}")
 
@@ -4,23 +4,44 @@ Direct API integration without external bot libraries
 """
 
 import asyncio
+import hmac
+import inspect
 import json
 import logging
-from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
 
 import aiohttp
+from aiohttp import web
 
-from ..core import PaymentAdapter, PaymentStage
-from ..errors import NeonPayError
+from ..connection_pool import ConnectionPoolManager, get_connection_pool
+from ..core import PaymentAdapter, PaymentResult, PaymentStage, PaymentStatus
+from ..errors import NeonPayError, RateLimitError
+from .invoice_cache import InvoiceCache
+
+try:
+    import orjson
+
+    _loads: Callable[[Union[str, bytes]], Any] = orjson.loads
+except ImportError:  # pragma: no cover - orjson is optional
+    _loads = json.loads
 
 logger = logging.getLogger(__name__)
 
+# Update types the adapter handles; everything else is not delivered
+_ALLOWED_UPDATES = json.dumps(["message", "pre_checkout_query"])
+
 
 class RawAPIAdapter(PaymentAdapter):
     """Raw Telegram Bot API adapter with enhanced error handling"""
 
     def __init__(
-        self, bot_token: str, webhook_url: Optional[str] = None, timeout: int = 30
+        self,
+        bot_token: str,
+        webhook_url: Optional[str] = None,
+        timeout: int = 30,
+        connection_pool: Optional[ConnectionPoolManager] = None,
+        webhook_secret: Optional[str] = None,
+        max_concurrent_updates: int = 100,
     ) -> None:
         """
         Initialize Raw API adapter
@@ -29,48 +50,85 @@ class RawAPIAdapter(PaymentAdapter):
             bot_token: Telegram bot token
             webhook_url: Optional webhook URL for payment notifications
             timeout: HTTP request timeout in seconds
+            connection_pool: HTTP pool to use (process-wide pool by default)
+            webhook_secret: Secret token Telegram sends with webhook updates;
+                required to receive updates by webhook
+            max_concurrent_updates: Maximum number of updates handled at once
         """
+        if not isinstance(max_concurrent_updates, int) or max_concurrent_updates <= 0:
+            raise ValueError("Max concurrent updates must be a positive integer")
+
         self.bot_token = bot_token
         self.webhook_url = webhook_url
         self.timeout = timeout
         self.api_url = f"https://api.telegram.org/bot{bot_token}"
-        self._session: Optional[aiohttp.ClientSession] = None
+        self._connection_pool = connection_pool or get_connection_pool()
         self._payment_callback: Optional[
             Callable[[Any], Union[None, Awaitable[None]]]
         ] = None
 
         # Configure timeout
         self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._invoice_cache = InvoiceCache(self._build_invoice_data)
+
+        # Update ingestion
+        self.webhook_secret = webhook_secret
+        self._max_concurrent_updates = max_concurrent_updates
+        self._update_slots: Optional[asyncio.Semaphore] = None
+        self._update_tasks: Set["asyncio.Task[None]"] = set()
+        self._polling_task: Optional["asyncio.Task[None]"] = None
+        self._offset = 0
+        self._updates_received = 0
+        self._payments_received = 0
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create aiohttp session"""
-        if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(timeout=self._timeout)
-        return self._session
+        """Get the pooled aiohttp session"""
+        return await self._connection_pool.get_session()
 
     async def _make_api_request(
         self, method: str, data: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Make API request with enhanced error handling"""
+        result_data = await self._request(method, data)
+        if isinstance(result_data, dict):
+            return result_data
+        else:
+            return {}
+
+    async def _request(
+        self,
+        method: str,
+        data: Dict[str, Any],
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ) -> Any:
+        """Call a Bot API method and return its ``result`` as is"""
         session = await self._get_session()
 
         try:
-            async with session.post(f"{self.api_url}/{method}", data=data) as response:
+            async with session.post(
+                f"{self.api_url}/{method}", data=data, timeout=timeout or self._timeout
+            ) as response:
+                if response.status == 429:
+                    # Flood control; the body says how long to back off
+                    self._raise_rate_limit(
+                        await response.json(content_type=None, loads=_loads)
+                    )
+
                 if response.status != 200:
                     raise NeonPayError(f"HTTP {response.status}: {response.reason}")
 
-                result = await response.json()
+                result = await response.json(loads=_loads)
 
                 if not result.get("ok"):
+                    if result.get("error_code") == 429:
+                        self._raise_rate_limit(result)
                     error_msg = result.get("description", "Unknown API error")
                     raise NeonPayError(f"Telegram API error: {error_msg}")
 
-                result_data = result.get("result", {})
-                if isinstance(result_data, dict):
-                    return result_data
-                else:
-                    return {}
+                return result.get("result", {})
 
+        except NeonPayError:
+            raise
         except asyncio.TimeoutError:
             raise NeonPayError("Request timeout. Please try again.")
         except aiohttp.ClientError as e:
@@ -78,6 +136,34 @@ class RawAPIAdapter(PaymentAdapter):
         except Exception as e:
             raise NeonPayError(f"API error: {e}")
 
+    @staticmethod
+    def _raise_rate_limit(result: Any) -> None:
+        """Raise RateLimitError with the ``retry_after`` of a 429 response"""
+        parameters = result.get("parameters") if isinstance(result, dict) else None
+        retry_after = (parameters or {}).get("retry_after", 1)
+        raise RateLimitError(
+            f"Too many requests, retry after {retry_after}s", retry_after=retry_after
+        )
+
+    @staticmethod
+    def _build_invoice_data(stage: PaymentStage) -> Dict[str, Any]:
+        """Build the invoice request fields shared by every user of a stage"""
+        invoice_data = {
+            "title": stage.title,
+            "description": stage.description,
+            "payload": json.dumps(stage.payload),
+            "provider_token": stage.provider_token,
+            "currency": "XTR",
+            "prices": json.dumps([{"label": stage.label, "amount": stage.price * 100}]),
+            "start_parameter": stage.start_parameter,
+        }
+
+        # Add photo if provided
+        if stage.photo_url:
+            invoice_data["photo_url"] = stage.photo_url
+
+        return invoice_data
+
     async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
         """
         Send payment invoice using Telegram Bot API
@@ -90,23 +176,9 @@ class RawAPIAdapter(PaymentAdapter):
             True if invoice was sent successfully
         """
         try:
-            # Prepare invoice data
-            invoice_data = {
-                "chat_id": user_id,
-                "title": stage.title,
-                "description": stage.description,
-                "payload": json.dumps(stage.payload),
-                "provider_token": stage.provider_token,
-                "currency": "XTR",
-                "prices": json.dumps(
-                    [{"label": stage.label, "amount": stage.price * 100}]
-                ),
-                "start_parameter": stage.start_parameter,
-            }
-
-            # Add photo if provided
-            if stage.photo_url:
-                invoice_data["photo_url"] = stage.photo_url
+            # Only the chat differs between users of a stage
+            prepared = self._invoice_cache.get(stage)
+            invoice_data = {"chat_id": user_id, **prepared.request}
 
             # Send invoice
             result = await self._make_api_request("sendInvoice", invoice_data)
@@ -117,6 +189,9 @@ class RawAPIAdapter(PaymentAdapter):
 
             return False
 
+        except RateLimitError:
+            # Left to the caller's scheduler to back off and retry
+            raise
         except Exception as e:
             logger.error(f"Failed to send invoice: {e}")
             return False
@@ -133,6 +208,223 @@ class RawAPIAdapter(PaymentAdapter):
         self._payment_callback = payment_callback
         logger.info("Raw API adapter handlers configured")
 
+    async def process_update(self, update: Dict[str, Any]) -> None:
+        """
+        Handle one Telegram update
+
+        Answers pre-checkout queries and passes successful payments to the
+        payment callback as ``PaymentResult``. Other updates are ignored.
+        """
+        query = update.get("pre_checkout_query")
+        if query:
+            await self._answer_pre_checkout_query(query)
+            return
+
+        message = update.get("message")
+        if message and message.get("successful_payment"):
+            await self._dispatch_payment(message)
+
+    async def _answer_pre_checkout_query(self, query: Dict[str, Any]) -> None:
+        try:
+            ok, error = await self._check_pre_checkout(
+                query["id"],
+                query["from"]["id"],
+                query["total_amount"],
+                query.get("currency", "XTR"),
+                query.get("invoice_payload"),
+            )
+            data = {
+                "pre_checkout_query_id": query["id"],
+                "ok": "true" if ok else "false",
+            }
+            if error:
+                data["error_message"] = error
+            await self._make_api_request("answerPreCheckoutQuery", data)
+        except Exception as e:
+            logger.error(f"Error handling pre-checkout query: {e}")
+
+    @staticmethod
+    def _payment_result(message: Dict[str, Any]) -> PaymentResult:
+        """Build a PaymentResult from a ``successful_payment`` message"""
+        payment = message["successful_payment"]
+        metadata: Dict[str, Any] = {}
+        if payment.get("invoice_payload"):
+            try:
+                payload = _loads(payment["invoice_payload"])
+                if isinstance(payload, dict):
+                    metadata = payload
+            except ValueError:
+                pass
+
+        return PaymentResult(
+            user_id=message["from"]["id"],
+            amount=payment["total_amount"],
+            currency=payment.get("currency", "XTR"),
+            status=PaymentStatus.COMPLETED,
+            transaction_id=payment.get("telegram_payment_charge_id"),
+            metadata=metadata,
+        )
+
+    async def _dispatch_payment(self, message: Dict[str, Any]) -> None:
+        if not self._payment_callback:
+            return
+
+        try:
+            result = self._payment_result(message)
+            self._payments_received += 1
+            maybe_awaitable = self._payment_callback(result)
+            if inspect.isawaitable(maybe_awaitable):
+                await maybe_awaitable
+        except Exception as e:
+            logger.error(f"Error handling successful payment: {e}")
+
+    async def _spawn_update(self, update: Dict[str, Any]) -> "asyncio.Task[None]":
+        """Start handling an update once one of the dispatch slots is free"""
+        if self._update_slots is None:
+            self._update_slots = asyncio.Semaphore(self._max_concurrent_updates)
+        slots = self._update_slots
+
+        await slots.acquire()
+        self._updates_received += 1
+        task = asyncio.ensure_future(self.process_update(update))
+        self._update_tasks.add(task)
+
+        def finished(done: "asyncio.Task[None]") -> None:
+            self._update_tasks.discard(done)
+            slots.release()
+
+        task.add_done_callback(finished)
+        return task
+
+    async def process_updates(self, updates: List[Dict[str, Any]]) -> None:
+        """Handle a batch of updates concurrently and wait for all of them"""
+        tasks = [await self._spawn_update(update) for update in updates]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        """
+        aiohttp handler for Telegram webhook requests
+
+        Replies as soon as the update is dispatched. When all dispatch
+        slots are busy the reply waits, which makes Telegram slow down.
+        Without a webhook secret every request is rejected, as anyone could
+        otherwise post forged payments.
+        """
+        if not self.webhook_secret:
+            logger.error("Rejected webhook update: no webhook secret is configured")
+            return web.Response(text="Unauthorized", status=401)
+
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token.encode(), self.webhook_secret.encode()):
+            return web.Response(text="Unauthorized", status=401)
+
+        try:
+            update = _loads(await request.read())
+        except ValueError:
+            return web.Response(text="Invalid update", status=400)
+        if not isinstance(update, dict):
+            return web.Response(text="Invalid update", status=400)
+
+        await self._spawn_update(update)
+        return web.Response(text="OK")
+
+    def _require_webhook_secret(self) -> str:
+        if not self.webhook_secret:
+            raise ValueError("Webhook secret is required to receive webhook updates")
+        return self.webhook_secret
+
+    def create_webhook_app(self, path: str = "/webhook") -> web.Application:
+        """Create an aiohttp application that receives webhook updates on ``path``"""
+        self._require_webhook_secret()
+        app = web.Application()
+        app.router.add_post(path, self.handle_webhook)
+        return app
+
+    async def set_webhook(
+        self, url: Optional[str] = None, max_connections: int = 40
+    ) -> bool:
+        """Register the webhook URL with Telegram"""
+        url = url or self.webhook_url
+        if not url:
+            raise ValueError("Webhook URL is required")
+
+        data: Dict[str, Any] = {
+            "url": url,
+            "allowed_updates": _ALLOWED_UPDATES,
+            "max_connections": max_connections,
+            "secret_token": self._require_webhook_secret(),
+        }
+        await self._request("setWebhook", data)
+        return True
+
+    def start_polling(self, poll_timeout: int = 30, limit: int = 100) -> None:
+        """
+        Receive updates with ``getUpdates`` long polling in the background
+
+        Each batch is handled concurrently and its offset is committed with
+        the next ``getUpdates`` call, so a crash redelivers at most the
+        batch in progress. Telegram does not deliver updates by polling
+        while a webhook is set.
+        """
+        if self._polling_task and not self._polling_task.done():
+            return
+        if not 1 <= limit <= 100:
+            raise ValueError("Limit must be between 1 and 100")
+        self._polling_task = asyncio.ensure_future(self._poll(poll_timeout, limit))
+
+    async def _poll(self, poll_timeout: int, limit: int) -> None:
+        timeout = aiohttp.ClientTimeout(total=poll_timeout + self.timeout)
+        backoff = 1.0
+        while True:
+            try:
+                updates = await self._request(
+                    "getUpdates",
+                    {
+                        "offset": self._offset,
+                        "timeout": poll_timeout,
+                        "limit": limit,
+                        "allowed_updates": _ALLOWED_UPDATES,
+                    },
+                    timeout=timeout,
+                )
+            except RateLimitError as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except NeonPayError as e:
+                logger.error(f"Polling failed: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+                continue
+
+            backoff = 1.0
+            if not updates:
+                continue
+
+            await self.process_updates(updates)
+            self._offset = updates[-1]["update_id"] + 1
+
+    async def stop_polling(self) -> None:
+        """Stop long polling and confirm the updates already handled"""
+        task = self._polling_task
+        if task is None:
+            return
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        self._polling_task = None
+
+        if self._offset:
+            try:
+                await self._request(
+                    "getUpdates", {"offset": self._offset, "timeout": 0, "limit": 1}
+                )
+            except NeonPayError as e:
+                logger.warning(f"Could not confirm processed updates: {e}")
+
     def get_library_info(self) -> Dict[str, Any]:
         """Get information about the bot library"""
         return {
@@ -141,25 +433,29 @@ class RawAPIAdapter(PaymentAdapter):
             "features": [
                 "Direct API integration",
                 "Webhook support",
+                "Long polling",
                 "Enhanced error handling",
             ],
         }
 
+    def get_update_stats(self) -> Dict[str, Any]:
+        """Get update ingestion statistics"""
+        return {
+            "updates_received": self._updates_received,
+            "payments_received": self._payments_received,
+            "updates_in_progress": len(self._update_tasks),
+            "polling": bool(self._polling_task and not self._polling_task.done()),
+            "offset": self._offset,
+        }
+
     async def close(self) -> None:
-        """Close aiohttp session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
-            logger.info("Raw API adapter session closed")
-
-    def __del__(self) -> None:
-        """Cleanup on deletion"""
-        if hasattr(self, "_session") and self._session and not self._session.closed:
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    asyncio.create_task(self.close())
-                else:
-                    loop.run_until_complete(self.close())
-            except RuntimeError:
-                # No event loop in this context
-                pass
+        """
+        Release adapter resources
+
+        Connections belong to the shared pool, which is closed separately
+        with ``neonpay.connection_pool.close_connection_pool()``.
+        """
+        await self.stop_polling()
+        if self._update_tasks:
+            await asyncio.gather(*self._update_tasks, return_exceptions=True)
+        logger.info("Raw API adapter closed")
@@ -8,13 +8,15 @@ import json
 import logging
 import threading
 from collections.abc import Awaitable, Coroutine
-from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 if TYPE_CHECKING:
     import telebot
+    from telebot.types import LabeledPrice
 
 from ..core import PaymentAdapter, PaymentResult, PaymentStage, PaymentStatus
 from ..errors import NeonPayError
+from .invoice_cache import InvoiceCache
 
 logger = logging.getLogger(__name__)
 
@@ -32,18 +34,23 @@ class TelebotAdapter(PaymentAdapter):
         self.bot = bot
         self._payment_callback: Optional[Callable[[PaymentResult], Any]] = None
         self._handlers_setup = False
+        self._invoice_cache = InvoiceCache(self._build_prices)
+        # Event loop of NeonPayCore; handlers run in pyTelegramBotAPI threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @staticmethod
+    def _build_prices(stage: PaymentStage) -> List["LabeledPrice"]:
+        """Build the price list shared by every user of a stage"""
+        from telebot.types import LabeledPrice
+
+        return [LabeledPrice(label=stage.label, amount=stage.price)]
 
     async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
         """Send payment invoice using pyTelegramBotAPI"""
         try:
-            from telebot.types import LabeledPrice
-
-            payload_data = {"user_id": user_id, "amount": stage.price}
-            if stage.payload:
-                payload_data.update(stage.payload)
-            payload = json.dumps(payload_data)
-
-            prices = [LabeledPrice(label=stage.label, amount=stage.price)]
+            prepared = self._invoice_cache.get(stage)
+            payload = prepared.user_payload(user_id, stage.price, stage.payload or {})
+            prices = prepared.request
 
             self.bot.send_invoice(
                 chat_id=user_id,
@@ -67,6 +74,7 @@ class TelebotAdapter(PaymentAdapter):
         if self._handlers_setup:
             return
         self._payment_callback = payment_callback
+        self._loop = asyncio.get_running_loop()
 
         # Register handlers
         self.bot.pre_checkout_query_handler(func=lambda q: True)(
@@ -78,10 +86,33 @@ class TelebotAdapter(PaymentAdapter):
 
         self._handlers_setup = True
 
+    def _decide_pre_checkout(self, query: Any) -> Tuple[bool, Optional[str]]:
+        """Run the async pre-checkout check from a handler thread"""
+        if self.pre_checkout_handler is None:
+            return True, None
+
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                check = self._check_pre_checkout_query(query)
+                return asyncio.run_coroutine_threadsafe(check, loop).result()
+            # Blocking here would stall the loop the check has to run on
+            logger.warning("Pre-checkout check skipped inside the event loop")
+            return True, None
+        return asyncio.run(self._check_pre_checkout_query(query))
+
     def _handle_pre_checkout_query(self, pre_checkout_query: Any) -> None:
         """Handle pre-checkout query"""
         try:
-            self.bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+            ok, error = self._decide_pre_checkout(pre_checkout_query)
+            if ok:
+                self.bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
+            else:
+                self.bot.answer_pre_checkout_query(
+                    pre_checkout_query.id, ok=False, error_message=error
+                )
         except Exception as e:
             logger.error(f"Error handling pre-checkout query: {e}")
 
@@ -3,17 +3,23 @@ NEONPAY Analytics - Comprehensive analytics and reporting system
 Provides detailed insights into payment performance and user behavior
 """
 
+import heapq
 import json
 import logging
 import time
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from .event_store import ColumnarEventStore, TimeIndexedEvents
+from .hyperloglog import HyperLogLog, precision_for_error
 
 logger = logging.getLogger(__name__)
 
+SessionT = TypeVar("SessionT", bound="UserSession")
+
 
 class AnalyticsPeriod(Enum):
     """Analytics time periods"""
@@ -89,34 +95,330 @@ class ProductPerformance:
     purchases: int = 0
 
 
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+class RollupBucket:
+    """Aggregated analytics for one time bucket"""
+
+    __slots__ = (
+        "start",
+        "event_counts",
+        "revenue",
+        "products",
+        "hourly_revenue",
+        "users",
+    )
+
+    def __init__(self, start: float, track_hours: bool = False) -> None:
+        self.start = start
+        self.event_counts: Dict[str, int] = {}
+        self.revenue = 0
+        # stage_id -> [views, purchases, revenue]
+        self.products: Dict[str, List[int]] = {}
+        # Revenue by local hour of day, kept only for day buckets
+        self.hourly_revenue: Optional[List[int]] = [0] * 24 if track_hours else None
+        # Distinct users sketch, kept when unique user tracking is enabled
+        self.users: Optional[HyperLogLog] = None
+
+
+class TimeSeriesRollups:
+    """
+    Per-minute, per-hour and per-day analytics rollups
+
+    Updated incrementally as events arrive so reports cost O(buckets)
+    instead of O(events). Minute and hour buckets are aligned to UTC, day
+    buckets to local midnight. Queries cover the requested window with the
+    coarsest buckets that fit, so window edges are resolved to the minute
+    (or to the finest level still retained). When unique_users_error_rate
+    is set, every bucket also keeps a HyperLogLog sketch of its users.
+    """
+
+    def __init__(
+        self,
+        minute_retention: int = 2 * DAY,
+        hour_retention: int = 400 * DAY,
+        day_retention: int = 5 * 365 * DAY,
+        unique_users_error_rate: Optional[float] = None,
+    ) -> None:
+        self._users_precision = (
+            precision_for_error(unique_users_error_rate)
+            if unique_users_error_rate is not None
+            else None
+        )
+        # (bucket size, retention, buckets by index)
+        self._levels: List[Tuple[int, int, Dict[int, RollupBucket]]] = [
+            (MINUTE, minute_retention, {}),
+            (HOUR, hour_retention, {}),
+            (DAY, day_retention, {}),
+        ]
+        self._newest: List[int] = [0, 0, 0]
+        # Bucket indices per level as min-heaps, so pruning follows time
+        # order even when late events add buckets out of order
+        self._indices: List[List[int]] = [[], [], []]
+        self._tz_offset = 0
+        self._tz_hour = -1
+
+    def _local_offset(self, timestamp: float) -> int:
+        """UTC offset for timestamp, refreshed once per hour"""
+        hour = int(timestamp // HOUR)
+        if hour != self._tz_hour:
+            self._tz_hour = hour
+            self._tz_offset = time.localtime(timestamp).tm_gmtoff
+        return self._tz_offset
+
+    def add(self, event: "AnalyticsEvent") -> None:
+        """Add an event to all rollup levels"""
+        timestamp = event.timestamp
+        offset = self._local_offset(timestamp)
+        is_payment = event.event_type == "payment_completed"
+        amount = event.amount or 0
+
+        for level, (size, retention, buckets) in enumerate(self._levels):
+            shift = offset if size == DAY else 0
+            index = int((timestamp + shift) // size)
+            newest = self._newest[level]
+            if index > newest:
+                self._newest[level] = newest = index
+                self._prune(level, newest)
+            elif index <= newest - retention // size:
+                continue  # Older than retention
+
+            bucket = buckets.get(index)
+            if bucket is None:
+                bucket = buckets[index] = RollupBucket(
+                    index * size - shift, track_hours=size == DAY
+                )
+                heapq.heappush(self._indices[level], index)
+
+            counts = bucket.event_counts
+            counts[event.event_type] = counts.get(event.event_type, 0) + 1
+
+            if self._users_precision is not None:
+                if bucket.users is None:
+                    bucket.users = HyperLogLog(self._users_precision)
+                bucket.users.add(event.user_id)
+
+            if is_payment:
+                bucket.revenue += amount
+                if bucket.hourly_revenue is not None:
+                    local_hour = int((timestamp + offset) % DAY // HOUR)
+                    bucket.hourly_revenue[local_hour] += amount
+
+            if event.stage_id and event.event_type in (
+                "product_view",
+                "payment_completed",
+            ):
+                product = bucket.products.get(event.stage_id)
+                if product is None:
+                    product = bucket.products[event.stage_id] = [0, 0, 0]
+                if is_payment:
+                    product[1] += 1
+                    product[2] += amount
+                else:
+                    product[0] += 1
+
+    def _prune(self, level: int, newest: int) -> None:
+        """Drop buckets older than the level retention"""
+        size, retention, buckets = self._levels[level]
+        indices = self._indices[level]
+        cutoff = newest - retention // size
+        while indices and indices[0] <= cutoff:
+            del buckets[heapq.heappop(indices)]
+
+    def _retained(self, level: int, index: int) -> bool:
+        size, retention, _ = self._levels[level]
+        return index > self._newest[level] - retention // size
+
+    @property
+    def tracks_unique_users(self) -> bool:
+        """Whether buckets keep distinct user sketches"""
+        return self._users_precision is not None
+
+    def estimate_unique_users(self, start_time: float, end_time: float) -> int:
+        """Estimate distinct users in [start_time, end_time]"""
+        if self._users_precision is None:
+            raise ValueError("Unique user tracking is not enabled")
+
+        users = HyperLogLog(self._users_precision)
+        for bucket in self.query(start_time, end_time):
+            if bucket.users is not None:
+                users.merge(bucket.users)
+        return users.count()
+
+    def query(self, start_time: float, end_time: float) -> List[RollupBucket]:
+        """Get buckets covering [start_time, end_time]"""
+        offset = self._tz_offset
+        minute_buckets = self._levels[0][2]
+        hour_buckets = self._levels[1][2]
+        day_buckets = self._levels[2][2]
+
+        covered: List[RollupBucket] = []
+        current = int(start_time // MINUTE) * MINUTE
+        while current <= end_time:
+            day_index, day_rem = divmod(current + offset, DAY)
+            hour_index, hour_rem = divmod(current, HOUR)
+            minute_index = current // MINUTE
+
+            if day_rem == 0 and current + DAY - 1 <= end_time:
+                size, bucket = DAY, day_buckets.get(day_index)
+            elif hour_rem == 0 and current + HOUR - 1 <= end_time:
+                size, bucket = HOUR, hour_buckets.get(hour_index)
+            elif self._retained(0, minute_index):
+                size, bucket = MINUTE, minute_buckets.get(minute_index)
+            elif self._retained(1, hour_index):
+                size, bucket = HOUR - hour_rem, hour_buckets.get(hour_index)
+            else:
+                size, bucket = DAY - day_rem, day_buckets.get(day_index)
+
+            if bucket is not None:
+                covered.append(bucket)
+            current += size
+
+        return covered
+
+
+class UserSession:
+    """Compact per-user activity record"""
+
+    __slots__ = ("first_seen", "last_seen", "event_count", "total_spent")
+
+    def __init__(self, timestamp: float) -> None:
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.event_count = 0
+        self.total_spent = 0
+
+    def record(self, timestamp: float, amount: Optional[int] = None) -> None:
+        """Record an event for this user"""
+        if timestamp < self.first_seen:
+            self.first_seen = timestamp
+        elif timestamp > self.last_seen:
+            self.last_seen = timestamp
+
+        self.event_count += 1
+        if amount:
+            self.total_spent += amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert session to dictionary"""
+        return {
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "event_count": self.event_count,
+            "total_spent": self.total_spent,
+        }
+
+
+def evict_idle_sessions(sessions: "OrderedDict[Any, SessionT]", cutoff: float) -> int:
+    """
+    Drop sessions not seen since cutoff
+
+    Sessions are kept in least recently active order, so only the front
+    of the mapping needs checking.
+    """
+    evicted = 0
+    while sessions:
+        user_id, session = next(iter(sessions.items()))
+        if session.last_seen >= cutoff:
+            break
+        del sessions[user_id]
+        evicted += 1
+    return evicted
+
+
 class AnalyticsCollector:
     """Collects and stores analytics events"""
 
-    def __init__(self, max_events: int = 100000) -> None:
-        self._events: deque = deque(maxlen=max_events)
-        self._user_sessions: Dict[int, Dict[str, Any]] = {}
+    def __init__(
+        self,
+        max_events: int = 100000,
+        columnar: bool = False,
+        unique_users_error_rate: Optional[float] = None,
+        session_ttl: float = 90 * DAY,
+    ) -> None:
+        if session_ttl <= 0:
+            raise ValueError("Session TTL must be positive")
+
+        # Columnar storage keeps typed arrays instead of event objects
+        self._store: Optional[ColumnarEventStore] = None
+        self._events: Optional[TimeIndexedEvents] = None
+        if columnar:
+            self._store = ColumnarEventStore(max_events)
+        else:
+            self._events = TimeIndexedEvents(max_events)
+        # Sessions inactive for longer than session_ttl are evicted
+        self._user_sessions: "OrderedDict[int, UserSession]" = OrderedDict()
+        # User IDs by the day of their last event, for window queries;
+        # entries left behind by evicted or moved sessions are skipped
+        self._sessions_by_day: Dict[int, Set[int]] = {}
+        self._session_ttl = session_ttl
+        self._newest_timestamp = 0.0
         self._product_views: Dict[str, int] = defaultdict(int)
         self._conversion_funnel: Dict[str, int] = defaultdict(int)
+        self._rollups = TimeSeriesRollups(
+            unique_users_error_rate=unique_users_error_rate
+        )
+
+    @property
+    def rollups(self) -> TimeSeriesRollups:
+        """Incrementally maintained time-series rollups"""
+        return self._rollups
+
+    def get_event_count(self) -> int:
+        """Get number of stored events"""
+        if self._store is not None:
+            return len(self._store)
+        return len(self._events) if self._events is not None else 0
 
     def track_event(self, event: AnalyticsEvent) -> None:
         """Track an analytics event"""
-        self._events.append(event)
+        if self._store is not None:
+            extras: Dict[str, Any] = {}
+            if event.metadata:
+                extras["metadata"] = event.metadata
+            if event.session_id is not None:
+                extras["session_id"] = event.session_id
+            self._store.append(
+                event.timestamp,
+                event.user_id,
+                event.event_type,
+                amount=event.amount,
+                product_id=event.stage_id,
+                extras=extras,
+            )
+        elif self._events is not None:
+            self._events.append(event)
+        self._rollups.add(event)
 
         # Update session data
-        if event.user_id not in self._user_sessions:
-            self._user_sessions[event.user_id] = {
-                "first_seen": event.timestamp,
-                "last_seen": event.timestamp,
-                "events": [],
-                "total_spent": 0,
-            }
-
-        session = self._user_sessions[event.user_id]
-        session["last_seen"] = event.timestamp
-        session["events"].append(event.event_type)
-
-        if event.amount:
-            session["total_spent"] += event.amount
+        session = self._user_sessions.get(event.user_id)
+        previous_day: Optional[int] = None
+        if session is None:
+            session = self._user_sessions[event.user_id] = UserSession(event.timestamp)
+        else:
+            self._user_sessions.move_to_end(event.user_id)
+            previous_day = int(session.last_seen // DAY)
+        session.record(event.timestamp, event.amount)
+
+        day = int(session.last_seen // DAY)
+        if day != previous_day:
+            if previous_day is not None:
+                self._sessions_by_day[previous_day].discard(event.user_id)
+            users = self._sessions_by_day.get(day)
+            if users is None:
+                users = self._sessions_by_day[day] = set()
+            users.add(event.user_id)
+
+        if event.timestamp > self._newest_timestamp:
+            if int(event.timestamp // DAY) != int(self._newest_timestamp // DAY):
+                self._prune_session_days(event.timestamp - self._session_ttl)
+            self._newest_timestamp = event.timestamp
+        evict_idle_sessions(
+            self._user_sessions, self._newest_timestamp - self._session_ttl
+        )
 
         # Track product views
         if event.event_type == "product_view" and event.stage_id:
@@ -125,6 +427,34 @@ class AnalyticsCollector:
         # Track conversion funnel
         self._conversion_funnel[event.event_type] += 1
 
+    def _prune_session_days(self, cutoff: float) -> None:
+        """Drop day index entries older than the session TTL"""
+        oldest_day = int(cutoff // DAY)
+        for day in [day for day in self._sessions_by_day if day < oldest_day]:
+            del self._sessions_by_day[day]
+
+    def iter_active_sessions(
+        self, start_time: float
+    ) -> Iterator[Tuple[int, UserSession]]:
+        """
+        Get (user ID, session) of users active since start_time
+
+        Only the days covered by the window are visited, so the cost is
+        proportional to the active users, not all tracked users.
+        """
+        first_day = int(start_time // DAY)
+        for day, user_ids in list(self._sessions_by_day.items()):
+            if day < first_day:
+                continue
+            for user_id in user_ids:
+                session = self._user_sessions.get(user_id)
+                if (
+                    session is not None
+                    and session.last_seen >= start_time
+                    and int(session.last_seen // DAY) == day
+                ):
+                    yield user_id, session
+
     def get_events(
         self,
         start_time: Optional[float] = None,
@@ -132,16 +462,33 @@ class AnalyticsCollector:
         event_type: Optional[str] = None,
     ) -> List[AnalyticsEvent]:
         """Get filtered events"""
-        events = list(self._events)
-
-        if start_time:
-            events = [e for e in events if e.timestamp >= start_time]
-        if end_time:
-            events = [e for e in events if e.timestamp <= end_time]
-        if event_type:
-            events = [e for e in events if e.event_type == event_type]
-
-        return events
+        if self._store is not None:
+            return [
+                AnalyticsEvent(
+                    event_type=event_type,
+                    user_id=user_id,
+                    amount=amount,
+                    stage_id=stage_id,
+                    timestamp=timestamp,
+                    **extras,
+                )
+                for timestamp, user_id, event_type, amount, stage_id, _, extras in map(
+                    self._store.row,
+                    self._store.select(
+                        start_time=start_time or None,
+                        end_time=end_time or None,
+                        event_type=event_type,
+                    ),
+                )
+            ]
+
+        if self._events is None:
+            return []
+        return self._events.window(
+            start_time=start_time or None,
+            end_time=end_time or None,
+            event_type=event_type or None,
+        )
 
 
 class AnalyticsEngine:
@@ -157,28 +504,33 @@ class AnalyticsEngine:
         end_time = time.time()
         start_time = end_time - (days * 24 * 60 * 60)
 
-        # Get payment events
-        payment_events = self.collector.get_events(
-            start_time=start_time, end_time=end_time, event_type="payment_completed"
-        )
-
-        total_revenue = sum(event.amount or 0 for event in payment_events)
-        total_transactions = len(payment_events)
-        average_transaction = (
-            total_revenue / total_transactions if total_transactions > 0 else 0
-        )
+        total_revenue = 0
+        total_transactions = 0
 
-        # Calculate daily breakdown
+        # Calculate daily breakdown from rollup buckets
         daily_breakdown: defaultdict[str, int] = defaultdict(int)
         hourly_breakdown: defaultdict[str, int] = defaultdict(int)
 
-        for event in payment_events:
-            date = datetime.fromtimestamp(event.timestamp)
-            daily_key = date.strftime("%Y-%m-%d")
-            hourly_key = date.strftime("%H:00")
+        for bucket in self.collector.rollups.query(start_time, end_time):
+            transactions = bucket.event_counts.get("payment_completed", 0)
+            if not transactions:
+                continue
 
-            daily_breakdown[daily_key] += event.amount or 0
-            hourly_breakdown[hourly_key] += event.amount or 0
+            total_revenue += bucket.revenue
+            total_transactions += transactions
+
+            date = datetime.fromtimestamp(bucket.start)
+            daily_breakdown[date.strftime("%Y-%m-%d")] += bucket.revenue
+            if bucket.hourly_revenue is None:
+                hourly_breakdown[date.strftime("%H:00")] += bucket.revenue
+            else:
+                for hour, revenue in enumerate(bucket.hourly_revenue):
+                    if revenue:
+                        hourly_breakdown[f"{hour:02d}:00"] += revenue
+
+        average_transaction = (
+            total_revenue / total_transactions if total_transactions > 0 else 0
+        )
 
         return RevenueData(
             total_revenue=total_revenue,
@@ -198,24 +550,29 @@ class AnalyticsEngine:
         end_time = time.time()
         start_time = end_time - (days * 24 * 60 * 60)
 
-        # Get all events in period
-        all_events = self.collector.get_events(start_time=start_time, end_time=end_time)
+        # Analyze funnel from rollup buckets
+        funnel_steps: defaultdict[str, int] = defaultdict(int)
+        for bucket in self.collector.rollups.query(start_time, end_time):
+            for event_type, count in bucket.event_counts.items():
+                funnel_steps[event_type] += count
 
-        # Count unique visitors
-        unique_visitors = len(set(event.user_id for event in all_events))
+        if self.collector.rollups.tracks_unique_users:
+            unique_visitors = self.collector.rollups.estimate_unique_users(
+                start_time, end_time
+            )
+        else:
+            # Users whose latest event falls in the window are the unique visitors
+            unique_visitors = sum(
+                1 for _ in self.collector.iter_active_sessions(start_time)
+            )
 
         # Count purchases
-        purchases = len([e for e in all_events if e.event_type == "payment_completed"])
+        purchases = funnel_steps.get("payment_completed", 0)
 
         conversion_rate = (
             (purchases / unique_visitors * 100) if unique_visitors > 0 else 0
         )
 
-        # Analyze funnel
-        funnel_steps: defaultdict[str, int] = defaultdict(int)
-        for event in all_events:
-            funnel_steps[event.event_type] += 1
-
         # Calculate drop-off points
         drop_off_points = {}
         if funnel_steps["product_view"] > 0:
@@ -253,33 +610,22 @@ class AnalyticsEngine:
         end_time = time.time()
         start_time = end_time - (days * 24 * 60 * 60)
 
-        # Get product-related events
-        product_events = self.collector.get_events(
-            start_time=start_time, end_time=end_time
-        )
-
         # Group by product
-        product_data: defaultdict[str, dict[str, Any]] = defaultdict(
-            lambda: {"views": 0, "purchases": 0, "revenue": 0, "prices": []}
+        product_data: defaultdict[str, dict[str, int]] = defaultdict(
+            lambda: {"views": 0, "purchases": 0, "revenue": 0}
         )
 
-        for event in product_events:
-            if not event.stage_id:
-                continue
-
-            if event.event_type == "product_view":
-                product_data[event.stage_id]["views"] += 1
-            elif event.event_type == "payment_completed":
-                product_data[event.stage_id]["purchases"] += 1
-                product_data[event.stage_id]["revenue"] += event.amount or 0
-                product_data[event.stage_id]["prices"].append(event.amount or 0)
+        for bucket in self.collector.rollups.query(start_time, end_time):
+            for product_id, (views, purchases, revenue) in bucket.products.items():
+                data = product_data[product_id]
+                data["views"] += views
+                data["purchases"] += purchases
+                data["revenue"] += revenue
 
         # Convert to ProductPerformance objects
         performance_list = []
         for product_id, data in product_data.items():
-            avg_price = (
-                sum(data["prices"]) / len(data["prices"]) if data["prices"] else 0
-            )
+            avg_price = data["revenue"] / data["purchases"] if data["purchases"] else 0
             conversion_rate = (
                 (data["purchases"] / data["views"] * 100) if data["views"] > 0 else 0
             )
@@ -309,18 +655,10 @@ class AnalyticsEngine:
         start_time = end_time - (days * 24 * 60 * 60)
 
         # Get user sessions
-        active_users = []
-        for user_id, session in self.collector._user_sessions.items():
-            if session["last_seen"] >= start_time:
-                active_users.append(
-                    {
-                        "user_id": user_id,
-                        "first_seen": session["first_seen"],
-                        "last_seen": session["last_seen"],
-                        "total_spent": session["total_spent"],
-                        "event_count": len(session["events"]),
-                    }
-                )
+        active_users = [
+            {"user_id": user_id, **session.to_dict()}
+            for user_id, session in self.collector.iter_active_sessions(start_time)
+        ]
 
         # Calculate metrics
         total_users = len(active_users)
@@ -434,9 +772,21 @@ class AnalyticsDashboard:
 class AnalyticsManager:
     """Main analytics manager for NEONPAY"""
 
-    def __init__(self, enable_analytics: bool = True) -> None:
+    def __init__(
+        self,
+        enable_analytics: bool = True,
+        columnar_storage: bool = False,
+        unique_users_error_rate: Optional[float] = None,
+    ) -> None:
         self.enabled = enable_analytics
-        self.collector = AnalyticsCollector() if enable_analytics else None
+        self.collector = (
+            AnalyticsCollector(
+                columnar=columnar_storage,
+                unique_users_error_rate=unique_users_error_rate,
+            )
+            if enable_analytics
+            else None
+        )
         self.engine = (
             AnalyticsEngine(self.collector) if self.collector is not None else None
         )
@@ -525,7 +875,7 @@ class AnalyticsManager:
 
         return {
             "enabled": True,
-            "total_events": len(self.collector._events),
+            "total_events": self.collector.get_event_count(),
             "active_users": len(self.collector._user_sessions),
             "tracked_products": len(self.collector._product_views),
             "conversion_funnel_steps": len(self.collector._conversion_funnel),
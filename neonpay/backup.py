@@ -186,7 +186,10 @@ class DataCollector:
                 ]
 
                 # Collect user sessions
-                data["user_sessions"] = dict(collector._user_sessions)
+                data["user_sessions"] = {
+                    user_id: session.to_dict()
+                    for user_id, session in collector._user_sessions.items()
+                }
                 # Collect product views
                 data["product_views"] = dict(collector._product_views)
                 # Collect conversion funnel
@@ -393,20 +396,13 @@ class BackupManager:
 
             # Restore payment stages
             if "payment_data" in data and "payment_stages" in data["payment_data"]:
-                for stage_id, stage_data in data["payment_data"][
-                    "payment_stages"
-                ].items():
-                    from .core import PaymentStage
-
-                    stage = PaymentStage(
-                        title=stage_data["title"],
-                        description=stage_data["description"],
-                        price=stage_data["price"],
-                        label=stage_data["label"],
-                        photo_url=stage_data["photo_url"],
-                        payload=stage_data["payload"],
-                        start_parameter=stage_data["start_parameter"],
-                    )
+                from .core import PaymentStage
+
+                # Backups hold stages that were validated when created
+                stages = PaymentStage.load_many(
+                    data["payment_data"]["payment_stages"], trusted=True
+                )
+                for stage_id, stage in stages.items():
                     self.neonpay.create_payment_stage(stage_id, stage)
 
             # Restore promo codes
@@ -566,20 +562,13 @@ class SyncManager:
                 "payment_data" in imported_data
                 and "payment_stages" in imported_data["payment_data"]
             ):
-                for stage_id, stage_data in imported_data["payment_data"][
-                    "payment_stages"
-                ].items():
-                    from .core import PaymentStage
-
-                    stage = PaymentStage(
-                        title=stage_data["title"],
-                        description=stage_data["description"],
-                        price=stage_data["price"],
-                        label=stage_data["label"],
-                        photo_url=stage_data["photo_url"],
-                        payload=stage_data["payload"],
-                        start_parameter=stage_data["start_parameter"],
-                    )
+                from .core import PaymentStage
+
+                # Import files may have been edited by hand, so validate them
+                stages = PaymentStage.load_many(
+                    imported_data["payment_data"]["payment_stages"], trusted=False
+                )
+                for stage_id, stage in stages.items():
                     self.neonpay.create_payment_stage(stage_id, stage)
 
             logger.info("Data imported successfully")
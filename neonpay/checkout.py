@@ -0,0 +1,284 @@
+"""
+NEONPAY Checkout - Pre-checkout validation pipeline
+Answers Telegram pre-checkout queries within a latency budget by running
+registered validators concurrently under a hard deadline
+"""
+
+import asyncio
+import bisect
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from .security import SecurityManager
+
+logger = logging.getLogger(__name__)
+
+# A validator returns True/None to approve, False to reject, or (ok, message)
+ValidatorResult = Union[bool, None, Tuple[bool, Optional[str]]]
+PreCheckoutValidator = Callable[
+    ["PreCheckoutRequest"], Union[ValidatorResult, Awaitable[ValidatorResult]]
+]
+
+DEFAULT_ERROR_MESSAGE = "Payment could not be confirmed. Please try again later."
+BLOCKED_ERROR_MESSAGE = "Payments are not available for this account."
+
+# Bucket upper bounds in milliseconds; the last bucket is unbounded
+DEFAULT_LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+@dataclass
+class PreCheckoutRequest:
+    """Pre-checkout query to approve or reject"""
+
+    query_id: str
+    user_id: int
+    amount: int
+    currency: str = "XTR"
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+
+    __slots__ = ("_bounds", "_counts", "_count", "_total", "_max")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        if not buckets or list(buckets) != sorted(set(buckets)):
+            raise ValueError("Buckets must be unique and sorted")
+
+        self._bounds = list(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, latency_ms: float) -> None:
+        """Add one observation"""
+        self._counts[bisect.bisect_left(self._bounds, latency_ms)] += 1
+        self._count += 1
+        self._total += latency_ms
+        if latency_ms > self._max:
+            self._max = latency_ms
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given percentile"""
+        if not self._count:
+            return None
+
+        rank = percent / 100 * self._count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count:
+                return self._bounds[index] if index < len(self._bounds) else self._max
+        return self._max
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get counts per bucket and summary statistics"""
+        labels = [f"<={bound}" for bound in self._bounds] + [f">{self._bounds[-1]}"]
+        return {
+            "count": self._count,
+            "mean_ms": self._total / self._count if self._count else 0.0,
+            "max_ms": self._max,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip(labels, self._counts)),
+        }
+
+
+class PreCheckoutPipeline:
+    """
+    Concurrent pre-checkout validation under a hard deadline
+
+    Blocked users are rejected straight away from the security manager's
+    block index. All other queries run every registered validator
+    concurrently; the first rejection wins and cancels the rest. Whatever
+    has not finished after ``timeout`` seconds is cancelled and the query
+    is approved or rejected according to ``approve_on_timeout``, so the
+    answer always goes out well within Telegram's 10 second limit.
+
+    Sync validators run on a pool of ``threads`` worker threads, so a
+    blocking validator is subject to the deadline too; one that overruns
+    is abandoned rather than stopped. With ``threads=0`` they run inline
+    on the event loop, where the deadline cannot interrupt them.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 5.0,
+        approve_on_timeout: bool = False,
+        security: Optional["SecurityManager"] = None,
+        threads: int = 4,
+    ) -> None:
+        if timeout <= 0 or timeout >= 10:
+            raise ValueError("Pre-checkout timeout must be between 0 and 10 seconds")
+        if not isinstance(threads, int) or threads < 0:
+            raise ValueError("Threads must be a non-negative integer")
+
+        self._timeout = timeout
+        self._approve_on_timeout = approve_on_timeout
+        self._security = security
+        self._threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._validators: Dict[str, PreCheckoutValidator] = {}
+
+        self._latency = LatencyHistogram()
+        self._validator_latency: Dict[str, LatencyHistogram] = {}
+        self._approved = 0
+        self._rejected = 0
+        self._blocked = 0
+        self._timeouts = 0
+        self._errors = 0
+
+    def add_validator(
+        self, validator: PreCheckoutValidator, name: Optional[str] = None
+    ) -> None:
+        """Register a sync or async validator"""
+        if not callable(validator):
+            raise ValueError("Validator must be callable")
+
+        name = name or str(getattr(validator, "__name__", repr(validator)))
+        if name in self._validators:
+            raise ValueError(f"Validator '{name}' is already registered")
+
+        self._validators[name] = validator
+        self._validator_latency[name] = LatencyHistogram()
+
+    def remove_validator(self, name: str) -> bool:
+        """Unregister a validator by name"""
+        if self._validators.pop(name, None) is None:
+            return False
+        del self._validator_latency[name]
+        return True
+
+    async def check(self, request: PreCheckoutRequest) -> Tuple[bool, Optional[str]]:
+        """
+        Decide a pre-checkout query
+
+        Returns:
+            (approved, error message shown to the user when rejected)
+        """
+        started = time.perf_counter()
+        try:
+            if self._security and self._security.is_user_blocked(request.user_id):
+                self._blocked += 1
+                return self._finish(False, BLOCKED_ERROR_MESSAGE)
+
+            if not self._validators:
+                return self._finish(True, None)
+
+            return self._finish(*await self._run_validators(request, started))
+        finally:
+            self._latency.record((time.perf_counter() - started) * 1000)
+
+    def _finish(self, ok: bool, error: Optional[str]) -> Tuple[bool, Optional[str]]:
+        if ok:
+            self._approved += 1
+            return True, None
+        self._rejected += 1
+        return False, error or DEFAULT_ERROR_MESSAGE
+
+    async def _run_validators(
+        self, request: PreCheckoutRequest, started: float
+    ) -> Tuple[bool, Optional[str]]:
+        pending = {
+            asyncio.ensure_future(self._run_validator(name, validator, request))
+            for name, validator in self._validators.items()
+        }
+        deadline = started + self._timeout
+        try:
+            while pending:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    ok, error = task.result()
+                    if not ok:
+                        return False, error
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if not pending:
+            return True, None
+
+        self._timeouts += 1
+        logger.warning(
+            f"Pre-checkout validation timed out after {self._timeout}s "
+            f"for user {request.user_id}"
+        )
+        return self._approve_on_timeout, None
+
+    async def _run_validator(
+        self, name: str, validator: PreCheckoutValidator, request: PreCheckoutRequest
+    ) -> Tuple[bool, Optional[str]]:
+        started = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(validator) or not self._threads:
+                outcome = validator(request)
+            else:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._threads,
+                        thread_name_prefix="neonpay-pre-checkout",
+                    )
+                loop = asyncio.get_running_loop()
+                outcome = await loop.run_in_executor(self._executor, validator, request)
+            if inspect.isawaitable(outcome):
+                result: ValidatorResult = await outcome
+            else:
+                result = outcome
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Pre-checkout validator '{name}' failed: {e}")
+            return False, None
+        finally:
+            histogram = self._validator_latency.get(name)
+            if histogram is not None:
+                histogram.record((time.perf_counter() - started) * 1000)
+
+        if isinstance(result, tuple):
+            return bool(result[0]), result[1] if len(result) > 1 else None
+        return result is not False, None
+
+    def close(self) -> None:
+        """Release the validator thread pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pipeline statistics and latency histograms"""
+        return {
+            "validators": list(self._validators),
+            "timeout": self._timeout,
+            "threads": self._threads,
+            "approved": self._approved,
+            "rejected": self._rejected,
+            "blocked": self._blocked,
+            "timeouts": self._timeouts,
+            "validator_errors": self._errors,
+            "latency": self._latency.to_dict(),
+            "validator_latency": {
+                name: histogram.to_dict()
+                for name, histogram in self._validator_latency.items()
+            },
+        }
@@ -0,0 +1,260 @@
+"""
+NEONPAY Connection Pool - Shared HTTP sessions with keep-alive
+Provides a process-wide aiohttp connection pool reused by adapters, sync,
+event collectors, middleware and notifiers
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConnectionPoolConfig:
+    """HTTP connection pool configuration"""
+
+    limit: int = 100  # Total simultaneous connections
+    limit_per_host: int = 30  # Simultaneous connections per host
+    dns_cache_ttl: int = 300  # seconds, 0 disables the DNS cache
+    keepalive_timeout: float = 30.0  # seconds an idle connection is kept open
+    request_timeout: float = 30.0  # seconds, total per request
+    connect_timeout: Optional[float] = 10.0  # seconds to acquire a connection
+    enable_cleanup_closed: bool = True
+
+    def __post_init__(self) -> None:
+        """Validate pool configuration"""
+        if not isinstance(self.limit, int) or self.limit < 0:
+            raise ValueError("Connection limit must be a non-negative integer")
+
+        if not isinstance(self.limit_per_host, int) or self.limit_per_host < 0:
+            raise ValueError("Per-host limit must be a non-negative integer")
+
+        if self.dns_cache_ttl < 0:
+            raise ValueError("DNS cache TTL must be non-negative")
+
+        if self.keepalive_timeout < 0:
+            raise ValueError("Keep-alive timeout must be non-negative")
+
+        if self.request_timeout <= 0:
+            raise ValueError("Request timeout must be positive")
+
+
+class ConnectionPoolManager:
+    """
+    Process-wide HTTP connection pool
+
+    Lazily creates a single ``aiohttp.ClientSession`` backed by a tuned
+    ``TCPConnector`` so every caller shares keep-alive connections and the
+    DNS cache instead of paying a TCP+TLS handshake per request.
+    """
+
+    def __init__(self, config: Optional[ConnectionPoolConfig] = None) -> None:
+        self._config = config or ConnectionPoolConfig()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats: Dict[str, float] = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connection_waits": 0,
+            "total_wait_time": 0.0,
+            "total_connect_time": 0.0,
+        }
+
+    @property
+    def config(self) -> ConnectionPoolConfig:
+        """Current pool configuration"""
+        return self._config
+
+    async def configure(self, config: ConnectionPoolConfig) -> None:
+        """Apply new configuration, closing the current session if any"""
+        await self.close()
+        self._config = config
+        logger.info(
+            f"Connection pool configured: limit={config.limit}, "
+            f"per_host={config.limit_per_host}"
+        )
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Get the shared session, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        session = self._session
+        if session is not None and not session.closed and self._loop is loop:
+            return session
+
+        stale_loop = self._loop
+        # No await between the check and the assignment, so concurrent
+        # callers on the same loop cannot create duplicate sessions
+        self._session = new_session = self._create_session()
+        self._loop = loop
+
+        if session is not None and not session.closed:
+            logger.warning(
+                "Connection pool used from a new event loop; recreating shared session"
+            )
+            await self._close_stale_session(session, stale_loop)
+        return new_session
+
+    @staticmethod
+    async def _close_stale_session(
+        session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        """Close a session created on another event loop"""
+        if loop is not None and loop.is_running():
+            # Owned by a loop running in another thread; close it there
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        try:
+            await session.close()
+        except RuntimeError as e:
+            # Its connections belong to the stopped loop, where their close
+            # is now scheduled; the session itself is already closed
+            logger.debug(f"Stale session closed with pending transports: {e}")
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Create session with pooled connector and stats tracing"""
+        config = self._config
+        connector = aiohttp.TCPConnector(
+            limit=config.limit,
+            limit_per_host=config.limit_per_host,
+            use_dns_cache=config.dns_cache_ttl > 0,
+            ttl_dns_cache=config.dns_cache_ttl or None,
+            keepalive_timeout=config.keepalive_timeout,
+            enable_cleanup_closed=config.enable_cleanup_closed,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config.request_timeout, connect=config.connect_timeout
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[self._create_trace_config()],
+        )
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """Create trace hooks that feed pool statistics"""
+        trace_config = aiohttp.TraceConfig()
+        stats = self._stats
+
+        async def on_request_start(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+        ) -> None:
+            stats["requests"] += 1
+
+        async def on_queued_start(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+        ) -> None:
+            ctx.queued_at = time.monotonic()
+
+        async def on_queued_end(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+        ) -> None:
+            stats["connection_waits"] += 1
+            stats["total_wait_time"] += time.monotonic() - getattr(
+                ctx, "queued_at", time.monotonic()
+            )
+
+        async def on_create_start(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+        ) -> None:
+            ctx.connect_started_at = time.monotonic()
+
+        async def on_create_end(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+        ) -> None:
+            stats["connections_created"] += 1
+            stats["total_connect_time"] += time.monotonic() - getattr(
+                ctx, "connect_started_at", time.monotonic()
+            )
+
+        async def on_reuse(
+            session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+        ) -> None:
+            stats["connections_reused"] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_queued_start.append(on_queued_start)
+        trace_config.on_connection_queued_end.append(on_queued_end)
+        trace_config.on_connection_create_start.append(on_create_start)
+        trace_config.on_connection_create_end.append(on_create_end)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def _open_connections(self) -> Dict[str, int]:
+        """Count idle and in-use connections held by the connector"""
+        if self._session is None or self._session.closed:
+            return {"idle": 0, "in_use": 0}
+
+        connector = self._session.connector
+        # aiohttp does not expose these counters publicly
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        in_use = len(getattr(connector, "_acquired", ()))
+        return {"idle": idle, "in_use": in_use}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get connection pool statistics"""
+        created = int(self._stats["connections_created"])
+        reused = int(self._stats["connections_reused"])
+        acquired = created + reused
+        waits = int(self._stats["connection_waits"])
+        open_connections = self._open_connections()
+
+        return {
+            "session_open": self._session is not None and not self._session.closed,
+            "requests": int(self._stats["requests"]),
+            "open_connections": open_connections["idle"] + open_connections["in_use"],
+            "idle_connections": open_connections["idle"],
+            "in_use_connections": open_connections["in_use"],
+            "connections_created": created,
+            "connections_reused": reused,
+            "reuse_ratio": reused / acquired if acquired else 0.0,
+            "connection_waits": waits,
+            "total_wait_time": self._stats["total_wait_time"],
+            "average_wait_time": (
+                self._stats["total_wait_time"] / waits if waits else 0.0
+            ),
+            "average_connect_time": (
+                self._stats["total_connect_time"] / created if created else 0.0
+            ),
+            "limit": self._config.limit,
+            "limit_per_host": self._config.limit_per_host,
+        }
+
+    async def close(self) -> None:
+        """Close the shared session and release all pooled connections"""
+        session = self._session
+        self._session = None
+        self._loop = None
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info("Connection pool closed")
+
+
+_default_pool = ConnectionPoolManager()
+
+
+def get_connection_pool() -> ConnectionPoolManager:
+    """Get the process-wide connection pool"""
+    return _default_pool
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Get the shared aiohttp session from the process-wide pool"""
+    return await _default_pool.get_session()
+
+
+async def configure_connection_pool(config: ConnectionPoolConfig) -> None:
+    """Reconfigure the process-wide connection pool"""
+    await _default_pool.configure(config)
+
+
+async def close_connection_pool() -> None:
+    """Close the process-wide connection pool (call on shutdown)"""
+    await _default_pool.close()
@@ -7,14 +7,38 @@ import asyncio
 import json
 import logging
 import re
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from dataclasses import MISSING, asdict, dataclass, field, fields
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from urllib.parse import urlparse
 
+from .checkout import (
+    DEFAULT_ERROR_MESSAGE,
+    PreCheckoutPipeline,
+    PreCheckoutRequest,
+    PreCheckoutValidator,
+)
+from .dedup import PaymentDeduplicator
+from .dispatch import CallbackDispatcher
 from .promotions import DiscountType, PromoSystem
+from .scheduler import OutboundScheduler, SendPriority
 from .security import ActionType, SecurityManager, ThreatLevel
+from .storage import PAYMENT_STAGES, StorageBackend
 from .subscriptions import SubscriptionManager, SubscriptionPeriod
 
 logger = logging.getLogger(__name__)
@@ -77,13 +101,20 @@ def validate_json_payload(payload: Any) -> bool:
         return False
 
 
-@dataclass
+# Characters allowed in a start parameter
+_START_PARAMETER_RE = re.compile(r"^[a-zA-Z0-9_]+$")
+
+
+@dataclass(frozen=True)
 class PaymentStage:
     """
     Payment stage configuration
 
     Represents a complete payment setup with all necessary information
-    for processing Telegram Stars payments.
+    for processing Telegram Stars payments. Stages are immutable and
+    validated once; derive variants with ``with_price`` or ``replace``,
+    which only revalidate the fields that change. Treat ``payload`` as
+    read-only, since derived stages share it.
     """
 
     title: str
@@ -97,65 +128,167 @@ class PaymentStage:
 
     def __post_init__(self) -> None:
         """Validate payment stage data with enhanced security"""
-        # Validate price
-        if not isinstance(self.price, int):
-            raise ValueError("Price must be an integer")
+        for name in _VALIDATED_STAGE_FIELDS:
+            self._validate_field(name, getattr(self, name))
 
-        if not (1 <= self.price <= 2500):
-            raise ValueError("Price must be between 1 and 2500 Telegram Stars")
+    @staticmethod
+    def _validate_field(name: str, value: Any) -> None:
+        """Validate a single field, raising ValueError if invalid"""
+        if name == "price":
+            if not isinstance(value, int):
+                raise ValueError("Price must be an integer")
 
-        # Validate title
-        if not isinstance(self.title, str) or not self.title.strip():
-            raise ValueError("Title must be a non-empty string")
+            if not (1 <= value <= 2500):
+                raise ValueError("Price must be between 1 and 2500 Telegram Stars")
 
-        if len(self.title) > 32:
-            raise ValueError("Title must be 32 characters or less")
+        elif name == "title":
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError("Title must be a non-empty string")
 
-        # Validate description
-        if not isinstance(self.description, str) or not self.description.strip():
-            raise ValueError("Description must be a non-empty string")
+            if len(value) > 32:
+                raise ValueError("Title must be 32 characters or less")
 
-        if len(self.description) > 255:
-            raise ValueError("Description must be 255 characters or less")
+        elif name == "description":
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError("Description must be a non-empty string")
 
-        # Validate label
-        if not isinstance(self.label, str) or not self.label.strip():
-            raise ValueError("Label must be a non-empty string")
+            if len(value) > 255:
+                raise ValueError("Description must be 255 characters or less")
 
-        if len(self.label) > 32:
-            raise ValueError("Label must be 32 characters or less")
+        elif name == "label":
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError("Label must be a non-empty string")
 
-        # Validate photo URL
-        if self.photo_url is not None:
-            if not isinstance(self.photo_url, str):
-                raise ValueError("Photo URL must be a string")
+            if len(value) > 32:
+                raise ValueError("Label must be 32 characters or less")
 
-            if not validate_url(self.photo_url):
-                raise ValueError("Photo URL must be a valid URL")
+        elif name == "photo_url":
+            if value is not None:
+                if not isinstance(value, str):
+                    raise ValueError("Photo URL must be a string")
 
-        # Validate payload
-        if self.payload is not None:
-            if not isinstance(self.payload, dict):
-                raise ValueError("Payload must be a dictionary")
+                if not validate_url(value):
+                    raise ValueError("Photo URL must be a valid URL")
 
-            if not validate_json_payload(self.payload):
-                raise ValueError("Payload must be valid JSON and under 1024 bytes")
+        elif name == "payload":
+            if value is not None:
+                if not isinstance(value, dict):
+                    raise ValueError("Payload must be a dictionary")
 
-        # Validate start parameter
-        if (
-            not isinstance(self.start_parameter, str)
-            or not self.start_parameter.strip()
-        ):
-            raise ValueError("Start parameter must be a non-empty string")
+                if not validate_json_payload(value):
+                    raise ValueError("Payload must be valid JSON and under 1024 bytes")
 
-        if len(self.start_parameter) > 64:
-            raise ValueError("Start parameter must be 64 characters or less")
+        elif name == "start_parameter":
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError("Start parameter must be a non-empty string")
 
-        # Validate start parameter format (alphanumeric + underscore only)
-        if not re.match(r"^[a-zA-Z0-9_]+$", self.start_parameter):
-            raise ValueError(
-                "Start parameter can only contain letters, numbers, and underscores"
-            )
+            if len(value) > 64:
+                raise ValueError("Start parameter must be 64 characters or less")
+
+            if not _START_PARAMETER_RE.match(value):
+                raise ValueError(
+                    "Start parameter can only contain letters, numbers, and underscores"
+                )
+
+    @classmethod
+    def _trusted(cls, values: Dict[str, Any]) -> "PaymentStage":
+        """Build a stage from complete field values without validation"""
+        stage = object.__new__(cls)
+        # Frozen dataclasses block setattr, not direct __dict__ updates
+        stage.__dict__.update(values)
+        return stage
+
+    def _evolve(self, **changes: Any) -> "PaymentStage":
+        """Copy with changes, skipping validation"""
+        return self._trusted({**self.__dict__, **changes})
+
+    def replace(self, **changes: Any) -> "PaymentStage":
+        """
+        Create a copy with some fields changed
+
+        Only the changed fields are validated.
+
+        Raises:
+            ValueError: If a field is unknown or a value is invalid
+        """
+        for name, value in changes.items():
+            if name not in _STAGE_FIELD_NAMES:
+                raise ValueError(f"Unknown payment stage field: {name}")
+            self._validate_field(name, value)
+        return self._evolve(**changes)
+
+    def with_price(self, price: int) -> "PaymentStage":
+        """Create a copy with a different price"""
+        self._validate_field("price", price)
+        return self._evolve(price=price)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dictionary"""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], trusted: bool = False) -> "PaymentStage":
+        """
+        Create a payment stage from to_dict() output
+
+        Args:
+            data: Stage fields; missing optional fields take their defaults
+            trusted: Skip validation, for data this library wrote itself
+                (backups, storage, exports)
+        """
+        if not trusted:
+            return cls(**data)
+
+        unknown = data.keys() - _STAGE_FIELD_NAMES
+        if unknown:
+            raise ValueError(f"Unknown payment stage fields: {sorted(unknown)}")
+
+        missing = _REQUIRED_STAGE_FIELDS - data.keys()
+        if missing:
+            raise ValueError(f"Missing payment stage fields: {sorted(missing)}")
+
+        values = {**_STAGE_DEFAULTS, **data}
+        for name, factory in _STAGE_DEFAULT_FACTORIES.items():
+            if name not in values:
+                values[name] = factory()
+        return cls._trusted(values)
+
+    @classmethod
+    def load_many(
+        cls, records: Dict[str, Dict[str, Any]], trusted: bool = True
+    ) -> Dict[str, "PaymentStage"]:
+        """Create stages from a mapping of stage ID to to_dict() output"""
+        return {
+            stage_id: cls.from_dict(data, trusted=trusted)
+            for stage_id, data in records.items()
+        }
+
+
+_STAGE_FIELD_NAMES = frozenset(f.name for f in fields(PaymentStage))
+_VALIDATED_STAGE_FIELDS = (
+    "price",
+    "title",
+    "description",
+    "label",
+    "photo_url",
+    "payload",
+    "start_parameter",
+)
+_REQUIRED_STAGE_FIELDS = frozenset(
+    f.name
+    for f in fields(PaymentStage)
+    if f.default is MISSING and f.default_factory is MISSING
+)
+
+
+_STAGE_DEFAULTS = {
+    f.name: f.default for f in fields(PaymentStage) if f.default is not MISSING
+}
+_STAGE_DEFAULT_FACTORIES = {
+    f.name: f.default_factory
+    for f in fields(PaymentStage)
+    if f.default_factory is not MISSING
+}
 
 
 @dataclass
@@ -206,10 +339,40 @@ class PaymentResult:
         if not isinstance(self.metadata, dict):
             raise ValueError("Metadata must be a dictionary")
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dictionary"""
+        data = asdict(self)
+        data["status"] = self.status.value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PaymentResult":
+        """Create a payment result from to_dict() output"""
+        data = dict(data)
+        if "status" in data:
+            data["status"] = PaymentStatus(data["status"])
+        if data.get("stage") is not None:
+            data["stage"] = PaymentStage.from_dict(data["stage"], trusted=True)
+        return cls(**data)
+
+
+@dataclass
+class BulkPaymentResult:
+    """Per-user outcome of a bulk invoice send"""
+
+    user_id: int
+    success: bool
+    error: Optional[str] = None
+
 
 class PaymentAdapter(ABC):
     """Abstract base class for bot library adapters"""
 
+    # Set by NeonPayCore.setup(); decides pre-checkout queries
+    pre_checkout_handler: Optional[
+        Callable[[PreCheckoutRequest], Awaitable[Tuple[bool, Optional[str]]]]
+    ] = None
+
     @abstractmethod
     async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
         """Send payment invoice to user"""
@@ -227,6 +390,92 @@ class PaymentAdapter(ABC):
         """Get information about the bot library"""
         pass
 
+    async def _check_pre_checkout(
+        self,
+        query_id: Any,
+        user_id: int,
+        amount: int,
+        currency: str,
+        invoice_payload: Optional[str],
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Decide a pre-checkout query with the core pipeline
+
+        Returns (approved, error message); approves when no pipeline is set.
+        """
+        handler = self.pre_checkout_handler
+        if handler is None:
+            return True, None
+
+        payload: Dict[str, Any] = {}
+        if invoice_payload:
+            try:
+                decoded = json.loads(invoice_payload)
+                if isinstance(decoded, dict):
+                    payload = decoded
+            except ValueError:
+                pass
+
+        try:
+            return await handler(
+                PreCheckoutRequest(str(query_id), user_id, amount, currency, payload)
+            )
+        except Exception as e:
+            logger.error(f"Pre-checkout check failed: {e}")
+            return False, DEFAULT_ERROR_MESSAGE
+
+    async def _check_pre_checkout_query(self, query: Any) -> Tuple[bool, Optional[str]]:
+        """Decide a bot library's pre-checkout query object"""
+        if self.pre_checkout_handler is None:
+            return True, None
+        return await self._check_pre_checkout(
+            query.id,
+            query.from_user.id,
+            query.total_amount,
+            query.currency,
+            query.invoice_payload,
+        )
+
+
+class _SendThrottle:
+    """
+    Spaces outgoing invoices to stay under Telegram send limits
+
+    Reserves a global slot every ``1 / global_rate`` seconds and keeps at
+    least ``per_chat_interval`` seconds between invoices to the same chat.
+    """
+
+    _PRUNE_THRESHOLD = 4096
+
+    def __init__(self, global_rate: float, per_chat_interval: float) -> None:
+        self._interval = 1.0 / global_rate
+        self._per_chat_interval = per_chat_interval
+        self._next_slot = 0.0
+        self._chat_next: Dict[int, float] = {}
+
+    async def acquire(self, chat_id: int) -> None:
+        """Wait until an invoice to ``chat_id`` may be sent"""
+        now = time.monotonic()
+        chat_ready = self._chat_next.get(chat_id, now)
+        if chat_ready > now:
+            self._chat_next[chat_id] = chat_ready + self._per_chat_interval
+            await asyncio.sleep(chat_ready - now)
+            now = time.monotonic()
+
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        self._chat_next[chat_id] = max(
+            self._chat_next.get(chat_id, 0.0), slot + self._per_chat_interval
+        )
+
+        if len(self._chat_next) > self._PRUNE_THRESHOLD:
+            self._chat_next = {
+                chat: ready for chat, ready in self._chat_next.items() if ready > now
+            }
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
 
 class NeonPayCore:
     """
@@ -246,6 +495,15 @@ class NeonPayCore:
         enable_subscriptions: bool = True,
         enable_security: bool = True,
         webhook_secret: Optional[str] = None,
+        storage: Optional[StorageBackend] = None,
+        scheduler: Optional[OutboundScheduler] = None,
+        pre_checkout_timeout: float = 5.0,
+        approve_pre_checkout_on_timeout: bool = False,
+        dedup_window: float = 24 * 60 * 60,
+        callback_timeout: Optional[float] = 30.0,
+        callback_threads: int = 8,
+        queue_callbacks: bool = False,
+        callback_workers: int = 4,
     ) -> None:
         self.adapter: PaymentAdapter = adapter
         self.thank_you_message: str = thank_you_message or "Thank you for your payment!"
@@ -254,15 +512,46 @@ class NeonPayCore:
         self._setup_complete: bool = False
         self._enable_logging: bool = enable_logging
         self._max_stages: int = max_stages
+        # Durable state; None keeps everything in memory
+        self._storage: Optional[StorageBackend] = storage
+        # Shapes outbound invoices; None sends them directly
+        self._scheduler: Optional[OutboundScheduler] = scheduler
+
+        if storage:
+            for stage_id, data in storage.load_all(PAYMENT_STAGES):
+                self._payment_stages[stage_id] = PaymentStage.from_dict(
+                    data, trusted=True
+                )
 
         self._promo_system: Optional[PromoSystem] = (
-            PromoSystem() if enable_promotions else None
+            PromoSystem(storage=storage) if enable_promotions else None
         )
         self._subscription_manager: Optional[SubscriptionManager] = (
-            SubscriptionManager() if enable_subscriptions else None
+            SubscriptionManager(storage=storage) if enable_subscriptions else None
         )
         self._security_manager: Optional[SecurityManager] = (
-            SecurityManager(webhook_secret=webhook_secret) if enable_security else None
+            SecurityManager(webhook_secret=webhook_secret, storage=storage)
+            if enable_security
+            else None
+        )
+
+        # Drops redelivered successful_payment updates
+        self._dedup = PaymentDeduplicator(window=dedup_window, storage=storage)
+
+        # Runs on_payment callbacks; in queue mode after acknowledging
+        self._dispatcher = CallbackDispatcher(
+            self._payment_callbacks,
+            timeout=callback_timeout,
+            threads=callback_threads,
+            queue=queue_callbacks,
+            workers=callback_workers,
+            storage=storage,
+        )
+
+        self._pre_checkout = PreCheckoutPipeline(
+            timeout=pre_checkout_timeout,
+            approve_on_timeout=approve_pre_checkout_on_timeout,
+            security=self._security_manager,
         )
 
         if self._enable_logging:
@@ -287,6 +576,8 @@ class NeonPayCore:
                 f"Maximum number of payment stages ({self._max_stages}) reached"
             )
         self._payment_stages[stage_id] = stage
+        if self._storage:
+            self._storage.save(PAYMENT_STAGES, stage_id, stage)
         if self._enable_logging:
             logger.info(f"Created payment stage: {stage_id}")
 
@@ -306,6 +597,8 @@ class NeonPayCore:
             raise ValueError("Stage ID must be a string")
         if stage_id in self._payment_stages:
             del self._payment_stages[stage_id]
+            if self._storage:
+                self._storage.delete(PAYMENT_STAGES, stage_id)
             if self._enable_logging:
                 logger.info(f"Removed payment stage: {stage_id}")
             return True
@@ -315,7 +608,9 @@ class NeonPayCore:
         """Initialize the payment system"""
         if self._setup_complete:
             return
+        self.adapter.pre_checkout_handler = self.check_pre_checkout
         await self.adapter.setup_handlers(self._handle_payment)
+        self._dispatcher.start()
         self._setup_complete = True
         if self._enable_logging:
             logger.info("Payment system initialized")
@@ -328,10 +623,47 @@ class NeonPayCore:
         if self._enable_logging:
             logger.info(f"Payment callback registered: {callback.__name__}")
 
+    def add_pre_checkout_validator(
+        self, validator: PreCheckoutValidator, name: Optional[str] = None
+    ) -> None:
+        """
+        Register a pre-checkout validator
+
+        Validators get a ``PreCheckoutRequest`` and return True (or None) to
+        approve, False to reject, or ``(approved, error_message)``. They may
+        be sync or async; async validators run concurrently.
+        """
+        self._pre_checkout.add_validator(validator, name)
+
+    async def check_pre_checkout(
+        self, request: PreCheckoutRequest
+    ) -> Tuple[bool, Optional[str]]:
+        """Decide a pre-checkout query within the configured time budget"""
+        return await self._pre_checkout.check(request)
+
+    async def _send_invoice(
+        self, user_id: int, stage: PaymentStage, priority: SendPriority
+    ) -> bool:
+        """Send an invoice through the scheduler if one is configured"""
+        if self._scheduler:
+            return await self._scheduler.send_invoice(
+                self.adapter, user_id, stage, priority
+            )
+        return await self.adapter.send_invoice(user_id, stage)
+
     async def send_payment(
-        self, user_id: int, stage_id: str, promo_code: Optional[str] = None
+        self,
+        user_id: int,
+        stage_id: str,
+        promo_code: Optional[str] = None,
+        priority: SendPriority = SendPriority.NORMAL,
     ) -> bool:
-        """Send payment invoice to user with validation and promo code support"""
+        """
+        Send payment invoice to user with validation and promo code support
+
+        ``priority`` picks the scheduler lane; use ``SendPriority.CRITICAL``
+        for renewals so they go out ahead of normal and bulk traffic.
+        """
         if not isinstance(user_id, int) or user_id <= 0:
             raise ValueError("User ID must be a positive integer")
         if not isinstance(stage_id, str) or not stage_id.strip():
@@ -353,39 +685,195 @@ class NeonPayCore:
             logger.error("Payment stage not found")
             return False
 
-        final_price: int = stage.price
-        applied_promo: Optional[Any] = None
-
-        if promo_code and self._promo_system:
-            try:
-                promo_result = self._promo_system.apply_promo_code(
-                    promo_code, user_id, stage.price
-                )
-                final_price = promo_result[0]
-                applied_promo = promo_result[1]
-                logger.info(f"Promo code applied: {stage.price} -> {final_price} Stars")
-            except ValueError as e:
-                logger.warning(f"Promo code validation failed: {e}")
+        if promo_code:
+            discounted_stage = self._apply_promo_code(user_id, stage, promo_code)
+            if discounted_stage is None:
                 return False
-
-        if final_price != stage.price:
-            from copy import deepcopy
-
-            stage = deepcopy(stage)
-            stage.price = final_price
-            if applied_promo:
-                stage.description += f" (Discount applied: {applied_promo.code})"
+            stage = discounted_stage
 
         try:
-            result = await self.adapter.send_invoice(user_id, stage)
+            result = await self._send_invoice(user_id, stage, priority)
             if result:
                 if self._enable_logging:
                     logger.info(f"Payment invoice sent: {stage.price} Stars")
+            else:
+                self._release_promo_reservation(stage)
             return result
         except Exception as e:
             logger.error(f"Failed to send payment invoice: {e}")
+            self._release_promo_reservation(stage)
             return False
 
+    def _apply_promo_code(
+        self, user_id: int, stage: PaymentStage, promo_code: str
+    ) -> Optional[PaymentStage]:
+        """
+        Reserve a promo code use for a single user's invoice
+
+        Returns a discounted copy of the stage whose payload carries the
+        reservation, or None if the promo code was rejected. The use is
+        committed when the payment completes and released if the invoice
+        cannot be sent.
+        """
+        if not self._promo_system:
+            return stage
+
+        success, value = self._promo_system.reserve_promo_code(
+            promo_code, user_id, stage.price
+        )
+        if not success or isinstance(value, str):
+            logger.warning(f"Promo code validation failed: {value}")
+            return None
+
+        final_price = value.discounted_amount
+        logger.info(f"Promo code applied: {stage.price} -> {final_price} Stars")
+
+        # Derived from an already validated stage; no need to check again
+        payload = {
+            **(stage.payload or {}),
+            "promo_code": value.code,
+            "promo_reservation": value.reservation_id,
+        }
+        if final_price == stage.price:
+            return stage._evolve(payload=payload)
+        return stage._evolve(
+            price=final_price,
+            description=f"{stage.description} (Discount applied: {value.code})",
+            payload=payload,
+        )
+
+    def _release_promo_reservation(self, stage: PaymentStage) -> None:
+        """Give back the promo code use reserved for an unsent invoice"""
+        if self._promo_system and stage.payload:
+            reservation_id = stage.payload.get("promo_reservation")
+            if reservation_id:
+                self._promo_system.release_promo_reservation(reservation_id)
+
+    def _commit_promo_reservation(self, result: PaymentResult) -> None:
+        """Record the promo code use of a completed payment"""
+        if not self._promo_system:
+            return
+
+        reservation_id = result.metadata.get("promo_reservation")
+        if not reservation_id:
+            return
+
+        if not self._promo_system.commit_promo_reservation(reservation_id):
+            # Paid after the reservation lapsed; the discount was still granted
+            code = result.metadata.get("promo_code")
+            if code:
+                logger.warning(f"Promo reservation expired before payment: {code}")
+                self._promo_system.record_promo_use(code, result.user_id)
+
+    async def send_payments_bulk(
+        self,
+        user_ids: Union[Iterable[int], AsyncIterable[int]],
+        stage_id: str,
+        promo_code: Optional[str] = None,
+        concurrency: int = 20,
+        global_rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        priority: SendPriority = SendPriority.BULK,
+    ) -> AsyncIterator[BulkPaymentResult]:
+        """
+        Send the same payment stage to many users with bounded concurrency
+
+        Users are consumed lazily from ``user_ids`` and results are yielded as
+        soon as each invoice completes, so memory stays proportional to
+        ``concurrency`` rather than to the audience size.
+
+        Args:
+            user_ids: Iterable or async iterable of Telegram user IDs
+            stage_id: Payment stage to send
+            promo_code: Optional promo code applied per user
+            concurrency: Maximum number of in-flight ``send_invoice`` calls
+            global_rate: Maximum invoices per second across all chats
+            per_chat_interval: Minimum seconds between invoices to one chat
+            priority: Scheduler lane; when a scheduler is configured it
+                shapes the sends and ``global_rate``/``per_chat_interval``
+                are not used
+
+        Yields:
+            BulkPaymentResult for every user, in completion order
+        """
+        if not isinstance(stage_id, str) or not stage_id.strip():
+            raise ValueError("Stage ID is required")
+        if not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError("Concurrency must be a positive integer")
+        if global_rate <= 0:
+            raise ValueError("Global rate must be positive")
+        if per_chat_interval < 0:
+            raise ValueError("Per-chat interval must be non-negative")
+
+        stage = self.get_payment_stage(stage_id)
+        if not stage:
+            raise ValueError(f"Payment stage '{stage_id}' not found")
+
+        if not self._setup_complete:
+            await self.setup()
+
+        throttle = (
+            None if self._scheduler else _SendThrottle(global_rate, per_chat_interval)
+        )
+        pending: Set["asyncio.Task[BulkPaymentResult]"] = set()
+
+        async def send_one(user_id: int) -> BulkPaymentResult:
+            if not isinstance(user_id, int) or user_id <= 0:
+                return BulkPaymentResult(user_id, False, "Invalid user ID")
+            if self._security_manager and self._security_manager.is_user_blocked(
+                user_id
+            ):
+                return BulkPaymentResult(user_id, False, "User is blocked")
+
+            user_stage = stage
+            if promo_code:
+                promo_stage = self._apply_promo_code(user_id, stage, promo_code)
+                if promo_stage is None:
+                    return BulkPaymentResult(user_id, False, "Promo code rejected")
+                user_stage = promo_stage
+
+            if throttle:
+                await throttle.acquire(user_id)
+            try:
+                sent = await self._send_invoice(user_id, user_stage, priority)
+            except Exception as e:
+                self._release_promo_reservation(user_stage)
+                return BulkPaymentResult(user_id, False, str(e))
+            if not sent:
+                self._release_promo_reservation(user_stage)
+            return BulkPaymentResult(
+                user_id, bool(sent), None if sent else "Adapter declined invoice"
+            )
+
+        async def drain() -> AsyncIterator[BulkPaymentResult]:
+            nonlocal pending
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+
+        try:
+            if isinstance(user_ids, AsyncIterable):
+                async for user_id in user_ids:
+                    pending.add(asyncio.ensure_future(send_one(user_id)))
+                    if len(pending) >= concurrency:
+                        async for item in drain():
+                            yield item
+            else:
+                for user_id in user_ids:
+                    pending.add(asyncio.ensure_future(send_one(user_id)))
+                    if len(pending) >= concurrency:
+                        async for item in drain():
+                            yield item
+
+            while pending:
+                async for item in drain():
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+
     def create_promo_code(
         self,
         code: str,
@@ -458,6 +946,15 @@ class NeonPayCore:
 
     async def _handle_payment(self, result: PaymentResult) -> None:
         """Internal payment handler with error handling and enhanced features"""
+        if result.transaction_id and not self._dedup.claim(
+            result.transaction_id, result.user_id
+        ):
+            logger.info(f"Duplicate payment ignored: {result.transaction_id}")
+            return
+
+        # The user has paid the discounted price by now, so the promo use is
+        # settled even if the checks below stop the callbacks
+        self._commit_promo_reservation(result)
         if self._security_manager:
             is_allowed, _ = self._security_manager.check_rate_limit(
                 result.user_id, ActionType.PAYMENT_COMPLETION
@@ -480,16 +977,10 @@ class NeonPayCore:
                     amount=result.amount,
                 )
                 return
+            self._security_manager.record_payment(result.user_id, result.amount)
         if self._enable_logging:
             logger.info(f"Payment completed: {result.amount} Stars")
-        for callback in self._payment_callbacks:
-            try:
-                if asyncio.iscoroutinefunction(callback):
-                    await callback(result)
-                else:
-                    callback(result)
-            except Exception as e:
-                logger.error(f"Error in payment callback {callback.__name__}: {e}")
+        await self._dispatcher.submit(result)
 
     def get_stats(self) -> Dict[str, Any]:
         """Get payment system statistics with enhanced modules"""
@@ -500,6 +991,8 @@ class NeonPayCore:
             "adapter_info": self.adapter.get_library_info(),
             "max_stages": self._max_stages,
             "logging_enabled": self._enable_logging,
+            "dedup": self._dedup.get_stats(),
+            "callbacks": self._dispatcher.get_stats(),
         }
         if self._promo_system:
             stats["promotions"] = self._promo_system.get_stats()
@@ -527,6 +1020,37 @@ class NeonPayCore:
             cleanup_results["subscription_expirations"] = len(expirations)
         return cleanup_results
 
+    async def close(self) -> None:
+        """Finish queued payment callbacks, stop the workers and flush storage"""
+        await self._dispatcher.close()
+        self._pre_checkout.close()
+        self.flush_storage()
+
+    def flush_storage(self) -> None:
+        """Write buffered changes to the storage backend, if any"""
+        if self._storage:
+            self._storage.flush()
+
+    @property
+    def storage(self) -> Optional[StorageBackend]:
+        """Access to storage backend"""
+        return self._storage
+
+    @property
+    def pre_checkout(self) -> PreCheckoutPipeline:
+        """Access to pre-checkout pipeline"""
+        return self._pre_checkout
+
+    @property
+    def dispatcher(self) -> CallbackDispatcher:
+        """Access to payment callback dispatch"""
+        return self._dispatcher
+
+    @property
+    def scheduler(self) -> Optional[OutboundScheduler]:
+        """Access to outbound scheduler"""
+        return self._scheduler
+
     @property
     def promotions(self) -> Optional[PromoSystem]:
         """Access to promotions system"""
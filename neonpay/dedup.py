@@ -0,0 +1,242 @@
+"""
+NEONPAY Dedup - Idempotent payment processing
+Remembers processed Telegram charge IDs so redelivered successful_payment
+updates are dropped before they reach fraud checks and callbacks
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from .storage import PROCESSED_PAYMENTS, StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# False positive rate of the filters in front of storage lookups
+_BLOOM_ERROR_RATE = 0.01
+# Bloom filter generations per retention period of stored IDs
+_STORED_PARTITIONS = 8
+# Stored IDs are kept this long unless the window is longer
+DEFAULT_RETENTION = 7 * 24 * 60 * 60
+
+
+class _BloomFilter:
+    """Bloom filter of strings: no false negatives, rare false positives"""
+
+    __slots__ = ("_bits", "_size", "_hashes", "count")
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._size = max(size, 64)
+        self._hashes = max(round(self._size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self._size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str) -> List[int]:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self._size for i in range(self._hashes)]
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+
+class PaymentDeduplicator:
+    """
+    Bounded set of recently processed payment transaction IDs
+
+    IDs live in time-partitioned sets: ``partitions`` generations, each
+    covering ``window / partitions`` seconds or ``max_entries / partitions``
+    IDs, whichever fills first. A lookup checks every generation, so it
+    costs a fixed number of set probes. Whole generations are dropped once
+    they fall out of ``window`` or when more than ``max_entries`` IDs are
+    held, so memory stays bounded without per-entry expiry.
+
+    With a storage backend, claimed IDs are saved and checked there on a
+    memory miss, which also catches duplicates after a restart or outside
+    the window. Stored IDs are deleted after ``retention`` seconds, by
+    default ``DEFAULT_RETENTION`` or the window if longer. Bloom filters of
+    the retained IDs, one per eighth of that period and filled from storage
+    on start, sit in front of the lookup, so new IDs rarely touch storage;
+    IDs another process stores after that are not seen.
+    """
+
+    def __init__(
+        self,
+        window: float = 24 * 60 * 60,
+        partitions: int = 24,
+        max_entries: int = 1000000,
+        storage: Optional[StorageBackend] = None,
+        retention: Optional[float] = None,
+    ) -> None:
+        if window <= 0:
+            raise ValueError("Dedup window must be positive")
+        if retention is None:
+            retention = max(window, DEFAULT_RETENTION)
+        if retention < window:
+            raise ValueError("Retention must be at least the dedup window")
+        if not isinstance(partitions, int) or partitions <= 0:
+            raise ValueError("Partitions must be a positive integer")
+        if not isinstance(max_entries, int) or max_entries <= 0:
+            raise ValueError("Max entries must be a positive integer")
+
+        self._window = window
+        self._span = window / partitions
+        self._max_entries = max_entries
+        self._generation_size = max(max_entries // partitions, 1)
+        self._storage = storage
+        self._lock = threading.Lock()
+        # (generation start, IDs), oldest first
+        self._generations: Deque[Tuple[float, Set[str]]] = deque()
+        self._size = 0
+        self._duplicates = 0
+        self._evicted = 0
+        self._storage_lookups = 0
+
+        self._retention = retention
+        self._stored_span = retention / _STORED_PARTITIONS
+        self._filter_capacity = max(max_entries // _STORED_PARTITIONS, 1)
+        # (generation start, filter of IDs stored since), oldest first
+        self._stored: Deque[Tuple[float, _BloomFilter]] = deque()
+        self._pruned = 0
+        if storage is not None:
+            self._load_stored(storage, time.time())
+
+    def _load_stored(self, storage: StorageBackend, now: float) -> None:
+        """Delete lapsed stored IDs and fill the filters with the rest"""
+        cutoff = now - self._retention
+        self._pruned += storage.delete_older_than(PROCESSED_PAYMENTS, cutoff)
+        stored = sorted(
+            (record.get("processed_at") or now, transaction_id)
+            for transaction_id, record in storage.load_all(PROCESSED_PAYMENTS)
+        )
+        for processed_at, transaction_id in stored:
+            self._stored_filter(processed_at).add(transaction_id)
+
+    def _rotate(self, now: float) -> Set[str]:
+        """Drop expired generations and get the one to add to"""
+        generations = self._generations
+        while generations and generations[0][0] + self._span <= now - self._window:
+            self._drop_oldest()
+
+        if (
+            not generations
+            or generations[-1][0] + self._span <= now
+            or len(generations[-1][1]) >= self._generation_size
+        ):
+            generations.append((now, set()))
+        return generations[-1][1]
+
+    def _drop_oldest(self) -> None:
+        _, ids = self._generations.popleft()
+        self._size -= len(ids)
+
+    def _stored_filter(self, now: float) -> _BloomFilter:
+        """Drop filters past the retention period and get the one to add to"""
+        stored = self._stored
+        cutoff = now - self._retention
+        expired = False
+        while stored and stored[0][0] + self._stored_span <= cutoff:
+            stored.popleft()
+            expired = True
+        if expired and self._storage is not None:
+            self._pruned += self._storage.delete_older_than(PROCESSED_PAYMENTS, cutoff)
+
+        if (
+            not stored
+            or stored[-1][0] + self._stored_span <= now
+            or stored[-1][1].count >= self._filter_capacity
+        ):
+            # Every filter is probed, so each gets a share of the error rate
+            bloom = _BloomFilter(
+                self._filter_capacity, _BLOOM_ERROR_RATE / _STORED_PARTITIONS
+            )
+            stored.append((now, bloom))
+        return stored[-1][1]
+
+    def _seen_in_memory(self, transaction_id: str) -> bool:
+        for _, ids in reversed(self._generations):
+            if transaction_id in ids:
+                return True
+        return False
+
+    def _seen_in_storage(self, transaction_id: str) -> bool:
+        if self._storage is None:
+            return False
+        if not any(transaction_id in bloom for _, bloom in self._stored):
+            return False
+        self._storage_lookups += 1
+        return self._storage.load(PROCESSED_PAYMENTS, transaction_id) is not None
+
+    def claim(self, transaction_id: str, user_id: Optional[int] = None) -> bool:
+        """
+        Record a transaction ID
+
+        Returns True the first time an ID is claimed and False for duplicates.
+        """
+        now = time.time()
+        with self._lock:
+            current = self._rotate(now)
+            seen = self._seen_in_memory(transaction_id)
+            if seen or self._seen_in_storage(transaction_id):
+                self._duplicates += 1
+                return False
+
+            current.add(transaction_id)
+            self._size += 1
+            if self._storage is not None:
+                self._stored_filter(now).add(transaction_id)
+            while self._size > self._max_entries and len(self._generations) > 1:
+                self._evicted += len(self._generations[0][1])
+                self._drop_oldest()
+
+        if self._storage:
+            self._storage.save(
+                PROCESSED_PAYMENTS,
+                transaction_id,
+                {"user_id": user_id, "processed_at": now},
+                user_id=user_id,
+            )
+        return True
+
+    def is_processed(self, transaction_id: str) -> bool:
+        """Check whether a transaction ID was already claimed"""
+        with self._lock:
+            return self._seen_in_memory(transaction_id) or self._seen_in_storage(
+                transaction_id
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get deduplication statistics"""
+        with self._lock:
+            return {
+                "tracked_ids": self._size,
+                "generations": len(self._generations),
+                "duplicates_dropped": self._duplicates,
+                "capacity_evictions": self._evicted,
+                "window": self._window,
+                "max_entries": self._max_entries,
+                "persistent": self._storage is not None,
+                "retention": self._retention,
+                "storage_lookups": self._storage_lookups,
+                "storage_pruned": self._pruned,
+                "stored_filters": len(self._stored),
+                "filter_bytes": sum(bloom.memory_bytes for _, bloom in self._stored),
+            }
@@ -0,0 +1,229 @@
+"""
+NEONPAY Dispatch - Payment callback fan-out
+Runs on_payment callbacks concurrently and in isolation, so a slow or
+failing callback neither delays the others nor the next payment update
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .checkout import LatencyHistogram
+from .storage import PAYMENT_QUEUE, StorageBackend
+
+if TYPE_CHECKING:
+    from .core import PaymentResult
+
+logger = logging.getLogger(__name__)
+
+PaymentCallback = Callable[["PaymentResult"], Any]
+
+
+def _callback_name(callback: PaymentCallback) -> str:
+    return getattr(callback, "__name__", repr(callback))
+
+
+class CallbackDispatcher:
+    """
+    Concurrent, isolated payment callback dispatch
+
+    Every callback of a payment runs concurrently under its own ``timeout``;
+    errors and timeouts are logged and counted without affecting the
+    others. Sync callbacks run on a pool of ``threads`` worker threads so
+    blocking work such as database writes does not stall the event loop;
+    with ``threads=0`` they run inline as before.
+
+    In queue mode ``submit`` only enqueues the payment and returns, and
+    ``workers`` background tasks run the callbacks. With a storage backend
+    queued payments are saved until their callbacks have run and are
+    replayed by ``start`` after a restart, so delivery is at least once.
+    """
+
+    def __init__(
+        self,
+        callbacks: Sequence[PaymentCallback],
+        timeout: Optional[float] = 30.0,
+        threads: int = 8,
+        queue: bool = False,
+        workers: int = 4,
+        storage: Optional[StorageBackend] = None,
+    ) -> None:
+        if timeout is not None and timeout <= 0:
+            raise ValueError("Callback timeout must be positive")
+        if not isinstance(threads, int) or threads < 0:
+            raise ValueError("Threads must be a non-negative integer")
+        if not isinstance(workers, int) or workers <= 0:
+            raise ValueError("Workers must be a positive integer")
+
+        # Shared with the owner, so callbacks registered later are included
+        self._callbacks = callbacks
+        self._timeout = timeout
+        self._threads = threads
+        self._queue_mode = queue
+        self._worker_count = workers
+        self._storage = storage
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional["asyncio.Queue[Tuple[str, PaymentResult]]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self._dispatched = 0
+        self._errors = 0
+        self._timeouts = 0
+        self._queued = 0
+        self._replayed = 0
+
+    async def submit(self, result: "PaymentResult") -> None:
+        """Run the callbacks of a payment, or queue them in queue mode"""
+        if not self._queue_mode:
+            await self.dispatch(result)
+            return
+
+        self.start()
+        assert self._queue is not None  # nosec B101
+        key = result.transaction_id or uuid.uuid4().hex
+        if self._storage:
+            self._storage.save(
+                PAYMENT_QUEUE,
+                key,
+                {"result": result.to_dict(), "queued_at": time.time()},
+                user_id=result.user_id,
+            )
+        self._queued += 1
+        self._queue.put_nowait((key, result))
+
+    async def dispatch(self, result: "PaymentResult") -> None:
+        """Run all callbacks of a payment concurrently and wait for them"""
+        callbacks = list(self._callbacks)
+        if callbacks:
+            await asyncio.gather(
+                *(self._run(callback, result) for callback in callbacks)
+            )
+        self._dispatched += 1
+
+    async def _run(self, callback: PaymentCallback, result: "PaymentResult") -> None:
+        name = _callback_name(callback)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._call(callback, result), self._timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            logger.error(f"Payment callback {name} timed out after {self._timeout}s")
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Error in payment callback {name}: {e}")
+        finally:
+            histogram = self._latency.get(name)
+            if histogram is None:
+                histogram = self._latency[name] = LatencyHistogram()
+            histogram.record((time.perf_counter() - started) * 1000)
+
+    async def _call(self, callback: PaymentCallback, result: "PaymentResult") -> None:
+        if asyncio.iscoroutinefunction(callback) or not self._threads:
+            outcome = callback(result)
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._threads, thread_name_prefix="neonpay-callback"
+                )
+            loop = asyncio.get_running_loop()
+            outcome = await loop.run_in_executor(self._executor, callback, result)
+        if inspect.isawaitable(outcome):
+            await outcome
+
+    def start(self) -> None:
+        """Start the queue workers and replay saved payments; queue mode only"""
+        if not self._queue_mode or self._workers:
+            return
+
+        self._queue = asyncio.Queue()
+        if self._storage:
+            self._replay_saved()
+        self._workers = [
+            asyncio.ensure_future(self._work()) for _ in range(self._worker_count)
+        ]
+
+    def _replay_saved(self) -> None:
+        from .core import PaymentResult
+
+        assert self._storage is not None and self._queue is not None  # nosec B101
+        saved = sorted(
+            self._storage.load_all(PAYMENT_QUEUE),
+            key=lambda item: item[1].get("queued_at", 0),
+        )
+        for key, record in saved:
+            try:
+                result = PaymentResult.from_dict(record["result"])
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Dropping unreadable queued payment {key}: {e}")
+                self._storage.delete(PAYMENT_QUEUE, key)
+                continue
+            self._queue.put_nowait((key, result))
+            self._replayed += 1
+
+        if self._replayed:
+            logger.info(f"Replaying {self._replayed} queued payments")
+
+    async def _work(self) -> None:
+        assert self._queue is not None  # nosec B101
+        while True:
+            key, result = await self._queue.get()
+            try:
+                await self.dispatch(result)
+            except asyncio.CancelledError:
+                # Left in storage, so it is replayed on the next start
+                self._queue.task_done()
+                raise
+            if self._storage:
+                self._storage.delete(PAYMENT_QUEUE, key)
+            self._queue.task_done()
+
+    async def drain(self) -> None:
+        """Wait until every queued payment has been dispatched"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self, drain: bool = True) -> None:
+        """Stop the queue workers and release the thread pool"""
+        if drain:
+            await self.drain()
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get dispatch statistics and per-callback latency histograms"""
+        return {
+            "timeout": self._timeout,
+            "threads": self._threads,
+            "queue_mode": self._queue_mode,
+            "persistent": self._queue_mode and self._storage is not None,
+            "dispatched": self._dispatched,
+            "callback_errors": self._errors,
+            "callback_timeouts": self._timeouts,
+            "queued": self._queued,
+            "replayed": self._replayed,
+            "backlog": self._queue.qsize() if self._queue is not None else 0,
+            "callback_latency": {
+                name: histogram.to_dict() for name, histogram in self._latency.items()
+            },
+        }
@@ -20,6 +20,7 @@ class ErrorCode(str, Enum):
     adapter_error = "adapter_error"
     validation_error = "validation_error"
     payment_validation_error = "payment_validation_error"
+    rate_limit_error = "rate_limit_error"
 
 
 class NeonPayError(Exception):
@@ -107,6 +108,15 @@ class PaymentValidationError(ValidationError):
         self.code = ErrorCode.payment_validation_error
 
 
+class RateLimitError(AdapterError):
+    """telegram flood control (HTTP 429); retry after ``retry_after`` seconds"""
+
+    def __init__(self, message: str, retry_after: float = 1.0, **kwargs: Any) -> None:
+        super().__init__(message, retry_after=retry_after, **kwargs)
+        self.code = ErrorCode.rate_limit_error
+        self.retry_after = retry_after
+
+
 # mapping codes to classes (for raise_error)
 _ERROR_MAP: Dict[ErrorCode, Type[NeonPayError]] = {
     ErrorCode.payment_error: PaymentError,
@@ -114,6 +124,7 @@ _ERROR_MAP: Dict[ErrorCode, Type[NeonPayError]] = {
     ErrorCode.adapter_error: AdapterError,
     ErrorCode.validation_error: ValidationError,
     ErrorCode.payment_validation_error: PaymentValidationError,
+    ErrorCode.rate_limit_error: RateLimitError,
     ErrorCode.unknown_error: NeonPayError,
 }
 
@@ -153,6 +164,7 @@ __all__ = [
     "AdapterError",
     "ValidationError",
     "PaymentValidationError",
+    "RateLimitError",
     "StarsPaymentError",
     "raise_error",
 ]
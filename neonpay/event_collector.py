@@ -9,7 +9,7 @@ import time
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
-import aiohttp
+from .connection_pool import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -40,29 +40,25 @@ class BotEventCollector:
     async def collect_events(self) -> List[Dict[str, Any]]:
         """Collect events from bot webhook"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.webhook_url}/analytics/events"
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        events = data.get("events", [])
-
-                        # Add bot metadata to events
-                        for event in events:
-                            event["bot_id"] = self.bot_id
-                            event["bot_name"] = self.bot_name
-                            event["collected_at"] = time.time()
-
-                        logger.info(
-                            f"Collected {len(events)} events from {self.bot_name}"
-                        )
-                        return events if isinstance(events, list) else []
-                    else:
-                        logger.warning(
-                            f"Failed to collect events from {self.bot_name}: {response.status}"
-                        )
-                        return []
+            session = await get_http_session()
+            async with session.get(f"{self.webhook_url}/analytics/events") as response:
+                if response.status == 200:
+                    data = await response.json()
+                    events = data.get("events", [])
+
+                    # Add bot metadata to events
+                    for event in events:
+                        event["bot_id"] = self.bot_id
+                        event["bot_name"] = self.bot_name
+                        event["collected_at"] = time.time()
+
+                    logger.info(f"Collected {len(events)} events from {self.bot_name}")
+                    return events if isinstance(events, list) else []
+                else:
+                    logger.warning(
+                        f"Failed to collect events from {self.bot_name}: {response.status}"
+                    )
+                    return []
         except Exception as e:
             logger.error(f"Error collecting events from {self.bot_name}: {e}")
             return []
@@ -83,19 +79,19 @@ class BotEventCollector:
 
         for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        f"{central_url}/analytics/collect", json=payload
-                    ) as response:
-                        if response.status in [200, 201]:
-                            logger.info(
-                                f"Sent {len(events)} events to central analytics from {self.bot_name}"
-                            )
-                            return True
-                        else:
-                            logger.warning(
-                                f"Failed to send events to central analytics: {response.status}"
-                            )
+                session = await get_http_session()
+                async with session.post(
+                    f"{central_url}/analytics/collect", json=payload
+                ) as response:
+                    if response.status in [200, 201]:
+                        logger.info(
+                            f"Sent {len(events)} events to central analytics from {self.bot_name}"
+                        )
+                        return True
+                    else:
+                        logger.warning(
+                            f"Failed to send events to central analytics: {response.status}"
+                        )
 
             except Exception as e:
                 logger.error(
@@ -286,16 +282,14 @@ class RealTimeEventCollector:
     async def _send_to_central(self, event: Dict[str, Any]) -> None:
         """Send event to central analytics"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.central_analytics_url}/analytics/realtime", json=event
-                ) as response:
-                    if response.status in [200, 201]:
-                        logger.debug("Sent real-time event to central analytics")
-                    else:
-                        logger.warning(
-                            f"Failed to send real-time event: {response.status}"
-                        )
+            session = await get_http_session()
+            async with session.post(
+                f"{self.central_analytics_url}/analytics/realtime", json=event
+            ) as response:
+                if response.status in [200, 201]:
+                    logger.debug("Sent real-time event to central analytics")
+                else:
+                    logger.warning(f"Failed to send real-time event: {response.status}")
         except Exception as e:
             logger.error(f"Error sending real-time event: {e}")
 
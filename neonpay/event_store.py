@@ -0,0 +1,482 @@
+"""
+NEONPAY Event Store - Columnar ring buffer for analytics events
+Keeps event fields in typed arrays instead of one object per event
+"""
+
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+PAYMENT_COMPLETED = "payment_completed"
+
+# Amount column value for events tracked without an amount
+_NO_AMOUNT = -1
+
+# (timestamp, user_id, event_type, amount, product_id, bot_id, extras)
+StoredEvent = Tuple[
+    float, int, str, Optional[int], Optional[str], Optional[str], Dict[str, Any]
+]
+
+
+@lru_cache(maxsize=4096)
+def _utc_offset(hour: int) -> int:
+    """Local UTC offset in seconds during the given UTC hour"""
+    return time.localtime(hour * HOUR).tm_gmtoff
+
+
+@lru_cache(maxsize=4096)
+def _date_key(local_day: int) -> str:
+    return datetime.fromtimestamp(local_day * DAY, timezone.utc).strftime("%Y-%m-%d")
+
+
+def local_day(timestamp: float) -> int:
+    """Index of the local calendar day containing timestamp"""
+    return int((timestamp + _utc_offset(int(timestamp // HOUR))) // DAY)
+
+
+def local_date_key(timestamp: float) -> str:
+    """Local calendar date of timestamp as YYYY-MM-DD"""
+    return _date_key(local_day(timestamp))
+
+
+@dataclass
+class EventSummary:
+    """Aggregated metrics over a set of events"""
+
+    total_events: int = 0
+    total_revenue: int = 0
+    total_transactions: int = 0
+    last_activity: Optional[float] = None
+    events_by_type: Dict[str, int] = field(default_factory=dict)
+    revenue_by_product: Dict[str, int] = field(default_factory=dict)
+    revenue_by_day: Dict[str, int] = field(default_factory=dict)
+
+    def add(
+        self,
+        timestamp: float,
+        event_type: str,
+        amount: Optional[int] = None,
+        product_id: Optional[str] = None,
+    ) -> None:
+        """Add a single event to the summary"""
+        self.total_events += 1
+        self.events_by_type[event_type] = self.events_by_type.get(event_type, 0) + 1
+        if self.last_activity is None or timestamp > self.last_activity:
+            self.last_activity = timestamp
+
+        if event_type == PAYMENT_COMPLETED:
+            amount = amount or 0
+            self.total_transactions += 1
+            self.total_revenue += amount
+
+            day = local_date_key(timestamp)
+            self.revenue_by_day[day] = self.revenue_by_day.get(day, 0) + amount
+            if product_id:
+                self.revenue_by_product[product_id] = (
+                    self.revenue_by_product.get(product_id, 0) + amount
+                )
+
+    @classmethod
+    def from_events(
+        cls, events: Iterable[Tuple[float, str, Optional[int], Optional[str]]]
+    ) -> "EventSummary":
+        """Summarize (timestamp, event_type, amount, product_id) tuples"""
+        summary = cls()
+        for timestamp, event_type, amount, product_id in events:
+            summary.add(timestamp, event_type, amount, product_id)
+        return summary
+
+
+class ColumnarEventStore:
+    """
+    Fixed-capacity ring buffer of events stored column by column
+
+    Timestamps, user IDs and amounts live in typed arrays, and the event
+    type, product and bot as interned integer codes. Rarely populated
+    fields such as metadata go to a side table keyed by slot. Once full,
+    the oldest event is overwritten.
+    """
+
+    def __init__(self, capacity: int = 100000) -> None:
+        if capacity <= 0:
+            raise ValueError("Event store capacity must be positive")
+
+        self._capacity = capacity
+        self._timestamps = array("d")
+        # Running maximum of the timestamps in arrival order; equal to the
+        # timestamp except for late events, and always sorted, so it can be
+        # bisected even when late events are present
+        self._order_keys = array("d")
+        self._user_ids = array("q")
+        self._amounts = array("q")
+        self._event_types = array("I")
+        self._products = array("I")
+        self._bots = array("I")
+        self._extras: Dict[int, Dict[str, Any]] = {}
+        self._head = 0  # Slot of the oldest event once the buffer is full
+        # Slots of events appended with a timestamp older than an earlier
+        # event; their order key is later than their timestamp
+        self._late: Set[int] = set()
+        self._newest = float("-inf")
+
+        # Code 0 is reserved for None
+        self._codes: Dict[str, int] = {}
+        self._values: List[Optional[str]] = [None]
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of events kept"""
+        return self._capacity
+
+    def _intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def append(
+        self,
+        timestamp: float,
+        user_id: int,
+        event_type: str,
+        amount: Optional[int] = None,
+        product_id: Optional[str] = None,
+        bot_id: Optional[str] = None,
+        extras: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Append an event, overwriting the oldest one when full"""
+        amount_value = _NO_AMOUNT if amount is None else amount
+        type_code = self._intern(event_type)
+        product_code = self._intern(product_id)
+        bot_code = self._intern(bot_id)
+        order_key = max(timestamp, self._newest)
+
+        if len(self._timestamps) < self._capacity:
+            slot = len(self._timestamps)
+            self._timestamps.append(timestamp)
+            self._order_keys.append(order_key)
+            self._user_ids.append(user_id)
+            self._amounts.append(amount_value)
+            self._event_types.append(type_code)
+            self._products.append(product_code)
+            self._bots.append(bot_code)
+        else:
+            slot = self._head
+            self._head = (slot + 1) % self._capacity
+            self._timestamps[slot] = timestamp
+            self._order_keys[slot] = order_key
+            self._user_ids[slot] = user_id
+            self._amounts[slot] = amount_value
+            self._event_types[slot] = type_code
+            self._products[slot] = product_code
+            self._bots[slot] = bot_code
+            self._extras.pop(slot, None)
+            self._late.discard(slot)
+
+        if timestamp < self._newest:
+            self._late.add(slot)
+        else:
+            self._newest = timestamp
+
+        if extras:
+            self._extras[slot] = extras
+
+    def _position(self, timestamp: float, after: bool = False) -> int:
+        """Bisect the ring's order keys for timestamp, as a logical index"""
+        keys = self._order_keys
+        size = len(keys)
+        head = self._head
+        low, high = 0, size
+        while low < high:
+            middle = (low + high) // 2
+            value = keys[(head + middle) % size]
+            if value < timestamp or (after and value == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _ranges(
+        self, start_time: Optional[float] = None, end_time: Optional[float] = None
+    ) -> List[Tuple[int, int]]:
+        """Physical slot ranges that may hold events in the window, oldest first"""
+        size = len(self._timestamps)
+        head = self._head
+        low = 0 if start_time is None else self._position(start_time)
+        high = size if end_time is None else self._position(end_time, after=True)
+
+        ranges: List[Tuple[int, int]] = []
+        if low < high:
+            first = low + head
+            last = high + head
+            if last <= size:
+                ranges.append((first, last))
+            elif first >= size:
+                ranges.append((first - size, last - size))
+            else:
+                ranges.extend([(first, size), (0, last - size)])
+
+        # A late event's order key is at least its timestamp, so it is never
+        # before low, but it may sit past high; pick those up one by one
+        timestamps = self._timestamps
+        late = sorted(
+            (slot - head) % size
+            for slot in self._late
+            if (slot - head) % size >= high
+            and (start_time is None or timestamps[slot] >= start_time)
+            and (end_time is None or timestamps[slot] <= end_time)
+        )
+        for position in late:
+            slot = (head + position) % size
+            ranges.append((slot, slot + 1))
+        return ranges
+
+    def select(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        event_type: Optional[str] = None,
+        bot_id: Optional[str] = None,
+    ) -> List[int]:
+        """Get slots of matching events, oldest first"""
+        type_code = self._codes.get(event_type) if event_type else 0
+        bot_code = self._codes.get(bot_id) if bot_id else 0
+        if type_code is None or bot_code is None:
+            return []
+
+        timestamps = self._timestamps
+        event_types = self._event_types
+        bots = self._bots
+        return [
+            slot
+            for first, last in self._ranges(start_time, end_time)
+            for slot in range(first, last)
+            if (start_time is None or timestamps[slot] >= start_time)
+            and (end_time is None or timestamps[slot] <= end_time)
+            and (not type_code or event_types[slot] == type_code)
+            and (not bot_code or bots[slot] == bot_code)
+        ]
+
+    def row(self, slot: int) -> StoredEvent:
+        """Decode the event stored in slot"""
+        amount = self._amounts[slot]
+        return (
+            self._timestamps[slot],
+            self._user_ids[slot],
+            self._values[self._event_types[slot]] or "",
+            None if amount == _NO_AMOUNT else amount,
+            self._values[self._products[slot]],
+            self._values[self._bots[slot]],
+            self._extras.get(slot, {}),
+        )
+
+    def summarize(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        bot_id: Optional[str] = None,
+    ) -> EventSummary:
+        """Aggregate matching events in a single pass over the columns"""
+        summary = EventSummary()
+        bot_code = self._codes.get(bot_id) if bot_id else 0
+        if bot_code is None:
+            return summary
+
+        payment_code = self._codes.get(PAYMENT_COMPLETED, -1)
+        type_counts: Dict[int, int] = {}
+        product_revenue: Dict[int, int] = {}
+        day_revenue: Dict[int, int] = {}
+        last_activity: Optional[float] = None
+
+        rows = (
+            row
+            for first, last in self._ranges(start_time, end_time)
+            for row in zip(
+                self._timestamps[first:last],
+                self._event_types[first:last],
+                self._amounts[first:last],
+                self._products[first:last],
+                self._bots[first:last],
+            )
+        )
+        for timestamp, type_code, amount, product_code, event_bot in rows:
+            if bot_code and event_bot != bot_code:
+                continue
+            if start_time is not None and timestamp < start_time:
+                continue
+            if end_time is not None and timestamp > end_time:
+                continue
+
+            type_counts[type_code] = type_counts.get(type_code, 0) + 1
+            if last_activity is None or timestamp > last_activity:
+                last_activity = timestamp
+
+            if type_code == payment_code:
+                amount = max(amount, 0)
+                day = local_day(timestamp)
+                day_revenue[day] = day_revenue.get(day, 0) + amount
+                if product_code:
+                    product_revenue[product_code] = (
+                        product_revenue.get(product_code, 0) + amount
+                    )
+
+        values = self._values
+        summary.total_events = sum(type_counts.values())
+        summary.last_activity = last_activity
+        summary.events_by_type = {
+            values[code] or "": count for code, count in type_counts.items()
+        }
+        summary.total_transactions = type_counts.get(payment_code, 0)
+        summary.total_revenue = sum(day_revenue.values())
+        summary.revenue_by_day = {
+            _date_key(day): revenue for day, revenue in sorted(day_revenue.items())
+        }
+        summary.revenue_by_product = {
+            values[code] or "": revenue for code, revenue in product_revenue.items()
+        }
+        return summary
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics"""
+        columns = (
+            self._timestamps,
+            self._order_keys,
+            self._user_ids,
+            self._amounts,
+            self._event_types,
+            self._products,
+            self._bots,
+        )
+        return {
+            "events": len(self),
+            "capacity": self._capacity,
+            "interned_values": len(self._values) - 1,
+            "events_with_extras": len(self._extras),
+            "late_events": len(self._late),
+            "column_bytes": sum(len(c) * c.itemsize for c in columns),
+        }
+
+
+class _TimeOrderedRun:
+    """Events kept sorted by timestamp with a lazily compacted front"""
+
+    __slots__ = ("events", "timestamps", "start")
+
+    def __init__(self) -> None:
+        self.events: List[Any] = []
+        self.timestamps: List[float] = []
+        self.start = 0
+
+    def __len__(self) -> int:
+        return len(self.events) - self.start
+
+    def add(self, event: Any) -> None:
+        timestamp = event.timestamp
+        timestamps = self.timestamps
+        if len(timestamps) == self.start or timestamp >= timestamps[-1]:
+            timestamps.append(timestamp)
+            self.events.append(event)
+        else:
+            # Late event: insert at its sorted position, after equal timestamps
+            position = bisect_right(timestamps, timestamp, self.start)
+            timestamps.insert(position, timestamp)
+            self.events.insert(position, event)
+
+    def pop_oldest(self) -> Any:
+        event = self.events[self.start]
+        self.events[self.start] = None
+        self.start += 1
+        if self.start >= 1024 and self.start * 2 >= len(self.events):
+            del self.events[: self.start]
+            del self.timestamps[: self.start]
+            self.start = 0
+        return event
+
+    def window(
+        self, start_time: Optional[float] = None, end_time: Optional[float] = None
+    ) -> List[Any]:
+        low = self.start
+        if start_time is not None:
+            low = bisect_left(self.timestamps, start_time, low)
+        high = len(self.timestamps)
+        if end_time is not None:
+            high = bisect_right(self.timestamps, end_time, low)
+        return self.events[low:high]
+
+
+class TimeIndexedEvents:
+    """
+    Bounded event log indexed by timestamp and event type
+
+    Events are kept sorted by timestamp, so time-window queries bisect
+    instead of scanning. Events normally arrive in time order and are
+    appended in O(1); late events are inserted at their sorted position.
+    Each event type has its own secondary index, so a typed query touches
+    only matching events. When full, the event with the oldest timestamp
+    is dropped.
+    """
+
+    def __init__(self, maxlen: int) -> None:
+        if maxlen <= 0:
+            raise ValueError("Event log size must be positive")
+
+        self._maxlen = maxlen
+        self._all = _TimeOrderedRun()
+        self._by_type: Dict[str, _TimeOrderedRun] = {}
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._all.window())
+
+    @property
+    def maxlen(self) -> int:
+        """Maximum number of events kept"""
+        return self._maxlen
+
+    def append(self, event: Any) -> None:
+        """Add an event, dropping the oldest one when full"""
+        self._all.add(event)
+        run = self._by_type.get(event.event_type)
+        if run is None:
+            run = self._by_type[event.event_type] = _TimeOrderedRun()
+        run.add(event)
+
+        if len(self._all) > self._maxlen:
+            oldest = self._all.pop_oldest()
+            # Runs keep equal timestamps in arrival order, so the oldest
+            # event of its type is the one just dropped
+            run = self._by_type[oldest.event_type]
+            run.pop_oldest()
+            if not run:
+                del self._by_type[oldest.event_type]
+
+    def window(
+        self,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        event_type: Optional[str] = None,
+    ) -> List[Any]:
+        """Get events in [start_time, end_time], oldest first"""
+        if event_type is None:
+            return self._all.window(start_time, end_time)
+
+        run = self._by_type.get(event_type)
+        if run is None:
+            return []
+        return run.window(start_time, end_time)
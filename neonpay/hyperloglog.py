@@ -0,0 +1,150 @@
+"""
+NEONPAY HyperLogLog - Approximate distinct counting
+Estimates unique users in fixed memory; sketches merge across time
+buckets and bots
+"""
+
+import math
+from typing import Dict, Optional
+
+_MASK64 = (1 << 64) - 1
+
+# 2 ** -rank for every possible register value
+_INVERSE_POWERS = [2.0**-rank for rank in range(65)]
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+
+def _hash64(value: int) -> int:
+    """SplitMix64 finalizer, spreads sequential IDs over 64 bits"""
+    z = (value + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def precision_for_error(error_rate: float) -> int:
+    """Smallest precision whose standard error is at most error_rate"""
+    if not 0 < error_rate < 1:
+        raise ValueError("Error rate must be between 0 and 1")
+
+    precision = math.ceil(math.log2((1.04 / error_rate) ** 2))
+    return min(max(precision, MIN_PRECISION), MAX_PRECISION)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter for integer IDs
+
+    Uses 2**precision one-byte registers, with a standard error of about
+    1.04 / sqrt(2**precision). Small sketches keep only the registers that
+    are set, so mostly empty time buckets stay cheap.
+    """
+
+    __slots__ = ("_precision", "_sparse", "_registers")
+
+    def __init__(self, precision: int = 12) -> None:
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(
+                f"Precision must be between {MIN_PRECISION} and {MAX_PRECISION}"
+            )
+
+        self._precision = precision
+        self._sparse: Optional[Dict[int, int]] = {}
+        self._registers: Optional[bytearray] = None
+
+    @classmethod
+    def for_error_rate(cls, error_rate: float) -> "HyperLogLog":
+        """Create a sketch with standard error at most error_rate"""
+        return cls(precision_for_error(error_rate))
+
+    @property
+    def precision(self) -> int:
+        """Number of index bits"""
+        return self._precision
+
+    @property
+    def error_rate(self) -> float:
+        """Standard error of the estimate"""
+        return 1.04 / math.sqrt(1 << self._precision)
+
+    def add(self, value: int) -> None:
+        """Add an integer ID"""
+        hashed = _hash64(value)
+        suffix_bits = 64 - self._precision
+        index = hashed >> suffix_bits
+        rank = suffix_bits - (hashed & ((1 << suffix_bits) - 1)).bit_length() + 1
+
+        sparse = self._sparse
+        if sparse is None:
+            registers = self._registers
+            if registers[index] < rank:  # type: ignore[index]
+                registers[index] = rank  # type: ignore[index]
+        elif sparse.get(index, 0) < rank:
+            sparse[index] = rank
+            # Dense registers are smaller once about 1/64 of them are set
+            if len(sparse) > (1 << self._precision) >> 6:
+                self._densify()
+
+    def _densify(self) -> bytearray:
+        if self._registers is None:
+            self._registers = bytearray(1 << self._precision)
+            for index, rank in (self._sparse or {}).items():
+                self._registers[index] = rank
+            self._sparse = None
+        return self._registers
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Merge another sketch into this one"""
+        if other._precision != self._precision:
+            raise ValueError("Cannot merge sketches with different precision")
+
+        if other._sparse is not None:
+            for index, rank in other._sparse.items():
+                if self._sparse is not None:
+                    if self._sparse.get(index, 0) < rank:
+                        self._sparse[index] = rank
+                elif self._registers[index] < rank:  # type: ignore[index]
+                    self._registers[index] = rank  # type: ignore[index]
+            if (
+                self._sparse is not None
+                and len(self._sparse) > (1 << self._precision) >> 6
+            ):
+                self._densify()
+            return
+
+        registers = self._densify()
+        registers[:] = bytes(map(max, registers, other._registers))  # type: ignore[arg-type]
+
+    def copy(self) -> "HyperLogLog":
+        """Create an independent copy"""
+        clone = HyperLogLog(self._precision)
+        if self._sparse is not None:
+            clone._sparse = dict(self._sparse)
+        else:
+            clone._sparse = None
+            clone._registers = bytearray(self._registers)  # type: ignore[arg-type]
+        return clone
+
+    def count(self) -> int:
+        """Estimate the number of distinct IDs added"""
+        size = 1 << self._precision
+        if self._sparse is not None:
+            zeros = size - len(self._sparse)
+            total = zeros + sum(_INVERSE_POWERS[rank] for rank in self._sparse.values())
+        else:
+            registers = self._registers or bytearray(size)
+            zeros = registers.count(0)
+            total = sum(map(_INVERSE_POWERS.__getitem__, registers))
+
+        if size >= 128:
+            alpha = 0.7213 / (1 + 1.079 / size)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[size]
+
+        estimate = alpha * size * size / total
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
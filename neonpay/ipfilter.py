@@ -0,0 +1,206 @@
+"""
+NEONPAY IP Filter - CIDR-aware IP blocklist
+Stores blocked IPv4/IPv6 networks in binary prefix tries, so a whole range
+costs one entry and a lookup walks at most one node per prefix bit
+"""
+
+import ipaddress
+import logging
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from aiohttp import web
+from aiohttp.web import Request, StreamResponse
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+Network = Union[str, IPNetwork]
+Handler = Callable[[Request], Awaitable[StreamResponse]]
+
+
+class _Node:
+    """Prefix trie node; ``blocked`` marks the end of a blocked network"""
+
+    __slots__ = ("children", "blocked")
+
+    def __init__(self) -> None:
+        self.children: List[Optional["_Node"]] = [None, None]
+        self.blocked = False
+
+
+class IPBlocklist:
+    """
+    Blocklist of IP addresses and CIDR networks
+
+    Single addresses are stored as /32 or /128 networks. IPv4-mapped IPv6
+    addresses are checked against the IPv4 trie.
+    """
+
+    def __init__(self, networks: Optional[Iterable[Network]] = None) -> None:
+        self._roots = {4: _Node(), 6: _Node()}
+        self._networks = 0
+        self._lookups = 0
+        self._hits = 0
+        if networks is not None:
+            self.update(networks)
+
+    @staticmethod
+    def _parse(network: Network) -> IPNetwork:
+        if isinstance(network, str):
+            network = network.strip()
+        try:
+            return ipaddress.ip_network(network, strict=False)
+        except ValueError as e:
+            raise ValueError(f"Invalid IP address or network: {network!r}") from e
+
+    def add(self, network: Network) -> bool:
+        """Block an address or network; returns False if already blocked"""
+        parsed = self._parse(network)
+        node = self._roots[parsed.version]
+        value = int(parsed.network_address)
+        shift = parsed.max_prefixlen - 1
+        for _ in range(parsed.prefixlen):
+            bit = (value >> shift) & 1
+            child = node.children[bit]
+            if child is None:
+                child = node.children[bit] = _Node()
+            node = child
+            shift -= 1
+
+        if node.blocked:
+            return False
+        node.blocked = True
+        self._networks += 1
+        return True
+
+    def update(self, networks: Iterable[Network]) -> int:
+        """Block many addresses or networks; returns how many were new"""
+        return sum(1 for network in networks if self.add(network))
+
+    def remove(self, network: Network) -> bool:
+        """Unblock an exact address or network previously added"""
+        parsed = self._parse(network)
+        path: List[Tuple[_Node, int]] = []
+        node = self._roots[parsed.version]
+        value = int(parsed.network_address)
+        shift = parsed.max_prefixlen - 1
+        for _ in range(parsed.prefixlen):
+            bit = (value >> shift) & 1
+            path.append((node, bit))
+            child = node.children[bit]
+            if child is None:
+                return False
+            node = child
+            shift -= 1
+
+        if not node.blocked:
+            return False
+        node.blocked = False
+        self._networks -= 1
+
+        # Prune branches that no longer lead to a blocked network
+        for parent, bit in reversed(path):
+            pruned = parent.children[bit]
+            if pruned is None or pruned.blocked or pruned.children != [None, None]:
+                break
+            parent.children[bit] = None
+        return True
+
+    def contains(self, ip_address: str) -> bool:
+        """Check whether an address falls in any blocked network"""
+        self._lookups += 1
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+
+        node: Optional[_Node] = self._roots[address.version]
+        value = int(address)
+        shift = address.max_prefixlen - 1
+        while node is not None:
+            if node.blocked:
+                self._hits += 1
+                return True
+            if shift < 0:
+                break
+            node = node.children[(value >> shift) & 1]
+            shift -= 1
+        return False
+
+    def __contains__(self, ip_address: object) -> bool:
+        return isinstance(ip_address, str) and self.contains(ip_address)
+
+    def load_file(self, path: str) -> int:
+        """
+        Block every address or network listed in a file
+
+        One entry per line; blank lines and ``#`` comments are ignored and
+        invalid entries are logged and skipped. Returns how many were new.
+        """
+        added = 0
+        skipped = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                entry = line.split("#", 1)[0].strip()
+                if not entry:
+                    continue
+                try:
+                    added += self.add(entry)
+                except ValueError:
+                    skipped += 1
+
+        if skipped:
+            logger.warning(f"Skipped {skipped} invalid blocklist entries in {path}")
+        logger.info(f"Loaded {added} blocked networks from {path}")
+        return added
+
+    def clear(self) -> None:
+        """Remove every blocked network"""
+        self._roots = {4: _Node(), 6: _Node()}
+        self._networks = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get blocklist statistics"""
+        return {
+            "networks": self._networks,
+            "lookups": self._lookups,
+            "blocked_lookups": self._hits,
+        }
+
+
+def ip_filter_middleware(blocklist: IPBlocklist, trust_forwarded: bool = False) -> Any:
+    """
+    aiohttp middleware rejecting requests from blocked IPs with 403
+
+    Runs before the handler reads the body. With ``trust_forwarded`` the
+    client address is taken from the last X-Forwarded-For entry, the one
+    appended by the proxy in front of the app; entries before it are set by
+    the client and can be spoofed. Only enable it behind such a proxy.
+    """
+
+    @web.middleware
+    async def middleware(request: Request, handler: Handler) -> StreamResponse:
+        ip_address = request.remote
+        if trust_forwarded:
+            forwarded = request.headers.get("X-Forwarded-For")
+            if forwarded:
+                ip_address = forwarded.rsplit(",", 1)[-1].strip()
+
+        if ip_address and blocklist.contains(ip_address):
+            logger.warning(f"Rejected request from blocked IP {ip_address}")
+            return web.Response(text="Forbidden", status=403)
+        return await handler(request)
+
+    return middleware
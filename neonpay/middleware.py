@@ -135,7 +135,7 @@ class WebhookMiddleware(PaymentMiddleware):
         import hashlib
         import hmac
 
-        import aiohttp
+        from .connection_pool import get_http_session
 
         payload = {"event": event_type, "data": data}
 
@@ -148,12 +148,12 @@ class WebhookMiddleware(PaymentMiddleware):
             headers["X-NeonPay-Signature"] = f"sha256={signature}"
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.webhook_url, json=payload, headers=headers
-                ) as response:
-                    if response.status != 200:
-                        logging.warning(f"Webhook failed: {response.status}")
+            session = await get_http_session()
+            async with session.post(
+                self.webhook_url, json=payload, headers=headers
+            ) as response:
+                if response.status != 200:
+                    logging.warning(f"Webhook failed: {response.status}")
         except Exception as e:
             logging.error(f"Webhook error: {e}")
 
@@ -6,14 +6,50 @@ Automatically tracks events across all synchronized bots
 import json
 import logging
 import time
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Union
+
+from .analytics import UserSession, evict_idle_sessions
+from .event_store import (
+    DAY,
+    ColumnarEventStore,
+    EventSummary,
+    TimeIndexedEvents,
+    local_day,
+)
+from .hyperloglog import HyperLogLog, precision_for_error
 
 logger = logging.getLogger(__name__)
 
+# Days of per-bot distinct user sketches to keep
+UNIQUE_USERS_RETENTION_DAYS = 400
+
+# Product indices below this are kept as bits of an int per session; a
+# session that sees a higher index switches to a set of indices
+PRODUCT_MASK_BITS = 256
+
+# Bitmask of product indices, or a set of them for large catalogues
+ProductSet = Union[int, Set[int]]
+
+
+def _add_product(products: ProductSet, index: int) -> ProductSet:
+    """Add a product index to a session product set"""
+    if isinstance(products, int):
+        if index < PRODUCT_MASK_BITS:
+            return products | (1 << index)
+        products = {bit for bit in range(products.bit_length()) if products >> bit & 1}
+    products.add(index)
+    return products
+
+
+def _count_products(products: ProductSet) -> int:
+    if isinstance(products, int):
+        return bin(products).count("1")
+    return len(products)
+
 
 class EventType(Enum):
     """Types of events to track"""
@@ -78,6 +114,25 @@ class MultiBotEvent:
     user_agent: Optional[str] = None
 
 
+class BotUserSession(UserSession):
+    """Per-bot user session with distinct product sets as bitmasks"""
+
+    __slots__ = ("viewed_products", "purchased_products")
+
+    def __init__(self, timestamp: float) -> None:
+        super().__init__(timestamp)
+        # Bit n is set for the product the collector gave index n in the bot
+        self.viewed_products: ProductSet = 0
+        self.purchased_products: ProductSet = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert session to dictionary"""
+        data = super().to_dict()
+        data["products_viewed"] = _count_products(self.viewed_products)
+        data["products_purchased"] = _count_products(self.purchased_products)
+        return data
+
+
 @dataclass
 class BotAnalytics:
     """Analytics data for a specific bot"""
@@ -114,49 +169,92 @@ class NetworkAnalytics:
 class EventCollector:
     """Collects events from multiple bots"""
 
-    def __init__(self, max_events: int = 1000000) -> None:
-        self._events: deque = deque(maxlen=max_events)
-        self._bot_events: Dict[str, deque] = defaultdict(
-            lambda: deque(maxlen=max_events // 10)
+    def __init__(
+        self,
+        max_events: int = 1000000,
+        columnar: bool = False,
+        unique_users_error_rate: Optional[float] = None,
+        session_ttl: float = 90 * DAY,
+    ) -> None:
+        if session_ttl <= 0:
+            raise ValueError("Session TTL must be positive")
+
+        # Columnar storage keeps each event once, in typed arrays, instead
+        # of as objects in both the global and the per-bot logs
+        self._store: Optional[ColumnarEventStore] = None
+        self._events: Optional[TimeIndexedEvents] = None
+        self._bot_events: Dict[str, TimeIndexedEvents] = {}
+        if columnar:
+            self._store = ColumnarEventStore(max_events)
+        else:
+            self._events = TimeIndexedEvents(max_events)
+            self._bot_events = defaultdict(
+                lambda: TimeIndexedEvents(max(1, max_events // 10))
+            )
+        self._bot_ids: Dict[str, None] = {}
+        # Sessions inactive for longer than session_ttl are evicted
+        self._user_sessions: Dict[str, "OrderedDict[int, BotUserSession]"] = (
+            defaultdict(OrderedDict)
         )
-        self._user_sessions: Dict[str, Dict[int, Dict[str, Any]]] = defaultdict(dict)
+        self._session_ttl = session_ttl
+        self._newest_timestamp = 0.0
+        # bot_id -> product_id -> index in that bot's session product sets
+        self._product_indices: Dict[str, Dict[str, int]] = defaultdict(dict)
         self._product_views: Dict[str, Dict[str, int]] = defaultdict(
             lambda: defaultdict(int)
         )
         self._conversion_funnel: Dict[str, Dict[str, int]] = defaultdict(
             lambda: defaultdict(int)
         )
+        # bot_id -> local day -> distinct users sketch
+        self._users_precision = (
+            precision_for_error(unique_users_error_rate)
+            if unique_users_error_rate is not None
+            else None
+        )
+        self._daily_users: Dict[str, Dict[int, HyperLogLog]] = defaultdict(dict)
 
     def track_event(self, event: MultiBotEvent) -> None:
         """Track an event from any bot"""
-        self._events.append(event)
+        if self._store is not None:
+            self._bot_ids[event.bot_id] = None
+            self._store.append(
+                event.timestamp,
+                event.user_id,
+                event.event_type,
+                amount=event.amount,
+                product_id=event.product_id,
+                bot_id=event.bot_id,
+                extras=self._event_extras(event),
+            )
+        elif self._events is not None:
+            self._events.append(event)
 
-        # Track per-bot events
-        self._bot_events[event.bot_id].append(event)
+            # Track per-bot events
+            self._bot_events[event.bot_id].append(event)
 
         # Update user sessions
-        if event.user_id not in self._user_sessions[event.bot_id]:
-            self._user_sessions[event.bot_id][event.user_id] = {
-                "first_seen": event.timestamp,
-                "last_seen": event.timestamp,
-                "events": [],
-                "total_spent": 0,
-                "products_viewed": set(),
-                "products_purchased": set(),
-            }
-
-        session = self._user_sessions[event.bot_id][event.user_id]
-        session["last_seen"] = event.timestamp
-        session["events"].append(event.event_type)
-
-        if event.amount:
-            session["total_spent"] += event.amount
+        sessions = self._user_sessions[event.bot_id]
+        session = sessions.get(event.user_id)
+        if session is None:
+            session = sessions[event.user_id] = BotUserSession(event.timestamp)
+        else:
+            sessions.move_to_end(event.user_id)
+        session.record(event.timestamp, event.amount)
 
         if event.product_id:
             if event.event_type == EventType.PRODUCT_VIEW.value:
-                session["products_viewed"].add(event.product_id)
+                session.viewed_products = _add_product(
+                    session.viewed_products, self._product_index(event)
+                )
             elif event.event_type == EventType.PAYMENT_COMPLETED.value:
-                session["products_purchased"].add(event.product_id)
+                session.purchased_products = _add_product(
+                    session.purchased_products, self._product_index(event)
+                )
+
+        if event.timestamp > self._newest_timestamp:
+            self._newest_timestamp = event.timestamp
+        evict_idle_sessions(sessions, self._newest_timestamp - self._session_ttl)
 
         # Track product views
         if event.event_type == EventType.PRODUCT_VIEW.value and event.product_id:
@@ -165,6 +263,91 @@ class EventCollector:
         # Track conversion funnel
         self._conversion_funnel[event.bot_id][event.event_type] += 1
 
+        if self._users_precision is not None:
+            self._track_unique_user(event)
+
+    def _product_index(self, event: MultiBotEvent) -> int:
+        """Index assigned to the event's product in its bot's sessions"""
+        indices = self._product_indices[event.bot_id]
+        product_id = event.product_id or ""
+        index = indices.get(product_id)
+        if index is None:
+            index = indices[product_id] = len(indices)
+        return index
+
+    def _track_unique_user(self, event: MultiBotEvent) -> None:
+        """Add the user to the bot's sketch for the event day"""
+        days = self._daily_users[event.bot_id]
+        day = local_day(event.timestamp)
+        users = days.get(day)
+        if users is None:
+            users = days[day] = HyperLogLog(self._users_precision or 12)
+            cutoff = day - UNIQUE_USERS_RETENTION_DAYS
+            for expired in [d for d in days if d < cutoff]:
+                del days[expired]
+        users.add(event.user_id)
+
+    def estimate_unique_users(
+        self,
+        bot_id: Optional[str] = None,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Estimate distinct users by merging daily sketches
+
+        Covers whole local days overlapping the window, across all bots
+        unless bot_id is given. Returns None if unique user tracking is
+        not enabled.
+        """
+        if self._users_precision is None:
+            return None
+
+        first_day = local_day(start_time) if start_time is not None else None
+        last_day = local_day(end_time) if end_time is not None else None
+        bot_ids = [bot_id] if bot_id else list(self._daily_users)
+
+        users = HyperLogLog(self._users_precision)
+        for bot in bot_ids:
+            for day, sketch in self._daily_users.get(bot, {}).items():
+                if (first_day is None or day >= first_day) and (
+                    last_day is None or day <= last_day
+                ):
+                    users.merge(sketch)
+        return users.count()
+
+    @staticmethod
+    def _event_extras(event: MultiBotEvent) -> Dict[str, Any]:
+        """Fields kept in the columnar store side table"""
+        extras: Dict[str, Any] = {}
+        if event.metadata:
+            extras["metadata"] = event.metadata
+        if event.bot_name != event.bot_id:
+            extras["bot_name"] = event.bot_name
+        for name in ("session_id", "ip_address", "user_agent"):
+            value = getattr(event, name)
+            if value is not None:
+                extras[name] = value
+        return extras
+
+    def get_event_count(self) -> int:
+        """Get number of stored events"""
+        if self._store is not None:
+            return len(self._store)
+        return len(self._events) if self._events is not None else 0
+
+    def get_bot_ids(self) -> List[str]:
+        """Get IDs of bots that have tracked events"""
+        if self._store is not None:
+            return list(self._bot_ids)
+        return list(self._bot_events)
+
+    def get_bot_event_count(self, bot_id: str) -> int:
+        """Get number of stored events for a bot"""
+        if self._store is not None:
+            return self._store.summarize(bot_id=bot_id).total_events
+        return len(self._bot_events.get(bot_id, ()))
+
     def get_events(
         self,
         bot_id: Optional[str] = None,
@@ -173,66 +356,87 @@ class EventCollector:
         event_type: Optional[str] = None,
     ) -> List[MultiBotEvent]:
         """Get filtered events"""
-        if bot_id:
-            events = list(self._bot_events[bot_id])
-        else:
-            events = list(self._events)
+        if self._store is not None:
+            events = []
+            for slot in self._store.select(
+                start_time=start_time or None,
+                end_time=end_time or None,
+                event_type=event_type,
+                bot_id=bot_id,
+            ):
+                timestamp, user_id, type_, amount, product_id, bot, extras = (
+                    self._store.row(slot)
+                )
+                extras = dict(extras)
+                events.append(
+                    MultiBotEvent(
+                        event_type=type_,
+                        bot_id=bot or "",
+                        bot_name=extras.pop("bot_name", bot or ""),
+                        user_id=user_id,
+                        amount=amount,
+                        product_id=product_id,
+                        timestamp=timestamp,
+                        **extras,
+                    )
+                )
+            return events
+
+        log = self._bot_events.get(bot_id) if bot_id else self._events
+        if log is None:
+            return []
+
+        return log.window(
+            start_time=start_time or None,
+            end_time=end_time or None,
+            event_type=event_type or None,
+        )
 
-        if start_time:
-            events = [e for e in events if e.timestamp >= start_time]
-        if end_time:
-            events = [e for e in events if e.timestamp <= end_time]
-        if event_type:
-            events = [e for e in events if e.event_type == event_type]
+    def summarize(
+        self,
+        bot_id: Optional[str] = None,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+    ) -> EventSummary:
+        """Aggregate stored events, optionally for one bot and time window"""
+        if self._store is not None:
+            return self._store.summarize(
+                start_time=start_time, end_time=end_time, bot_id=bot_id
+            )
+
+        events = self._bot_events.get(bot_id) if bot_id else self._events
+        if events is None:
+            return EventSummary()
 
-        return events
+        return EventSummary.from_events(
+            (e.timestamp, e.event_type, e.amount, e.product_id)
+            for e in events.window(start_time, end_time)
+        )
 
     def get_bot_stats(self, bot_id: str) -> Dict[str, Any]:
         """Get statistics for a specific bot"""
-        events = self._bot_events[bot_id]
-        user_sessions = self._user_sessions[bot_id]
-
-        total_events = len(events)
-        total_users = len(user_sessions)
-
-        # Calculate revenue
-        payment_events = [
-            e for e in events if e.event_type == EventType.PAYMENT_COMPLETED.value
-        ]
-        total_revenue = sum(e.amount or 0 for e in payment_events)
-        total_transactions = len(payment_events)
+        summary = self.summarize(bot_id=bot_id)
+        total_users = self.estimate_unique_users(bot_id=bot_id)
+        if total_users is None:
+            total_users = len(self._user_sessions[bot_id])
 
         # Calculate conversion rate
-        product_views = len(
-            [e for e in events if e.event_type == EventType.PRODUCT_VIEW.value]
-        )
+        product_views = summary.events_by_type.get(EventType.PRODUCT_VIEW.value, 0)
         conversion_rate = (
-            (total_transactions / product_views * 100) if product_views > 0 else 0
+            (summary.total_transactions / product_views * 100)
+            if product_views > 0
+            else 0
         )
 
-        # Events by type
-        events_by_type: defaultdict[str, int] = defaultdict(int)
-        for event in events:
-            events_by_type[event.event_type] += 1
-
-        # Revenue by product
-        revenue_by_product: defaultdict[str, int] = defaultdict(int)
-        for event in payment_events:
-            if event.product_id:
-                revenue_by_product[event.product_id] += event.amount or 0
-
-        # Last activity
-        last_activity = max((e.timestamp for e in events), default=None)
-
         return {
-            "total_events": total_events,
+            "total_events": summary.total_events,
             "total_users": total_users,
-            "total_revenue": total_revenue,
-            "total_transactions": total_transactions,
+            "total_revenue": summary.total_revenue,
+            "total_transactions": summary.total_transactions,
             "conversion_rate": conversion_rate,
-            "last_activity": last_activity,
-            "events_by_type": dict(events_by_type),
-            "revenue_by_product": dict(revenue_by_product),
+            "last_activity": summary.last_activity,
+            "events_by_type": summary.events_by_type,
+            "revenue_by_product": summary.revenue_by_product,
         }
 
 
@@ -249,37 +453,37 @@ class MultiBotAnalyticsEngine:
         end_time = time.time()
         start_time = end_time - (days * 24 * 60 * 60)
 
-        # Get all events in period
-        all_events = self.collector.get_events(start_time=start_time, end_time=end_time)
+        # Aggregate all events in period
+        summary = self.collector.summarize(start_time=start_time, end_time=end_time)
 
         # Calculate network metrics
-        total_bots = len(self.collector._bot_events)
-        total_events = len(all_events)
+        bot_ids = self.collector.get_bot_ids()
+        total_bots = len(bot_ids)
+        total_events = summary.total_events
 
         # Calculate total users (unique across all bots)
-        all_users: set[int] = set()
-        for bot_id in self.collector._user_sessions:
-            all_users.update(self.collector._user_sessions[bot_id].keys())
-        total_users = len(all_users)
+        total_users = self.collector.estimate_unique_users(
+            start_time=start_time, end_time=end_time
+        )
+        if total_users is None:
+            all_users: set[int] = set()
+            for bot_id in self.collector._user_sessions:
+                all_users.update(self.collector._user_sessions[bot_id].keys())
+            total_users = len(all_users)
 
         # Calculate total revenue
-        payment_events = [
-            e for e in all_events if e.event_type == EventType.PAYMENT_COMPLETED.value
-        ]
-        total_revenue = sum(e.amount or 0 for e in payment_events)
-        total_transactions = len(payment_events)
+        total_revenue = summary.total_revenue
+        total_transactions = summary.total_transactions
 
         # Calculate network conversion rate
-        product_views = len(
-            [e for e in all_events if e.event_type == EventType.PRODUCT_VIEW.value]
-        )
+        product_views = summary.events_by_type.get(EventType.PRODUCT_VIEW.value, 0)
         network_conversion_rate = (
             (total_transactions / product_views * 100) if product_views > 0 else 0
         )
 
         # Top performing bots
         bot_performance = []
-        for bot_id in self.collector._bot_events:
+        for bot_id in bot_ids:
             bot_stats = self.collector.get_bot_stats(bot_id)
             bot_performance.append(
                 {
@@ -296,30 +500,13 @@ class MultiBotAnalyticsEngine:
         top_performing_bots = bot_performance[:10]
 
         # Top products across all bots
-        product_revenue: defaultdict[str, int] = defaultdict(int)
-        for event in payment_events:
-            if event.product_id:
-                product_revenue[event.product_id] += event.amount or 0
-
         top_products = [
             {"product_id": product_id, "revenue": revenue}
             for product_id, revenue in sorted(
-                product_revenue.items(), key=lambda x: x[1], reverse=True
+                summary.revenue_by_product.items(), key=lambda x: x[1], reverse=True
             )[:10]
         ]
 
-        # User journey analysis
-        user_journey: defaultdict[str, int] = defaultdict(int)
-        for event in all_events:
-            user_journey[event.event_type] += 1
-
-        # Revenue trends (daily breakdown)
-        revenue_trends: defaultdict[str, int] = defaultdict(int)
-        for event in payment_events:
-            date = datetime.fromtimestamp(event.timestamp)
-            daily_key = date.strftime("%Y-%m-%d")
-            revenue_trends[daily_key] += event.amount or 0
-
         return NetworkAnalytics(
             total_bots=total_bots,
             total_events=total_events,
@@ -329,8 +516,8 @@ class MultiBotAnalyticsEngine:
             network_conversion_rate=network_conversion_rate,
             top_performing_bots=top_performing_bots,
             top_products=top_products,
-            user_journey=dict(user_journey),
-            revenue_trends=dict(revenue_trends),
+            user_journey=summary.events_by_type,
+            revenue_trends=summary.revenue_by_day,
         )
 
     def calculate_bot_analytics(
@@ -340,67 +527,42 @@ class MultiBotAnalyticsEngine:
         end_time = time.time()
         start_time = end_time - (days * 24 * 60 * 60)
 
-        # Get bot events
-        bot_events = self.collector.get_events(
+        # Aggregate bot events
+        summary = self.collector.summarize(
             bot_id=bot_id, start_time=start_time, end_time=end_time
         )
 
         # Calculate metrics
-        total_events = len(bot_events)
-        total_users = len(self.collector._user_sessions[bot_id])
-
-        # Calculate revenue
-        payment_events = [
-            e for e in bot_events if e.event_type == EventType.PAYMENT_COMPLETED.value
-        ]
-        total_revenue = sum(e.amount or 0 for e in payment_events)
-        total_transactions = len(payment_events)
+        total_users = self.collector.estimate_unique_users(
+            bot_id=bot_id, start_time=start_time, end_time=end_time
+        )
+        if total_users is None:
+            total_users = len(self.collector._user_sessions[bot_id])
 
         # Calculate conversion rate
-        product_views = len(
-            [e for e in bot_events if e.event_type == EventType.PRODUCT_VIEW.value]
-        )
+        product_views = summary.events_by_type.get(EventType.PRODUCT_VIEW.value, 0)
         conversion_rate = (
-            (total_transactions / product_views * 100) if product_views > 0 else 0
+            (summary.total_transactions / product_views * 100)
+            if product_views > 0
+            else 0
         )
 
-        # Events by type
-        events_by_type: defaultdict[str, int] = defaultdict(int)
-        for event in bot_events:
-            events_by_type[event.event_type] += 1
-
-        # Revenue by product
-        revenue_by_product: defaultdict[str, int] = defaultdict(int)
-        for event in payment_events:
-            if event.product_id:
-                revenue_by_product[event.product_id] += event.amount or 0
-
         # User activity
         user_activity = {}
         for user_id, session in self.collector._user_sessions[bot_id].items():
-            user_activity[user_id] = {
-                "first_seen": session["first_seen"],
-                "last_seen": session["last_seen"],
-                "total_spent": session["total_spent"],
-                "products_viewed": len(session["products_viewed"]),
-                "products_purchased": len(session["products_purchased"]),
-                "event_count": len(session["events"]),
-            }
-
-        # Last activity
-        last_activity = max((e.timestamp for e in bot_events), default=None)
+            user_activity[user_id] = session.to_dict()
 
         return BotAnalytics(
             bot_id=bot_id,
             bot_name=bot_id,  # Would be resolved from bot registry
-            total_events=total_events,
+            total_events=summary.total_events,
             total_users=total_users,
-            total_revenue=total_revenue,
-            total_transactions=total_transactions,
+            total_revenue=summary.total_revenue,
+            total_transactions=summary.total_transactions,
             conversion_rate=conversion_rate,
-            last_activity=last_activity,
-            events_by_type=dict(events_by_type),
-            revenue_by_product=dict(revenue_by_product),
+            last_activity=summary.last_activity,
+            events_by_type=summary.events_by_type,
+            revenue_by_product=summary.revenue_by_product,
             user_activity=user_activity,
         )
 
@@ -419,7 +581,7 @@ class MultiBotAnalyticsDashboard:
 
         # Get individual bot analytics
         bot_analytics = {}
-        for bot_id in self.engine.collector._bot_events:
+        for bot_id in self.engine.collector.get_bot_ids():
             bot_analytics[bot_id] = self.engine.calculate_bot_analytics(
                 bot_id, period, days
             )
@@ -533,9 +695,21 @@ class MultiBotAnalyticsDashboard:
 class MultiBotAnalyticsManager:
     """Main analytics manager for multiple bots"""
 
-    def __init__(self, enable_analytics: bool = True) -> None:
+    def __init__(
+        self,
+        enable_analytics: bool = True,
+        columnar_storage: bool = False,
+        unique_users_error_rate: Optional[float] = None,
+    ) -> None:
         self.enabled = enable_analytics
-        self.collector = EventCollector() if enable_analytics else None
+        self.collector = (
+            EventCollector(
+                columnar=columnar_storage,
+                unique_users_error_rate=unique_users_error_rate,
+            )
+            if enable_analytics
+            else None
+        )
         self.engine = (
             MultiBotAnalyticsEngine(self.collector)
             if self.collector is not None
@@ -624,9 +798,10 @@ class MultiBotAnalyticsManager:
         return {
             "enabled": True,
             "registered_bots": len(self._bot_registry),
-            "total_events": len(self.collector._events),
+            "total_events": self.collector.get_event_count(),
             "total_bot_events": sum(
-                len(events) for events in self.collector._bot_events.values()
+                self.collector.get_bot_event_count(bot_id)
+                for bot_id in self.collector.get_bot_ids()
             ),
             "total_users": sum(
                 len(sessions) for sessions in self.collector._user_sessions.values()
@@ -13,7 +13,7 @@ from email.mime.text import MIMEText
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-import aiohttp
+from .connection_pool import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -157,14 +157,14 @@ class TelegramNotifier:
                 "parse_mode": "Markdown",
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status == 200:
-                        logger.info("Telegram notification sent")
-                        return True
-                    else:
-                        logger.error(f"Telegram API error: {response.status}")
-                        return False
+            session = await get_http_session()
+            async with session.post(url, json=payload) as response:
+                if response.status == 200:
+                    logger.info("Telegram notification sent")
+                    return True
+                else:
+                    logger.error(f"Telegram API error: {response.status}")
+                    return False
 
         except Exception as e:
             logger.error(f"Failed to send Telegram notification: {e}")
@@ -221,16 +221,16 @@ class WebhookNotifier:
             if self.config.webhook_secret:
                 headers["X-Webhook-Secret"] = self.config.webhook_secret
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.config.webhook_url, json=payload, headers=headers
-                ) as response:
-                    if response.status in [200, 201]:
-                        logger.info("Webhook notification sent")
-                        return True
-                    else:
-                        logger.error(f"Webhook error: {response.status}")
-                        return False
+            session = await get_http_session()
+            async with session.post(
+                self.config.webhook_url, json=payload, headers=headers
+            ) as response:
+                if response.status in [200, 201]:
+                    logger.info("Webhook notification sent")
+                    return True
+                else:
+                    logger.error(f"Webhook error: {response.status}")
+                    return False
 
         except Exception as e:
             logger.error(f"Failed to send webhook notification: {e}")
@@ -266,16 +266,16 @@ class SlackNotifier:
             if self.config.slack_channel:
                 slack_message["channel"] = self.config.slack_channel
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.config.slack_webhook_url, json=slack_message
-                ) as response:
-                    if response.status == 200:
-                        logger.info("Slack notification sent")
-                        return True
-                    else:
-                        logger.error(f"Slack API error: {response.status}")
-                        return False
+            session = await get_http_session()
+            async with session.post(
+                self.config.slack_webhook_url, json=slack_message
+            ) as response:
+                if response.status == 200:
+                    logger.info("Slack notification sent")
+                    return True
+                else:
+                    logger.error(f"Slack API error: {response.status}")
+                    return False
 
         except Exception as e:
             logger.error(f"Failed to send Slack notification: {e}")
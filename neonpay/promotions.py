@@ -3,15 +3,38 @@ NEONPAY Promotions - Promo codes and discount system
 Provides flexible discount management for payment stages
 """
 
+import base64
+import heapq
+import json
 import logging
 import secrets
+import sys
+import threading
 import time
-from dataclasses import dataclass, field
+import zlib
+from array import array
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple, Union
+
+from .storage import (
+    PROMO_CAMPAIGN_CODES,
+    PROMO_CAMPAIGN_USED,
+    PROMO_CAMPAIGNS,
+    PROMO_CODES,
+    StorageBackend,
+)
 
 logger = logging.getLogger(__name__)
 
+MIN_CAMPAIGN_CODE_LENGTH = 4
+MAX_CAMPAIGN_CODE_LENGTH = 12  # 12 symbols * 5 bits fit in 64 bits
+# Campaign codes share this many locks, striped by used-bitmap byte
+CAMPAIGN_LOCK_STRIPES = 64
+# Used-bitmap bytes per stored chunk, so a redemption rewrites 8192 flags
+CAMPAIGN_USED_CHUNK_BYTES = 1024
+
 
 class DiscountType(Enum):
     """Types of discounts available"""
@@ -85,13 +108,17 @@ class PromoCode:
         if not isinstance(self.user_limit, int) or self.user_limit <= 0:
             raise ValueError("User limit must be a positive integer")
 
-    def is_valid(self, user_id: int, amount: int) -> Tuple[bool, str]:
+    def is_valid(
+        self, user_id: int, amount: int, reserved: int = 0, user_reserved: int = 0
+    ) -> Tuple[bool, str]:
         """
         Check if promo code is valid for user and amount.
 
         Args:
             user_id: ID of the user attempting to use the code
             amount: Purchase amount
+            reserved: Uses held by pending payments
+            user_reserved: Uses held by pending payments of this user
 
         Returns:
             Tuple of (is_valid, error_message)
@@ -102,10 +129,10 @@ class PromoCode:
         if self.expires_at and time.time() > self.expires_at:
             return False, "Promo code has expired"
 
-        if self.max_uses and self.used_count >= self.max_uses:
+        if self.max_uses and self.used_count + reserved >= self.max_uses:
             return False, "Promo code usage limit reached"
 
-        user_usage = self.used_by.get(user_id, 0)
+        user_usage = self.used_by.get(user_id, 0) + user_reserved
         if user_usage >= self.user_limit:
             return False, "You have reached the usage limit for this promo code"
 
@@ -145,25 +172,495 @@ class PromoCode:
         self.used_count += 1
         self.used_by[user_id] = self.used_by.get(user_id, 0) + 1
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dictionary"""
+        data = asdict(self)
+        data["discount_type"] = self.discount_type.value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PromoCode":
+        """Create a promo code from to_dict() output"""
+        data = dict(data)
+        data["discount_type"] = DiscountType(data["discount_type"])
+        # JSON object keys are strings
+        data["used_by"] = {
+            int(user_id): count for user_id, count in data.get("used_by", {}).items()
+        }
+        return cls(**data)
+
+
+# Unambiguous code symbols (no 0/O or 1/I), 5 bits each
+_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+_CODE_VALUES = {symbol: value for value, symbol in enumerate(_CODE_ALPHABET)}
+_CODE_BITS = 5
+
+
+def _encode_code(value: int, length: int) -> str:
+    symbols = []
+    for _ in range(length):
+        symbols.append(_CODE_ALPHABET[value & 31])
+        value >>= _CODE_BITS
+    return "".join(reversed(symbols))
+
+
+def _decode_code(text: str) -> Optional[int]:
+    value = 0
+    for symbol in text:
+        digit = _CODE_VALUES.get(symbol)
+        if digit is None:
+            return None
+        value = (value << _CODE_BITS) | digit
+    return value
+
+
+def _pack_array(values: "array[int]") -> str:
+    """Encode a 64-bit array as little-endian base64"""
+    if sys.byteorder == "big":
+        values = array("Q", values)
+        values.byteswap()
+    return base64.b64encode(zlib.compress(values.tobytes())).decode("ascii")
+
+
+def _unpack_array(data: str) -> "array[int]":
+    values = array("Q")
+    values.frombytes(zlib.decompress(base64.b64decode(data)))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class PromoCampaign:
+    """
+    Batch of single-use promo codes sharing one definition
+
+    Codes are kept as a sorted array of 64-bit integers plus bitmaps of used
+    and reserved codes, about 8 bytes per code instead of a PromoCode object
+    each. The shared definition is an ordinary PromoCode template whose code
+    is the campaign ID. The used bitmap is persisted in chunks of
+    ``CAMPAIGN_USED_CHUNK_BYTES``, so a redemption only rewrites its chunk.
+    """
+
+    def __init__(
+        self,
+        template: PromoCode,
+        prefix: str,
+        length: int,
+        codes: "array[int]",
+        used: Optional[bytearray] = None,
+    ) -> None:
+        if not MIN_CAMPAIGN_CODE_LENGTH <= length <= MAX_CAMPAIGN_CODE_LENGTH:
+            raise ValueError(
+                f"Campaign code length must be between {MIN_CAMPAIGN_CODE_LENGTH} "
+                f"and {MAX_CAMPAIGN_CODE_LENGTH}"
+            )
+
+        if len(prefix) + length > 32:
+            raise ValueError("Prefix and code must be 32 characters or less")
+
+        self.template = template
+        self.prefix = prefix
+        self.length = length
+        self._codes = codes
+        bitmap_size = (len(codes) + 7) // 8
+        self._used = used if used is not None else bytearray(bitmap_size)
+        self._reserved = bytearray(bitmap_size)
+        self.used_count = sum(bin(byte).count("1") for byte in self._used)
+        # Codes are redeemed under striped locks; this guards the shared count
+        self._count_lock = threading.Lock()
+
+    @classmethod
+    def generate(
+        cls, template: PromoCode, prefix: str, length: int, count: int
+    ) -> "PromoCampaign":
+        """Create a campaign of count unique random codes"""
+        if not isinstance(count, int) or count <= 0:
+            raise ValueError("Code count must be a positive integer")
+
+        # Keep the code space sparse so batches rarely collide
+        if count > (1 << (_CODE_BITS * length)) // 4:
+            raise ValueError(f"Too many codes for length {length}")
+
+        mask = (1 << (_CODE_BITS * length)) - 1
+        values: Set[int] = set()
+        while len(values) < count:
+            batch = array("Q")
+            batch.frombytes(secrets.token_bytes(batch.itemsize * (count - len(values))))
+            values.update(map(mask.__and__, batch))
+
+        return cls(template, prefix, length, array("Q", sorted(values)))
+
+    @property
+    def campaign_id(self) -> str:
+        """Campaign ID (the template's code)"""
+        return self.template.code
+
+    @property
+    def size(self) -> int:
+        """Number of codes in the campaign"""
+        return len(self._codes)
+
+    def index_of(self, code: str) -> Optional[int]:
+        """Position of a code in the campaign, or None if not part of it"""
+        if len(code) != len(self.prefix) + self.length or not code.startswith(
+            self.prefix
+        ):
+            return None
+
+        value = _decode_code(code[len(self.prefix) :])
+        if value is None:
+            return None
+
+        index = bisect_left(self._codes, value)
+        if index < len(self._codes) and self._codes[index] == value:
+            return index
+        return None
+
+    def code_at(self, index: int) -> str:
+        """Code string at a position"""
+        return self.prefix + _encode_code(self._codes[index], self.length)
+
+    def is_used(self, index: int) -> bool:
+        """Check whether the code at a position has been redeemed"""
+        return bool(self._used[index >> 3] & (1 << (index & 7)))
+
+    def is_reserved(self, index: int) -> bool:
+        """Check whether the code at a position is held by a pending payment"""
+        return bool(self._reserved[index >> 3] & (1 << (index & 7)))
+
+    def is_valid(self, index: int, amount: int) -> Tuple[bool, str]:
+        """Check if the code at a position can be redeemed for an amount"""
+        is_valid, error_message = self.template.is_valid(0, amount)
+        if not is_valid:
+            return False, error_message
+
+        if self.is_used(index):
+            return False, "Promo code has already been used"
+
+        if self.is_reserved(index):
+            return False, "Promo code is being redeemed"
+
+        return True, ""
+
+    def mark_used(self, index: int) -> bool:
+        """Record that the code at a position was redeemed; False if it already was"""
+        if self.is_used(index):
+            return False
+        self._used[index >> 3] |= 1 << (index & 7)
+        with self._count_lock:
+            self.used_count += 1
+        return True
+
+    def set_reserved(self, index: int, reserved: bool) -> None:
+        """Set or clear the pending-payment hold of a code"""
+        if reserved:
+            self._reserved[index >> 3] |= 1 << (index & 7)
+        else:
+            self._reserved[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    @property
+    def used_chunks(self) -> int:
+        """Number of stored chunks the used bitmap is split into"""
+        return -(-len(self._used) // CAMPAIGN_USED_CHUNK_BYTES)
+
+    @staticmethod
+    def used_chunk_of(index: int) -> int:
+        """Chunk of the used bitmap holding the flag of a position"""
+        return (index >> 3) // CAMPAIGN_USED_CHUNK_BYTES
+
+    def used_chunk_to_dict(self, chunk: int) -> Dict[str, Any]:
+        """Convert one chunk of the used bitmap to a JSON-serialisable dictionary"""
+        start = chunk * CAMPAIGN_USED_CHUNK_BYTES
+        data = bytes(self._used[start : start + CAMPAIGN_USED_CHUNK_BYTES])
+        return {"used": base64.b64encode(zlib.compress(data)).decode("ascii")}
+
+    def load_used_chunk(self, chunk: int, data: Dict[str, Any]) -> None:
+        """Restore one chunk of the used bitmap from used_chunk_to_dict() output"""
+        start = chunk * CAMPAIGN_USED_CHUNK_BYTES
+        end = min(start + CAMPAIGN_USED_CHUNK_BYTES, len(self._used))
+        used = zlib.decompress(base64.b64decode(data["used"]))
+        if len(used) != end - start:
+            raise ValueError(f"Used chunk {chunk} has the wrong size")
+
+        previous = sum(bin(byte).count("1") for byte in self._used[start:end])
+        self._used[start:end] = used
+        with self._count_lock:
+            self.used_count += sum(bin(byte).count("1") for byte in used) - previous
+
+    def iter_codes(self) -> Iterator[Tuple[str, bool]]:
+        """Yield (code, used) pairs without materialising the code list"""
+        for index in range(len(self._codes)):
+            yield self.code_at(index), self.is_used(index)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the definition to a JSON-serialisable dictionary"""
+        return {
+            "template": self.template.to_dict(),
+            "prefix": self.prefix,
+            "length": self.length,
+        }
+
+    def codes_to_dict(self) -> Dict[str, Any]:
+        """Convert the packed code set to a JSON-serialisable dictionary"""
+        return {"codes": _pack_array(self._codes)}
+
+    @classmethod
+    def from_dict(
+        cls, data: Dict[str, Any], codes_data: Dict[str, Any]
+    ) -> "PromoCampaign":
+        """
+        Create a campaign from to_dict() and codes_to_dict() output
+
+        The used bitmap is restored separately with load_used_chunk();
+        records that still carry a whole bitmap under "used" are read too.
+        """
+        used = data.get("used")
+        return cls(
+            PromoCode.from_dict(data["template"]),
+            data["prefix"],
+            data["length"],
+            _unpack_array(codes_data["codes"]),
+            bytearray(zlib.decompress(base64.b64decode(used))) if used else None,
+        )
+
+
+@dataclass
+class PromoReservation:
+    """Promo code use held for a pending payment"""
+
+    reservation_id: str
+    code: str
+    user_id: int
+    amount: int
+    discounted_amount: int
+    expires_at: float
+    campaign_id: Optional[str] = None
+
+
+class _CodeState:
+    """Lock and outstanding reservations of one promo code"""
+
+    __slots__ = ("lock", "reserved", "reserved_by", "expiry")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reserved = 0
+        self.reserved_by: Dict[int, int] = {}
+        # Min-heap of (expires_at, reservation_id); settled entries are skipped
+        self.expiry: List[Tuple[float, str]] = []
+
 
 class PromoSystem:
     """
     Promo code management system.
 
     Handles creation, validation, and application of promotional codes.
+    Codes can be redeemed in two steps: ``reserve_promo_code`` holds a use
+    while the payment is pending, then ``commit_promo_reservation`` or
+    ``release_promo_reservation`` settles it. Reservations not settled
+    within their TTL are released when their code is next redeemed and by
+    ``cleanup_expired``. Each code has its own lock, so
+    redemptions of different codes never contend; campaign codes share
+    ``CAMPAIGN_LOCK_STRIPES`` locks per campaign.
+
+    Large batches of single-use codes are issued as campaigns
+    (``create_campaign``), which store the codes packed rather than as
+    PromoCode objects and do not count towards ``max_codes``.
     """
 
-    def __init__(self, max_codes: int = 1000) -> None:
+    def __init__(
+        self,
+        max_codes: int = 1000,
+        storage: Optional[StorageBackend] = None,
+        reservation_ttl: float = 900.0,
+    ) -> None:
         """
         Initialize PromoSystem.
 
         Args:
             max_codes: Maximum number of promo codes allowed
+            storage: Backend to persist promo codes to (in-memory only if None)
+            reservation_ttl: Default seconds a reservation holds a use
         """
+        if reservation_ttl <= 0:
+            raise ValueError("Reservation TTL must be positive")
+
         self._promo_codes: Dict[str, PromoCode] = {}
         self._max_codes = max_codes
+        self._storage = storage
+        self._reservation_ttl = reservation_ttl
+        self._code_states: Dict[str, _CodeState] = {}
+        self._reservations: Dict[str, PromoReservation] = {}
+        self._expired_reservations = 0
+        # Min-heap of (expires_at, code state key) across all codes, so
+        # abandoned reservations are released even if the code goes idle
+        self._reservation_expiry: List[Tuple[float, str]] = []
+        self._reservation_expiry_lock = threading.Lock()
+        self._campaigns: Dict[str, PromoCampaign] = {}
+
+        # Min-heap of (expires_at, code); entries are checked when popped
+        self._expiry_queue: List[Tuple[float, str]] = []
+        # Incremental counters, updated on every change made through the system
+        self._active_codes = 0
+        self._total_uses = 0
+        self._campaign_codes = 0
+
+        if storage:
+            for _, data in storage.load_all(PROMO_CODES):
+                self._add_code(PromoCode.from_dict(data))
+
+            for campaign_id, data in storage.load_all(PROMO_CAMPAIGNS):
+                codes_data = storage.load(PROMO_CAMPAIGN_CODES, campaign_id)
+                if codes_data is None:
+                    logger.warning(f"Skipping campaign {campaign_id}: codes missing")
+                    continue
+                campaign = PromoCampaign.from_dict(data, codes_data)
+                for chunk in range(campaign.used_chunks):
+                    used_data = storage.load(
+                        PROMO_CAMPAIGN_USED, self._used_chunk_key(campaign_id, chunk)
+                    )
+                    if used_data is not None:
+                        campaign.load_used_chunk(chunk, used_data)
+                self._campaigns[campaign_id] = campaign
+                self._campaign_codes += campaign.size
+
         logger.info("PromoSystem initialized")
 
+    def _save(self, promo_code: PromoCode) -> None:
+        if self._storage:
+            self._storage.save(PROMO_CODES, promo_code.code, promo_code)
+
+    def _add_code(self, promo_code: PromoCode) -> None:
+        """Register a promo code in the table, counters and expiry queue"""
+        self._promo_codes[promo_code.code] = promo_code
+        self._active_codes += promo_code.active
+        self._total_uses += promo_code.used_count
+        if promo_code.expires_at:
+            heapq.heappush(self._expiry_queue, (promo_code.expires_at, promo_code.code))
+
+    def _remove_code(self, code: str) -> None:
+        """Remove a promo code and everything tracked for it"""
+        promo_code = self._promo_codes.pop(code)
+        self._active_codes -= promo_code.active
+        self._total_uses -= promo_code.used_count
+        self._drop_code(code)
+        if self._storage:
+            self._storage.delete(PROMO_CODES, code)
+
+    def _save_campaign(self, campaign: PromoCampaign) -> None:
+        if self._storage:
+            self._storage.save(PROMO_CAMPAIGNS, campaign.campaign_id, campaign)
+
+    @staticmethod
+    def _used_chunk_key(campaign_id: str, chunk: int) -> str:
+        return f"{campaign_id}:{chunk}"
+
+    def _save_used(self, campaign: PromoCampaign, chunk: int) -> None:
+        """Persist one chunk of a campaign's used bitmap"""
+        if self._storage:
+            self._storage.save(
+                PROMO_CAMPAIGN_USED,
+                self._used_chunk_key(campaign.campaign_id, chunk),
+                campaign.used_chunk_to_dict(chunk),
+            )
+
+    def _find_campaign_code(self, code: str) -> Optional[Tuple[PromoCampaign, int]]:
+        """Find the campaign and position of a campaign code"""
+        code = code.upper()
+        for campaign in self._campaigns.values():
+            index = campaign.index_of(code)
+            if index is not None:
+                return campaign, index
+        return None
+
+    @staticmethod
+    def _campaign_state_key(campaign_id: str, index: int) -> str:
+        # Codes never contain ':', so campaign keys cannot clash with them.
+        # Codes sharing a bitmap byte share a stripe, so bitmap updates of
+        # different stripes never touch the same byte.
+        return f"campaign:{campaign_id}:{(index >> 3) % CAMPAIGN_LOCK_STRIPES}"
+
+    def _reservation_state(self, reservation: PromoReservation) -> Optional[_CodeState]:
+        if reservation.campaign_id:
+            campaign = self._campaigns.get(reservation.campaign_id)
+            index = campaign.index_of(reservation.code) if campaign else None
+            if index is None:
+                return None
+            return self._code_states.get(
+                self._campaign_state_key(reservation.campaign_id, index)
+            )
+        return self._code_states.get(reservation.code)
+
+    def _state(self, code: str) -> _CodeState:
+        state = self._code_states.get(code)
+        if state is None:
+            # setdefault is atomic, so racing threads share one state
+            state = self._code_states.setdefault(code, _CodeState())
+        return state
+
+    def _settle(self, state: _CodeState, reservation: PromoReservation) -> None:
+        """Drop a reservation's hold; caller holds the code lock"""
+        del self._reservations[reservation.reservation_id]
+        state.reserved -= 1
+        remaining = state.reserved_by[reservation.user_id] - 1
+        if remaining:
+            state.reserved_by[reservation.user_id] = remaining
+        else:
+            del state.reserved_by[reservation.user_id]
+
+        if reservation.campaign_id:
+            campaign = self._campaigns.get(reservation.campaign_id)
+            index = campaign.index_of(reservation.code) if campaign else None
+            if campaign and index is not None:
+                campaign.set_reserved(index, False)
+
+    def _expire_reservations(self, state: _CodeState, current_time: float) -> int:
+        """Release reservations past their TTL; caller holds the code lock"""
+        released = 0
+        while state.expiry and state.expiry[0][0] <= current_time:
+            _, reservation_id = heapq.heappop(state.expiry)
+            reservation = self._reservations.get(reservation_id)
+            if reservation is not None:
+                self._settle(state, reservation)
+                released += 1
+        self._expired_reservations += released
+        return released
+
+    def expire_reservations(self) -> int:
+        """
+        Release every reservation past its TTL.
+
+        Returns:
+            Number of reservations released
+        """
+        current_time = time.time()
+        due: Set[str] = set()
+        # Popped before taking any code lock, which is always taken first
+        with self._reservation_expiry_lock:
+            queue = self._reservation_expiry
+            while queue and queue[0][0] <= current_time:
+                due.add(heapq.heappop(queue)[1])
+
+        released = 0
+        for key in due:
+            state = self._code_states.get(key)
+            if state is not None:
+                with state.lock:
+                    released += self._expire_reservations(state, current_time)
+
+        if released:
+            logger.info(f"Released {released} expired promo reservations")
+        return released
+
+    def _drop_code(self, code: str) -> None:
+        """Forget a removed code's lock and reservations"""
+        state = self._code_states.pop(code, None)
+        if state is None:
+            return
+        with state.lock:
+            for _, reservation_id in state.expiry:
+                self._reservations.pop(reservation_id, None)
+
     def create_promo_code(
         self,
         code: Optional[str] = None,
@@ -207,7 +704,8 @@ class PromoSystem:
             **kwargs,
         )
 
-        self._promo_codes[promo_code.code] = promo_code
+        self._add_code(promo_code)
+        self._save(promo_code)
         logger.info(f"Created promo code: {promo_code.code}")
         return promo_code
 
@@ -268,9 +766,23 @@ class PromoSystem:
         """
         promo_code = self.get_promo_code(code)
         if not promo_code:
-            return False, "Invalid promo code", None
-
-        is_valid, error_message = promo_code.is_valid(user_id, amount)
+            found = self._find_campaign_code(code)
+            if not found:
+                return False, "Invalid promo code", None
+
+            campaign, index = found
+            is_valid, error_message = campaign.is_valid(index, amount)
+            if not is_valid:
+                return False, error_message, campaign.template
+            return True, "Promo code applied successfully", campaign.template
+
+        state = self._code_states.get(promo_code.code)
+        if state:
+            is_valid, error_message = promo_code.is_valid(
+                user_id, amount, state.reserved, state.reserved_by.get(user_id, 0)
+            )
+        else:
+            is_valid, error_message = promo_code.is_valid(user_id, amount)
 
         if not is_valid:
             return False, error_message or "Promo code is not valid", promo_code
@@ -289,22 +801,432 @@ class PromoSystem:
             amount: Amount to apply discount to
 
         Returns:
-            Tuple of (success, discount_or_error, promo_code)
+            Tuple of (success, discount_or_error, promo_code); for campaign
+            codes promo_code is the campaign template
         """
-        is_valid, error_message, promo_code = self.validate_promo_code(
-            code, user_id, amount
-        )
+        promo_code = self.get_promo_code(code)
+        if not promo_code:
+            return self._apply_campaign_code(code, amount)
+
+        state = self._state(promo_code.code)
+        with state.lock:
+            self._expire_reservations(state, time.time())
+            is_valid, error_message, promo_code = self.validate_promo_code(
+                code, user_id, amount
+            )
 
-        if not is_valid or not promo_code:
-            return False, error_message, None
+            if not is_valid or not promo_code:
+                return False, error_message, None
 
-        discount = promo_code.calculate_discount(amount)
-        discounted_amount = amount - discount
-        promo_code.use(user_id)
+            discount = promo_code.calculate_discount(amount)
+            discounted_amount = amount - discount
+            promo_code.use(user_id)
+            self._total_uses += 1
+            self._save(promo_code)
 
         logger.info(f"Applied promo code {code}: {amount} -> {discounted_amount} Stars")
         return True, discounted_amount, promo_code
 
+    def _apply_campaign_code(
+        self, code: str, amount: int
+    ) -> Tuple[bool, Union[int, str], Optional[PromoCode]]:
+        found = self._find_campaign_code(code)
+        if not found:
+            return False, "Invalid promo code", None
+
+        campaign, index = found
+        state = self._state(self._campaign_state_key(campaign.campaign_id, index))
+        with state.lock:
+            self._expire_reservations(state, time.time())
+            is_valid, error_message = campaign.is_valid(index, amount)
+            if not is_valid:
+                return False, error_message, None
+
+            discounted_amount = amount - campaign.template.calculate_discount(amount)
+            campaign.mark_used(index)
+            self._save_used(campaign, campaign.used_chunk_of(index))
+
+        logger.info(f"Applied promo code {code}: {amount} -> {discounted_amount} Stars")
+        return True, discounted_amount, campaign.template
+
+    def reserve_promo_code(
+        self, code: str, user_id: int, amount: int, ttl: Optional[float] = None
+    ) -> Tuple[bool, Union[PromoReservation, str]]:
+        """
+        Hold one use of a promo code for a pending payment.
+
+        The hold counts against ``max_uses`` and ``user_limit`` until it is
+        committed, released, or expires.
+
+        Args:
+            code: Promo code to reserve
+            user_id: User ID using the code
+            amount: Amount to apply discount to
+            ttl: Seconds to hold the use (defaults to the system TTL)
+
+        Returns:
+            Tuple of (success, reservation_or_error)
+        """
+        promo_code = self.get_promo_code(code)
+        campaign: Optional[PromoCampaign] = None
+        index = 0
+        if promo_code:
+            state_key = promo_code.code
+        else:
+            found = self._find_campaign_code(code)
+            if not found:
+                return False, "Invalid promo code"
+            campaign, index = found
+            state_key = self._campaign_state_key(campaign.campaign_id, index)
+        state = self._state(state_key)
+
+        current_time = time.time()
+        expires_at = current_time + (ttl if ttl is not None else self._reservation_ttl)
+
+        with state.lock:
+            self._expire_reservations(state, current_time)
+            if campaign:
+                definition = campaign.template
+                is_valid, error_message = campaign.is_valid(index, amount)
+            else:
+                assert promo_code is not None  # nosec B101
+                definition = promo_code
+                is_valid, error_message = definition.is_valid(
+                    user_id, amount, state.reserved, state.reserved_by.get(user_id, 0)
+                )
+            if not is_valid:
+                return False, error_message or "Promo code is not valid"
+
+            reservation = PromoReservation(
+                reservation_id=secrets.token_urlsafe(12),
+                code=code.upper(),
+                user_id=user_id,
+                amount=amount,
+                discounted_amount=amount - definition.calculate_discount(amount),
+                expires_at=expires_at,
+                campaign_id=campaign.campaign_id if campaign else None,
+            )
+            if campaign:
+                campaign.set_reserved(index, True)
+            self._reservations[reservation.reservation_id] = reservation
+            state.reserved += 1
+            state.reserved_by[user_id] = state.reserved_by.get(user_id, 0) + 1
+            heapq.heappush(state.expiry, (expires_at, reservation.reservation_id))
+            with self._reservation_expiry_lock:
+                heapq.heappush(self._reservation_expiry, (expires_at, state_key))
+
+        return True, reservation
+
+    def get_reservation(self, reservation_id: str) -> Optional[PromoReservation]:
+        """Get an outstanding reservation by ID"""
+        return self._reservations.get(reservation_id)
+
+    def commit_promo_reservation(self, reservation_id: str) -> bool:
+        """
+        Turn a reservation into a recorded use once the payment succeeded.
+
+        A reservation past its TTL can still be committed as long as it has
+        not been released yet.
+
+        Args:
+            reservation_id: Reservation to commit
+
+        Returns:
+            True if committed, False if unknown or already settled
+        """
+        reservation = self._reservations.get(reservation_id)
+        if reservation is None:
+            return False
+
+        state = self._reservation_state(reservation)
+        if state is None:
+            self._reservations.pop(reservation_id, None)
+            return False
+
+        with state.lock:
+            # Another thread may have settled it while we waited for the lock
+            if reservation_id not in self._reservations:
+                return False
+            self._settle(state, reservation)
+            if not self._record_use(reservation.code, reservation.user_id):
+                return False
+
+        logger.info(
+            f"Committed promo code {reservation.code}: "
+            f"{reservation.amount} -> {reservation.discounted_amount} Stars"
+        )
+        return True
+
+    def release_promo_reservation(self, reservation_id: str) -> bool:
+        """
+        Give back a reserved use, e.g. when the invoice could not be sent.
+
+        Args:
+            reservation_id: Reservation to release
+
+        Returns:
+            True if released, False if unknown or already settled
+        """
+        reservation = self._reservations.get(reservation_id)
+        if reservation is None:
+            return False
+
+        state = self._reservation_state(reservation)
+        if state is None:
+            self._reservations.pop(reservation_id, None)
+            return False
+
+        with state.lock:
+            if reservation_id not in self._reservations:
+                return False
+            self._settle(state, reservation)
+        return True
+
+    def _record_use(self, code: str, user_id: int) -> bool:
+        """Record a use of a code or campaign code; caller holds its lock"""
+        promo_code = self._promo_codes.get(code)
+        if promo_code:
+            promo_code.use(user_id)
+            self._total_uses += 1
+            self._save(promo_code)
+            return True
+
+        found = self._find_campaign_code(code)
+        if not found:
+            return False
+        campaign, index = found
+        campaign.mark_used(index)
+        self._save_used(campaign, campaign.used_chunk_of(index))
+        return True
+
+    def record_promo_use(self, code: str, user_id: int) -> bool:
+        """
+        Record a use of a promo code without checking limits.
+
+        For payments completed after their reservation was released: the
+        discount was already granted, so the use is counted regardless.
+
+        Returns:
+            True if recorded, False if the code does not exist
+        """
+        code = code.upper()
+        if code in self._promo_codes:
+            state = self._state(code)
+        else:
+            found = self._find_campaign_code(code)
+            if not found:
+                return False
+            campaign, index = found
+            state = self._state(self._campaign_state_key(campaign.campaign_id, index))
+
+        with state.lock:
+            return self._record_use(code, user_id)
+
+    def create_campaign(
+        self,
+        campaign_id: str,
+        count: int,
+        discount_type: Union[DiscountType, str] = DiscountType.PERCENTAGE,
+        discount_value: Union[int, float] = 10,
+        prefix: str = "",
+        length: int = 10,
+        **kwargs: Any,
+    ) -> PromoCampaign:
+        """
+        Issue a batch of unique single-use promo codes.
+
+        Codes are generated in batches from one call to the system random
+        source per round and stored as a packed array.
+
+        Args:
+            campaign_id: Campaign identifier
+            count: Number of codes to generate
+            discount_type: Type of discount (PERCENTAGE or FIXED_AMOUNT)
+            discount_value: Discount value (percentage or fixed amount)
+            prefix: Text every code starts with, e.g. "SPRING-"
+            length: Random symbols per code (4-12)
+            **kwargs: Shared promo code parameters (expires_at, min_amount,
+                max_discount, description); every code is single-use, so
+                max_uses and user_limit are not accepted
+
+        Returns:
+            Created PromoCampaign instance
+
+        Raises:
+            ValueError: If the campaign exists, the prefix overlaps another
+                campaign, or the parameters are invalid
+        """
+        if isinstance(discount_type, str):
+            try:
+                discount_type = DiscountType(discount_type)
+            except ValueError as e:
+                raise ValueError(f"Invalid discount_type: {discount_type}") from e
+
+        template = PromoCode(
+            code=campaign_id,
+            discount_type=discount_type,
+            discount_value=discount_value,
+            **kwargs,
+        )
+        self._check_campaign_template(template)
+        campaign = PromoCampaign.generate(template, prefix.upper(), length, count)
+        self._add_campaign(campaign)
+        logger.info(f"Created promo campaign {campaign_id} with {count} codes")
+        return campaign
+
+    @staticmethod
+    def _check_campaign_template(template: PromoCode) -> None:
+        # Campaigns track only whether each code was used, not by whom
+        if template.max_uses is not None or template.user_limit != 1:
+            raise ValueError(
+                "Campaign codes are single-use; max_uses and user_limit "
+                "are not supported"
+            )
+
+    def _add_campaign(self, campaign: PromoCampaign) -> None:
+        if campaign.campaign_id in self._campaigns:
+            raise ValueError(f"Campaign '{campaign.campaign_id}' already exists")
+
+        code_length = len(campaign.prefix) + campaign.length
+        for other in self._campaigns.values():
+            if len(other.prefix) + other.length == code_length and (
+                other.prefix.startswith(campaign.prefix)
+                or campaign.prefix.startswith(other.prefix)
+            ):
+                raise ValueError(
+                    f"Campaign prefix '{campaign.prefix}' overlaps "
+                    f"campaign '{other.campaign_id}'"
+                )
+
+        self._campaigns[campaign.campaign_id] = campaign
+        self._campaign_codes += campaign.size
+        if self._storage:
+            self._storage.save(
+                PROMO_CAMPAIGN_CODES, campaign.campaign_id, campaign.codes_to_dict()
+            )
+            # Missing chunks read as unused, so new campaigns write none
+            if campaign.used_count:
+                for chunk in range(campaign.used_chunks):
+                    self._save_used(campaign, chunk)
+        self._save_campaign(campaign)
+
+    def get_campaign(self, campaign_id: str) -> Optional[PromoCampaign]:
+        """Get a campaign by ID"""
+        return self._campaigns.get(campaign_id)
+
+    def deactivate_campaign(self, campaign_id: str) -> bool:
+        """Deactivate all codes of a campaign"""
+        campaign = self._campaigns.get(campaign_id)
+        if not campaign:
+            return False
+        campaign.template.active = False
+        self._save_campaign(campaign)
+        logger.info(f"Deactivated promo campaign: {campaign_id}")
+        return True
+
+    def delete_campaign(self, campaign_id: str) -> bool:
+        """Delete a campaign and all its codes"""
+        campaign = self._campaigns.pop(campaign_id, None)
+        if campaign is None:
+            return False
+        self._campaign_codes -= campaign.size
+        for stripe in range(CAMPAIGN_LOCK_STRIPES):
+            self._drop_code(self._campaign_state_key(campaign_id, stripe << 3))
+        if self._storage:
+            self._storage.delete(PROMO_CAMPAIGNS, campaign_id)
+            self._storage.delete(PROMO_CAMPAIGN_CODES, campaign_id)
+            for chunk in range(campaign.used_chunks):
+                self._storage.delete(
+                    PROMO_CAMPAIGN_USED, self._used_chunk_key(campaign_id, chunk)
+                )
+        logger.info(f"Removed promo campaign: {campaign_id}")
+        return True
+
+    def export_campaign(
+        self, campaign_id: str, output: TextIO, chunk_size: int = 10000
+    ) -> int:
+        """
+        Stream a campaign to a text file.
+
+        Writes a JSON header line with the shared definition, then one
+        ``CODE,USED`` line per code, in chunks.
+
+        Returns:
+            Number of codes written
+        """
+        campaign = self._campaigns.get(campaign_id)
+        if not campaign:
+            raise ValueError(f"Campaign '{campaign_id}' not found")
+
+        header = {
+            "template": campaign.template.to_dict(),
+            "prefix": campaign.prefix,
+            "length": campaign.length,
+        }
+        output.write(json.dumps(header) + "\n")
+
+        lines: List[str] = []
+        written = 0
+        for code, used in campaign.iter_codes():
+            lines.append(f"{code},{int(used)}\n")
+            if len(lines) >= chunk_size:
+                output.writelines(lines)
+                written += len(lines)
+                lines.clear()
+        output.writelines(lines)
+        return written + len(lines)
+
+    def import_campaign(self, source: TextIO) -> PromoCampaign:
+        """
+        Load a campaign written by export_campaign, reading it line by line.
+
+        Raises:
+            ValueError: If the data is malformed, lists a code twice, or the
+                campaign clashes with an existing one
+        """
+        try:
+            header = json.loads(source.readline())
+            template = PromoCode.from_dict(header["template"])
+            prefix, length = header["prefix"], header["length"]
+        except (KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError("Invalid campaign header") from e
+        self._check_campaign_template(template)
+
+        values = array("Q")
+        used_values = array("Q")
+        for line_number, line in enumerate(source, start=2):
+            line = line.strip()
+            if not line:
+                continue
+            code, _, used = line.partition(",")
+            value = (
+                _decode_code(code[len(prefix) :])
+                if len(code) == len(prefix) + length and code.startswith(prefix)
+                else None
+            )
+            if value is None:
+                raise ValueError(f"Invalid campaign code on line {line_number}")
+            values.append(value)
+            if used == "1":
+                used_values.append(value)
+
+        codes = array("Q", sorted(values))
+        for index in range(1, len(codes)):
+            if codes[index] == codes[index - 1]:
+                duplicate = prefix + _encode_code(codes[index], length)
+                raise ValueError(f"Duplicate campaign code {duplicate}")
+
+        campaign = PromoCampaign(template, prefix, length, codes)
+        for value in used_values:
+            campaign.mark_used(bisect_left(codes, value))
+
+        self._add_campaign(campaign)
+        logger.info(
+            f"Imported promo campaign {campaign.campaign_id} "
+            f"with {campaign.size} codes"
+        )
+        return campaign
+
     def deactivate_promo_code(self, code: str) -> bool:
         """
         Deactivate a promo code.
@@ -317,7 +1239,9 @@ class PromoSystem:
         """
         promo_code = self.get_promo_code(code)
         if promo_code:
+            self._active_codes -= promo_code.active
             promo_code.active = False
+            self._save(promo_code)
             logger.info(f"Deactivated promo code: {code}")
             return True
         return False
@@ -334,7 +1258,7 @@ class PromoSystem:
         """
         code_upper = code.upper()
         if code_upper in self._promo_codes:
-            del self._promo_codes[code_upper]
+            self._remove_code(code_upper)
             logger.info(f"Removed promo code: {code}")
             return True
         return False
@@ -355,18 +1279,32 @@ class PromoSystem:
 
     def cleanup_expired(self) -> List[str]:
         """
-        Clean up expired promo codes.
+        Clean up expired promo codes and release expired reservations.
+
+        Only codes whose expiry has passed are touched.
 
         Returns:
             List of deleted promo code strings
         """
+        self.expire_reservations()
+
         current_time = time.time()
         expired_codes: List[str] = []
+        queue = self._expiry_queue
+
+        while queue and queue[0][0] < current_time:
+            expires_at, code = heapq.heappop(queue)
+            promo_code = self._promo_codes.get(code)
+            if promo_code is None or not promo_code.expires_at:
+                continue
 
-        for code, promo_code in list(self._promo_codes.items()):
-            if promo_code.expires_at and current_time > promo_code.expires_at:
-                expired_codes.append(code)
-                del self._promo_codes[code]
+            if promo_code.expires_at != expires_at:
+                # Expiry was changed directly; queue the current deadline
+                heapq.heappush(queue, (promo_code.expires_at, code))
+                continue
+
+            expired_codes.append(code)
+            self._remove_code(code)
 
         if expired_codes:
             logger.info(f"Cleaned up {len(expired_codes)} expired promo codes")
@@ -383,13 +1321,21 @@ class PromoSystem:
                 - active_codes
                 - total_uses
                 - max_codes
+                - reserved_uses
+                - expired_reservations
+                - campaigns
+                - campaign_codes
+                - campaign_uses
         """
-        active_codes = sum(1 for code in self._promo_codes.values() if code.active)
-        total_uses = sum(code.used_count for code in self._promo_codes.values())
-
         return {
             "total_codes": len(self._promo_codes),
-            "active_codes": active_codes,
-            "total_uses": total_uses,
+            "active_codes": self._active_codes,
+            "total_uses": self._total_uses,
             "max_codes": self._max_codes,
+            "reserved_uses": len(self._reservations),
+            "expired_reservations": self._expired_reservations,
+            "campaigns": len(self._campaigns),
+            "campaign_codes": self._campaign_codes,
+            # Kept per campaign, as its codes are redeemed under striped locks
+            "campaign_uses": sum(c.used_count for c in self._campaigns.values()),
         }
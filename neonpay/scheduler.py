@@ -0,0 +1,360 @@
+"""
+NEONPAY Scheduler - Outbound Telegram request shaping
+Queues invoices and other Bot API calls so they stay under Telegram's
+global and per-chat send limits, backs off on 429 responses and sends
+high-priority traffic such as renewals ahead of broadcasts
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SendPriority(IntEnum):
+    """Outbound lanes; lower values are sent first"""
+
+    CRITICAL = 0  # Renewals and other time-sensitive invoices
+    NORMAL = 1  # User-initiated invoices
+    BULK = 2  # Marketing broadcasts
+
+
+def retry_after_from_error(error: Optional[BaseException]) -> Optional[float]:
+    """
+    Get the ``retry_after`` delay of a Telegram flood-control error
+
+    Understands ``RateLimitError``, aiogram's ``TelegramRetryAfter``,
+    python-telegram-bot's ``RetryAfter`` and pyTelegramBotAPI's
+    ``ApiTelegramException``, also when an adapter re-raised them wrapped
+    in another exception. Returns None for other errors.
+    """
+    seen: Set[int] = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        value = getattr(error, "retry_after", None)
+        if value is None:
+            result_json = getattr(error, "result_json", None)
+            if isinstance(result_json, dict):
+                value = (result_json.get("parameters") or {}).get("retry_after")
+
+        if value is not None:
+            if hasattr(value, "total_seconds"):
+                value = value.total_seconds()
+            try:
+                return max(float(value), 0.0)
+            except (TypeError, ValueError):
+                return None
+
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class _Job:
+    """A queued outbound call"""
+
+    __slots__ = ("chat_id", "priority", "call", "args", "kwargs", "future", "retries")
+
+    def __init__(
+        self,
+        chat_id: int,
+        priority: SendPriority,
+        call: Callable[..., Awaitable[Any]],
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        future: "asyncio.Future[Any]",
+    ) -> None:
+        self.chat_id = chat_id
+        self.priority = priority
+        self.call = call
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.retries = 0
+
+
+class _Lane:
+    """
+    Jobs of one priority, queued per chat
+
+    Chats take turns: ``ready`` holds chats that may send now in
+    round-robin order and ``waiting`` is a heap of (ready time, chat) for
+    chats still inside their per-chat interval.
+    """
+
+    __slots__ = ("queues", "ready", "waiting")
+
+    def __init__(self) -> None:
+        self.queues: Dict[int, Deque[_Job]] = {}
+        self.ready: Deque[int] = deque()
+        self.waiting: List[Tuple[float, int]] = []
+
+
+class OutboundScheduler:
+    """
+    Rate-shaped queue for outbound Telegram requests
+
+    Starts at most one request every ``1 / global_rate`` seconds and keeps
+    ``per_chat_interval`` seconds between requests to the same chat. A busy
+    chat only delays itself: other chats in its lane keep sending. Lanes
+    are served in ``SendPriority`` order. When a call fails with a 429
+    flood-control error, the whole scheduler pauses for the advertised
+    ``retry_after`` and the call is queued again at the front of its chat,
+    up to ``max_retries`` times.
+    """
+
+    _PRUNE_THRESHOLD = 4096
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        per_chat_interval: float = 1.0,
+        max_in_flight: int = 50,
+        max_retries: int = 3,
+        max_retry_after: float = 300.0,
+    ) -> None:
+        if global_rate <= 0:
+            raise ValueError("Global rate must be positive")
+        if per_chat_interval < 0:
+            raise ValueError("Per-chat interval must be non-negative")
+        if not isinstance(max_in_flight, int) or max_in_flight <= 0:
+            raise ValueError("Max in-flight requests must be a positive integer")
+        if not isinstance(max_retries, int) or max_retries < 0:
+            raise ValueError("Max retries must be a non-negative integer")
+
+        self._interval = 1.0 / global_rate
+        self._per_chat_interval = per_chat_interval
+        self._max_in_flight = max_in_flight
+        self._max_retries = max_retries
+        self._max_retry_after = max_retry_after
+
+        self._lanes = [_Lane() for _ in SendPriority]
+        self._chat_next: Dict[int, float] = {}
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._queued = 0
+        self._in_flight = 0
+
+        self._runner: Optional["asyncio.Task[None]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+        self._sent = 0
+        self._rate_limited = 0
+        self._failed = 0
+
+    async def submit(
+        self,
+        chat_id: int,
+        call: Callable[..., Awaitable[Any]],
+        *args: Any,
+        priority: SendPriority = SendPriority.NORMAL,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Queue ``call(*args, **kwargs)`` for ``chat_id`` and wait for its result
+
+        Errors raised by the call are re-raised here once retries are used up.
+        """
+        self._ensure_running()
+        assert self._wakeup is not None  # nosec B101
+
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(chat_id, SendPriority(priority), call, args, kwargs, future)
+        self._enqueue(job)
+        self._wakeup.set()
+        return await future
+
+    async def send_invoice(
+        self,
+        adapter: Any,
+        user_id: int,
+        stage: Any,
+        priority: SendPriority = SendPriority.NORMAL,
+    ) -> bool:
+        """Queue an invoice sent through ``adapter``"""
+        return bool(
+            await self.submit(
+                user_id, adapter.send_invoice, user_id, stage, priority=priority
+            )
+        )
+
+    def pause(self, seconds: float) -> None:
+        """Hold all sending for ``seconds``"""
+        until = time.monotonic() + min(max(seconds, 0.0), self._max_retry_after)
+        self._paused_until = max(self._paused_until, until)
+
+    def _ensure_running(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.ensure_future(self._run())
+
+    def _enqueue(self, job: _Job, front: bool = False) -> None:
+        lane = self._lanes[job.priority]
+        queue = lane.queues.get(job.chat_id)
+        if queue is None:
+            queue = lane.queues[job.chat_id] = deque()
+            lane.ready.append(job.chat_id)
+        if front:
+            queue.appendleft(job)
+        else:
+            queue.append(job)
+        self._queued += 1
+
+    def _pop_job(self, now: float) -> Optional[_Job]:
+        """Take the next job whose chat may send now, highest priority first"""
+        for lane in self._lanes:
+            while lane.waiting and lane.waiting[0][0] <= now:
+                lane.ready.append(heapq.heappop(lane.waiting)[1])
+
+            while lane.ready:
+                chat_id = lane.ready.popleft()
+                ready_at = self._chat_next.get(chat_id, 0.0)
+                if ready_at > now:
+                    # Sent to from another lane since it was queued here
+                    heapq.heappush(lane.waiting, (ready_at, chat_id))
+                    continue
+
+                queue = lane.queues[chat_id]
+                job = queue.popleft()
+                self._queued -= 1
+                # Skip calls whose caller stopped waiting
+                while job.future.done() and queue:
+                    job = queue.popleft()
+                    self._queued -= 1
+
+                if queue:
+                    lane.ready.append(chat_id)
+                else:
+                    del lane.queues[chat_id]
+
+                if job.future.done():
+                    continue
+
+                self._chat_next[chat_id] = now + self._per_chat_interval
+                return job
+        return None
+
+    def _next_ready_at(self) -> Optional[float]:
+        """Earliest time a waiting chat may send again"""
+        times = [lane.waiting[0][0] for lane in self._lanes if lane.waiting]
+        return min(times) if times else None
+
+    async def _sleep_until_woken(self, deadline: Optional[float]) -> None:
+        assert self._wakeup is not None  # nosec B101
+        self._wakeup.clear()
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            gate = max(self._next_slot, self._paused_until)
+            if gate > now:
+                await asyncio.sleep(gate - now)
+                continue
+
+            if self._in_flight >= self._max_in_flight:
+                await self._sleep_until_woken(None)
+                continue
+
+            job = self._pop_job(now)
+            if job is None:
+                await self._sleep_until_woken(self._next_ready_at())
+                continue
+
+            self._next_slot = now + self._interval
+            self._in_flight += 1
+            task = asyncio.ensure_future(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+            if len(self._chat_next) > self._PRUNE_THRESHOLD:
+                self._chat_next = {
+                    chat: ready
+                    for chat, ready in self._chat_next.items()
+                    if ready > now
+                }
+
+    async def _execute(self, job: _Job) -> None:
+        try:
+            result = await job.call(*job.args, **job.kwargs)
+        except Exception as e:
+            retry_after = retry_after_from_error(e)
+            if retry_after is None or job.retries >= self._max_retries:
+                self._failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+
+            self._rate_limited += 1
+            job.retries += 1
+            self._defer(job, retry_after)
+            logger.warning(
+                f"Rate limited by Telegram, retrying chat {job.chat_id} "
+                f"in {retry_after:g}s"
+            )
+        else:
+            self._sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _defer(self, job: _Job, retry_after: float) -> None:
+        """Requeue a rate-limited job and hold sending for ``retry_after``"""
+        self.pause(retry_after)
+        self._chat_next[job.chat_id] = max(
+            self._chat_next.get(job.chat_id, 0.0), self._paused_until
+        )
+        self._enqueue(job, front=True)
+
+    async def close(self) -> None:
+        """Cancel queued calls and wait for in-flight ones to finish"""
+        for lane in self._lanes:
+            for queue in lane.queues.values():
+                for job in queue:
+                    job.future.cancel()
+            lane.queues.clear()
+            lane.ready.clear()
+            lane.waiting.clear()
+        self._queued = 0
+
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduler statistics"""
+        return {
+            "queued": self._queued,
+            "queued_by_priority": {
+                priority.name.lower(): sum(
+                    len(queue) for queue in self._lanes[priority].queues.values()
+                )
+                for priority in SendPriority
+            },
+            "in_flight": self._in_flight,
+            "sent": self._sent,
+            "failed": self._failed,
+            "rate_limited": self._rate_limited,
+            "paused_for": max(self._paused_until - time.monotonic(), 0.0),
+            "global_rate": 1.0 / self._interval,
+            "per_chat_interval": self._per_chat_interval,
+        }
@@ -6,14 +6,27 @@ Provides comprehensive security features for payment processing
 import hashlib
 import hmac
 import logging
+import math
 import time
-from collections import defaultdict, deque
-from dataclasses import dataclass, field
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
 from enum import Enum
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Deque, Dict, List, Optional, Tuple, Type, Union
+
+from .ipfilter import IPBlocklist
+from .storage import BLOCKED_USERS, SECURITY_PROFILES, StorageBackend
 
 logger = logging.getLogger(__name__)
 
+# Suspicious activity types counted per user for fraud checks:
+# event type -> (window in seconds, events allowed within the window)
+FRAUD_WINDOWS: Dict[str, Tuple[float, int]] = {
+    "payment_completion": (300, 5),
+    "high_amount_payment": (3600, 2),
+}
+HIGH_AMOUNT_THRESHOLD = 1000  # Stars
+
 
 class ThreatLevel(Enum):
     """Security threat levels"""
@@ -24,6 +37,17 @@ class ThreatLevel(Enum):
     CRITICAL = "critical"
 
 
+# Risk added per suspicious activity; scores halve every half-life
+DEFAULT_THREAT_WEIGHTS: Dict[ThreatLevel, float] = {
+    ThreatLevel.LOW: 1,
+    ThreatLevel.MEDIUM: 5,
+    ThreatLevel.HIGH: 15,
+    ThreatLevel.CRITICAL: 50,
+}
+DEFAULT_RISK_HALF_LIFE = 24 * 60 * 60
+MAX_RISK_SCORE = 100.0
+
+
 class ActionType(Enum):
     """Types of actions that can be rate limited"""
 
@@ -68,13 +92,24 @@ class SecurityEvent:
     user_agent: Optional[str] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dictionary"""
+        data = asdict(self)
+        data["threat_level"] = self.threat_level.value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SecurityEvent":
+        """Create an event from to_dict() output"""
+        return cls(**{**data, "threat_level": ThreatLevel(data["threat_level"])})
+
 
 @dataclass
 class UserSecurityProfile:
     """User  security profile with risk assessment"""
 
     user_id: int
-    risk_score: float = 0.0
+    risk_score: float = 0.0  # As of risk_updated_at; see current_risk_score()
     is_blocked: bool = False
     blocked_until: Optional[float] = None
     failed_attempts: int = 0
@@ -82,6 +117,47 @@ class UserSecurityProfile:
     suspicious_activities: List[SecurityEvent] = field(default_factory=list)
     trusted: bool = False
     created_at: float = field(default_factory=time.time)
+    risk_updated_at: float = field(default_factory=time.time)
+
+    def __post_init__(self) -> None:
+        # Recent timestamps per FRAUD_WINDOWS event type; holding one more
+        # than the allowance is enough to tell whether it was exceeded
+        self._recent: Dict[str, Deque[float]] = {}
+        for event in self.suspicious_activities:
+            self._track(event)
+
+    def _track(self, event: SecurityEvent) -> None:
+        self.record_recent(event.event_type, event.timestamp)
+
+    def record_recent(self, event_type: str, timestamp: float) -> None:
+        """Count an event of a FRAUD_WINDOWS type; other types are ignored"""
+        window = FRAUD_WINDOWS.get(event_type)
+        if window is None:
+            return
+        recent = self._recent.get(event_type)
+        if recent is None:
+            recent = self._recent[event_type] = deque(maxlen=window[1] + 1)
+        recent.append(timestamp)
+
+    def count_recent(self, event_type: str, current_time: float) -> int:
+        """
+        Count events of a FRAUD_WINDOWS type within its window
+
+        Counts stop at one more than the allowed number of events.
+        """
+        recent = self._recent.get(event_type)
+        if not recent:
+            return 0
+        horizon = current_time - FRAUD_WINDOWS[event_type][0]
+        while recent and recent[0] <= horizon:
+            recent.popleft()
+        return len(recent)
+
+    def has_recent_events(self, current_time: float) -> bool:
+        """Check whether any FRAUD_WINDOWS counter is non-zero"""
+        return any(
+            self.count_recent(event_type, current_time) for event_type in self._recent
+        )
 
     def is_currently_blocked(self) -> bool:
         """Check if user is currently blocked"""
@@ -95,35 +171,271 @@ class UserSecurityProfile:
 
         return True
 
-    def add_suspicious_activity(self, event: SecurityEvent) -> None:
-        """Add suspicious activity to profile"""
+    def current_risk_score(
+        self,
+        half_life: float = DEFAULT_RISK_HALF_LIFE,
+        current_time: Optional[float] = None,
+    ) -> float:
+        """Risk score decayed exponentially since its last update"""
+        if self.risk_score <= 0:
+            return 0.0
+        if current_time is None:
+            current_time = time.time()
+        elapsed = current_time - self.risk_updated_at
+        if elapsed <= 0:
+            return self.risk_score
+        return float(self.risk_score * 0.5 ** (elapsed / half_life))
+
+    def adjust_risk_score(
+        self, delta: float, half_life: float = DEFAULT_RISK_HALF_LIFE
+    ) -> float:
+        """Apply the decay so far, then add ``delta``; returns the new score"""
+        current_time = time.time()
+        score = self.current_risk_score(half_life, current_time) + delta
+        self.risk_score = min(MAX_RISK_SCORE, max(0.0, score))
+        self.risk_updated_at = current_time
+        return self.risk_score
+
+    def add_suspicious_activity(
+        self,
+        event: SecurityEvent,
+        weight: Optional[float] = None,
+        half_life: float = DEFAULT_RISK_HALF_LIFE,
+    ) -> None:
+        """Add suspicious activity to profile and raise its risk score"""
         self.suspicious_activities.append(event)
         self.last_activity = time.time()
+        self._track(event)
 
         # Keep only last 100 events
         if len(self.suspicious_activities) > 100:
-            self.suspicious_activities = self.suspicious_activities[-100:]
-
-        # Update risk score based on threat level
-        threat_scores: Dict[ThreatLevel, int] = {
-            ThreatLevel.LOW: 1,
-            ThreatLevel.MEDIUM: 5,
-            ThreatLevel.HIGH: 15,
-            ThreatLevel.CRITICAL: 50,
-        }
+            del self.suspicious_activities[0]
+
+        if weight is None:
+            weight = DEFAULT_THREAT_WEIGHTS.get(event.threat_level, 1)
+        self.adjust_risk_score(weight, half_life)
 
-        self.risk_score += threat_scores.get(event.threat_level, 1)
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dictionary"""
+        data = asdict(self)
+        data["suspicious_activities"] = [
+            event.to_dict() for event in self.suspicious_activities
+        ]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UserSecurityProfile":
+        """Create a profile from to_dict() output"""
+        activities = [
+            SecurityEvent.from_dict(event)
+            for event in data.get("suspicious_activities", [])
+        ]
+        return cls(**{**data, "suspicious_activities": activities})
 
-        # Decay risk score over time (max 100)
-        self.risk_score = min(100, self.risk_score)
 
+class RateLimitAlgorithm(Enum):
+    """Rate limiting algorithms"""
 
-class RateLimiter:
-    """Rate limiting implementation using sliding window"""
+    SLIDING_WINDOW = "sliding_window"  # Exact, stores every request timestamp
+    GCRA = "gcra"  # Generic cell rate algorithm, one float per key
+
+
+class RateLimiterBackend(ABC):
+    """
+    Storage and decision logic for a rate limiting algorithm
+
+    Keys are opaque integers packed from user ID and action type. Backends
+    keep keys in least-recently-used order so idle state can be evicted
+    from the front.
+    """
+
+    @abstractmethod
+    def hit(
+        self, key: int, limit: RateLimit, current_time: float
+    ) -> Tuple[bool, Optional[int]]:
+        """Record a request if allowed; return (is_allowed, retry_after)"""
+
+    @abstractmethod
+    def remaining(self, key: int, limit: RateLimit, current_time: float) -> int:
+        """Get remaining requests without recording one"""
+
+    @abstractmethod
+    def is_idle(self, key: int, limit: RateLimit, current_time: float) -> bool:
+        """Check if key state is equivalent to a fresh key"""
+
+    @abstractmethod
+    def oldest_key(self) -> Optional[int]:
+        """Get the least recently used key"""
+
+    @abstractmethod
+    def reset(self, key: int) -> None:
+        """Forget all state for key"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of keys with stored state"""
+
+
+class SlidingWindowBackend(RateLimiterBackend):
+    """Sliding window log: exact, O(max_requests) memory per key"""
+
+    def __init__(self) -> None:
+        self._requests: "OrderedDict[int, Deque[float]]" = OrderedDict()
+
+    def hit(
+        self, key: int, limit: RateLimit, current_time: float
+    ) -> Tuple[bool, Optional[int]]:
+        requests = self._requests.get(key)
+        if requests is None:
+            requests = self._requests[key] = deque()
+        else:
+            self._requests.move_to_end(key)
+
+        # Clean old requests
+        while requests and current_time - requests[0] > limit.time_window:
+            requests.popleft()
+
+        # Check if limit exceeded
+        if len(requests) >= limit.max_requests:
+            retry_after = int(limit.time_window - (current_time - requests[0])) + 1
+            return False, retry_after
+
+        requests.append(current_time)
+        return True, None
+
+    def remaining(self, key: int, limit: RateLimit, current_time: float) -> int:
+        requests = self._requests.get(key)
+        if not requests:
+            return limit.max_requests
+
+        while requests and current_time - requests[0] > limit.time_window:
+            requests.popleft()
+
+        return max(0, limit.max_requests - len(requests))
+
+    def is_idle(self, key: int, limit: RateLimit, current_time: float) -> bool:
+        requests = self._requests.get(key)
+        return not requests or current_time - requests[-1] > limit.time_window
+
+    def oldest_key(self) -> Optional[int]:
+        return next(iter(self._requests), None)
+
+    def reset(self, key: int) -> None:
+        self._requests.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+
+class GCRABackend(RateLimiterBackend):
+    """
+    Generic cell rate algorithm (virtual scheduling token bucket)
+
+    Stores only the theoretical arrival time per key, so memory is constant
+    regardless of ``max_requests``. Allows bursts of up to ``max_requests``
+    and refills one request every ``time_window / max_requests`` seconds.
+    """
 
     def __init__(self) -> None:
-        self._requests: Dict[str, deque[float]] = defaultdict(deque)
+        self._tat: "OrderedDict[int, float]" = OrderedDict()
+
+    def hit(
+        self, key: int, limit: RateLimit, current_time: float
+    ) -> Tuple[bool, Optional[int]]:
+        emission_interval = limit.time_window / limit.max_requests
+        tat = self._tat.get(key, current_time)
+        if tat < current_time:
+            tat = current_time
+
+        new_tat = tat + emission_interval
+        allow_at = new_tat - limit.time_window
+        if allow_at - current_time > 1e-9:  # tolerate float rounding
+            return False, int(allow_at - current_time) + 1
+
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        return True, None
+
+    def remaining(self, key: int, limit: RateLimit, current_time: float) -> int:
+        tat = self._tat.get(key)
+        if tat is None or tat <= current_time:
+            return limit.max_requests
+
+        emission_interval = limit.time_window / limit.max_requests
+        free = (current_time + limit.time_window - tat) / emission_interval
+        return max(0, min(limit.max_requests, int(free + 1e-9)))
+
+    def is_idle(self, key: int, limit: RateLimit, current_time: float) -> bool:
+        tat = self._tat.get(key)
+        return tat is None or tat <= current_time
+
+    def oldest_key(self) -> Optional[int]:
+        return next(iter(self._tat), None)
+
+    def reset(self, key: int) -> None:
+        self._tat.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+
+_RATE_LIMITER_BACKENDS: Dict[RateLimitAlgorithm, Type[RateLimiterBackend]] = {
+    RateLimitAlgorithm.SLIDING_WINDOW: SlidingWindowBackend,
+    RateLimitAlgorithm.GCRA: GCRABackend,
+}
+
+# Keys pack (user_id, action) into one int to avoid per-call string building
+_ACTION_INDEX: Dict[ActionType, int] = {
+    action: index for index, action in enumerate(ActionType)
+}
+_ACTIONS_BY_INDEX: Tuple[ActionType, ...] = tuple(ActionType)
+_ACTION_BITS = max(1, (len(ActionType) - 1).bit_length())
+_ACTION_MASK = (1 << _ACTION_BITS) - 1
+
+
+def _rate_limit_key(user_id: int, action_type: ActionType) -> int:
+    """Pack user ID and action type into a single integer key"""
+    return (user_id << _ACTION_BITS) | _ACTION_INDEX[action_type]
+
+
+class RateLimiter:
+    """
+    Rate limiting with pluggable algorithms (sliding window by default)
+
+    Every check also sweeps a few least-recently-used keys whose state has
+    fully expired, and ``max_keys`` caps the number of tracked keys so memory
+    stays bounded under traffic from many distinct users.
+    """
+
+    def __init__(
+        self,
+        algorithm: Union[RateLimitAlgorithm, str] = RateLimitAlgorithm.SLIDING_WINDOW,
+        backend: Optional[RateLimiterBackend] = None,
+        max_keys: Optional[int] = None,
+        sweep_batch: int = 2,
+    ) -> None:
+        if max_keys is not None and (not isinstance(max_keys, int) or max_keys <= 0):
+            raise ValueError("Max keys must be a positive integer")
+        if isinstance(algorithm, str):
+            try:
+                algorithm = RateLimitAlgorithm(algorithm)
+            except ValueError as e:
+                raise ValueError(f"Invalid rate limit algorithm: {algorithm}") from e
+
+        self._algorithm = algorithm
+        self._backend: RateLimiterBackend = (
+            backend if backend is not None else _RATE_LIMITER_BACKENDS[algorithm]()
+        )
         self._limits: Dict[ActionType, RateLimit] = {}
+        self._max_keys = max_keys
+        self._sweep_batch = sweep_batch
+        self._idle_evictions = 0
+        self._capacity_evictions = 0
+
+    @property
+    def algorithm(self) -> RateLimitAlgorithm:
+        """Configured rate limiting algorithm"""
+        return self._algorithm
 
     def set_limit(
         self, action_type: ActionType, max_requests: int, time_window: int
@@ -145,85 +457,139 @@ class RateLimiter:
         Returns:
             (is_allowed, retry_after_seconds)
         """
-        if action_type not in self._limits:
+        limit = self._limits.get(action_type)
+        if limit is None or not limit.enabled:
             return True, None
 
-        limit = self._limits[action_type]
-        if not limit.enabled:
-            return True, None
-
-        key = f"{user_id}:{action_type.value}"
         current_time = time.time()
-
-        # Clean old requests
-        while (
-            self._requests[key]
-            and current_time - self._requests[key][0] > limit.time_window
-        ):
-            self._requests[key].popleft()
-
-        # Check if limit exceeded
-        if len(self._requests[key]) >= limit.max_requests:
-            # Calculate retry after time
-            oldest_request = self._requests[key][0]
-            retry_after = int(limit.time_window - (current_time - oldest_request)) + 1
-            return False, retry_after
-
-        # Add current request
-        self._requests[key].append(current_time)
-        return True, None
+        result = self._backend.hit(
+            _rate_limit_key(user_id, action_type), limit, current_time
+        )
+        self._evict(current_time)
+        return result
+
+    def _evict(self, current_time: float) -> None:
+        """Incrementally evict idle keys and enforce the key cap"""
+        backend = self._backend
+        for _ in range(self._sweep_batch):
+            key = backend.oldest_key()
+            if key is None:
+                break
+            limit = self._limits.get(_ACTIONS_BY_INDEX[key & _ACTION_MASK])
+            if limit is not None and not backend.is_idle(key, limit, current_time):
+                break
+            backend.reset(key)
+            self._idle_evictions += 1
+
+        if self._max_keys is not None:
+            while len(backend) > self._max_keys:
+                key = backend.oldest_key()
+                if key is None:
+                    break
+                backend.reset(key)
+                self._capacity_evictions += 1
 
     def get_remaining_requests(
         self, user_id: int, action_type: ActionType
     ) -> Optional[int]:
         """Get remaining requests for user and action type"""
-        if action_type not in self._limits:
+        limit = self._limits.get(action_type)
+        if limit is None:
             return None
 
-        limit = self._limits[action_type]
-        key = f"{user_id}:{action_type.value}"
-        current_time = time.time()
-
-        # Clean old requests
-        while (
-            self._requests[key]
-            and current_time - self._requests[key][0] > limit.time_window
-        ):
-            self._requests[key].popleft()
-
-        return max(0, limit.max_requests - len(self._requests[key]))
+        return self._backend.remaining(
+            _rate_limit_key(user_id, action_type), limit, time.time()
+        )
 
     def reset_user_limits(self, user_id: int) -> None:
         """Reset all rate limits for a user"""
-        keys_to_remove = [
-            key for key in self._requests.keys() if key.startswith(f"{user_id}:")
-        ]
-        for key in keys_to_remove:
-            del self._requests[key]
+        for action_type in ActionType:
+            self._backend.reset(_rate_limit_key(user_id, action_type))
 
         logger.info(f"Reset rate limits for user {user_id}")
 
+    def get_eviction_stats(self) -> Dict[str, int]:
+        """Get key eviction counters"""
+        return {
+            "tracked_keys": len(self._backend),
+            "idle_evictions": self._idle_evictions,
+            "capacity_evictions": self._capacity_evictions,
+        }
+
+    def __len__(self) -> int:
+        """Number of tracked (user, action) keys"""
+        return len(self._backend)
+
 
 class SecurityManager:
     """
     Comprehensive security management system
 
-    Provides rate limiting, fraud detection, and user protection
+    Provides rate limiting, fraud detection, and user protection.
+    Suspicious activity raises a user's risk score by the weight of its
+    threat level; scores decay continuously, halving every
+    ``risk_half_life`` seconds, and are computed on read.
+    User profiles are only created when there is something to remember and
+    are evicted automatically once idle, or when ``max_profiles`` is hit.
+    With a storage backend, profiles are saved on every change and profiles
+    evicted for capacity are read back on their next lookup.
     """
 
+    _PROFILE_SWEEP_BATCH = 2
+    _MAX_EVICTION_ATTEMPTS = 16
+    _MAX_SECURITY_EVENTS = 10000
+
     def __init__(
         self,
         webhook_secret: Optional[str] = None,
         max_risk_score: float = 80.0,
+        risk_half_life: float = DEFAULT_RISK_HALF_LIFE,
+        threat_weights: Optional[Dict[ThreatLevel, float]] = None,
         auto_block_enabled: bool = True,
+        rate_limit_algorithm: Union[
+            RateLimitAlgorithm, str
+        ] = RateLimitAlgorithm.SLIDING_WINDOW,
+        max_profiles: int = 100000,
+        profile_idle_ttl: int = 30 * 24 * 60 * 60,
+        max_rate_limit_keys: Optional[int] = 1000000,
+        storage: Optional[StorageBackend] = None,
     ) -> None:
-        self._rate_limiter = RateLimiter()
-        self._user_profiles: Dict[int, UserSecurityProfile] = {}
-        self._blocked_ips: Set[str] = set()
+        if not isinstance(max_profiles, int) or max_profiles <= 0:
+            raise ValueError("Max profiles must be a positive integer")
+        if risk_half_life <= 0:
+            raise ValueError("Risk half-life must be positive")
+        weights = {**DEFAULT_THREAT_WEIGHTS, **(threat_weights or {})}
+        if any(
+            not isinstance(weight, (int, float)) or weight < 0
+            for weight in weights.values()
+        ):
+            raise ValueError("Threat weights must be non-negative numbers")
+
+        self._rate_limiter = RateLimiter(
+            rate_limit_algorithm, max_keys=max_rate_limit_keys
+        )
+        self._user_profiles: "OrderedDict[int, UserSecurityProfile]" = OrderedDict()
+        self._max_profiles = max_profiles
+        self._profile_idle_ttl = profile_idle_ttl
+        self._profile_idle_evictions = 0
+        self._profile_capacity_evictions = 0
+        self._blocked_ips = IPBlocklist()
+        # Fast-fail index of blocked users: user ID -> block end (inf if
+        # permanent). Kept in step with every block and unblock and loaded
+        # from storage once, so block checks never read profiles.
+        self._blocked_until: Dict[int, float] = {}
         self._webhook_secret = webhook_secret
         self._max_risk_score = max_risk_score
+        self._risk_half_life = risk_half_life
+        self._threat_weights = weights
         self._auto_block_enabled = auto_block_enabled
-        self._security_events: List[SecurityEvent] = []
+        # Most recent events across all users, oldest first
+        self._security_events: Deque[SecurityEvent] = deque(
+            maxlen=self._MAX_SECURITY_EVENTS
+        )
+        self._storage = storage
+        if storage:
+            self._load_blocked_users(storage)
 
         # Set default rate limits
         self._set_default_limits()
@@ -258,17 +624,125 @@ class SecurityManager:
     ) -> Tuple[bool, Optional[int]]:
         """Check if user action is within rate limits"""
         # Check if user is blocked
-        profile = self._get_user_profile(user_id)
-        if profile.is_currently_blocked():
+        if self.is_user_blocked(user_id):
             return False, None
 
         return self._rate_limiter.is_allowed(user_id, action_type)
 
+    def is_user_blocked(self, user_id: int) -> bool:
+        """Check if user is blocked without loading a security profile"""
+        until = self._blocked_until.get(user_id)
+        if until is None:
+            return False
+        if until > time.time():
+            return True
+        self._unindex_block(user_id)
+        return False
+
+    def _load_blocked_users(self, storage: StorageBackend) -> None:
+        """Fill the fast-fail index from storage, dropping lapsed blocks"""
+        current_time = time.time()
+        for key, data in storage.load_all(BLOCKED_USERS):
+            until = data.get("blocked_until") or math.inf
+            if until > current_time:
+                self._blocked_until[int(key)] = until
+            else:
+                storage.delete(BLOCKED_USERS, key)
+
+    def _index_block(self, profile: UserSecurityProfile) -> None:
+        """Mirror a profile's block state in the fast-fail index"""
+        if not profile.is_blocked:
+            self._unindex_block(profile.user_id)
+            return
+
+        self._blocked_until[profile.user_id] = profile.blocked_until or math.inf
+        if self._storage:
+            self._storage.save(
+                BLOCKED_USERS,
+                str(profile.user_id),
+                {"blocked_until": profile.blocked_until},
+                user_id=profile.user_id,
+            )
+
+    def _unindex_block(self, user_id: int) -> None:
+        if self._blocked_until.pop(user_id, None) is not None and self._storage:
+            self._storage.delete(BLOCKED_USERS, str(user_id))
+
+    def _find_profile(self, user_id: int) -> Optional[UserSecurityProfile]:
+        """Get user security profile from memory or storage, without creating it"""
+        profile = self._user_profiles.get(user_id)
+        if profile is not None or not self._storage:
+            return profile
+
+        data = self._storage.load(SECURITY_PROFILES, str(user_id))
+        if data is None:
+            return None
+
+        profile = self._user_profiles[user_id] = UserSecurityProfile.from_dict(data)
+        self._evict_profiles(exclude=user_id)
+        return profile
+
+    def _save_profile(self, profile: UserSecurityProfile) -> None:
+        if self._storage:
+            self._storage.save(
+                SECURITY_PROFILES,
+                str(profile.user_id),
+                profile,
+                user_id=profile.user_id,
+            )
+
     def _get_user_profile(self, user_id: int) -> UserSecurityProfile:
         """Get or create user security profile"""
-        if user_id not in self._user_profiles:
-            self._user_profiles[user_id] = UserSecurityProfile(user_id=user_id)
-        return self._user_profiles[user_id]
+        profile = self._find_profile(user_id)
+        if profile is not None:
+            self._user_profiles.move_to_end(user_id)
+            return profile
+
+        profile = self._user_profiles[user_id] = UserSecurityProfile(user_id=user_id)
+        self._evict_profiles(exclude=user_id)
+        return profile
+
+    def _is_profile_idle(
+        self, profile: UserSecurityProfile, current_time: float
+    ) -> bool:
+        """Check if a profile carries no state worth keeping"""
+        if profile.trusted or profile.is_currently_blocked():
+            return False
+        if profile.has_recent_events(current_time):
+            return False
+        if profile.risk_score <= 0 and not profile.suspicious_activities:
+            return True
+        return profile.last_activity < current_time - self._profile_idle_ttl
+
+    def _evict_profiles(self, exclude: int) -> None:
+        """Incrementally sweep idle profiles and enforce the profile cap"""
+        profiles = self._user_profiles
+        current_time = time.time()
+
+        # Drop a few idle profiles from the LRU end; stop at the first busy
+        # one so the order keeps reflecting access, not sweep, order
+        for _ in range(min(self._PROFILE_SWEEP_BATCH, len(profiles) - 1)):
+            user_id, profile = next(iter(profiles.items()))
+            if user_id == exclude or not self._is_profile_idle(profile, current_time):
+                break
+            del profiles[user_id]
+            self._profile_idle_evictions += 1
+            if self._storage:
+                self._storage.delete(SECURITY_PROFILES, str(user_id))
+
+        # Over capacity: evict least recently used, never blocked or trusted users
+        attempts = 0
+        while (
+            len(profiles) > self._max_profiles
+            and attempts < self._MAX_EVICTION_ATTEMPTS
+        ):
+            attempts += 1
+            user_id, profile = next(iter(profiles.items()))
+            if user_id == exclude or profile.trusted or profile.is_currently_blocked():
+                profiles.move_to_end(user_id)
+                continue
+            del profiles[user_id]
+            self._profile_capacity_evictions += 1
 
     def report_suspicious_activity(
         self,
@@ -288,14 +762,12 @@ class SecurityManager:
         )
 
         profile = self._get_user_profile(user_id)
-        profile.add_suspicious_activity(event)
+        profile.add_suspicious_activity(
+            event, self._threat_weights.get(threat_level, 1), self._risk_half_life
+        )
 
         self._security_events.append(event)
 
-        # Keep only last 10000 events
-        if len(self._security_events) > 10000:
-            self._security_events = self._security_events[-10000:]
-
         # Auto-block if risk score too high
         if (
             self._auto_block_enabled
@@ -303,6 +775,8 @@ class SecurityManager:
             and not profile.trusted
         ):
             self.block_user(user_id, duration=3600)  # Block for 1 hour
+        else:
+            self._save_profile(profile)
 
         logger.warning(f"Suspicious activity reported: {event_type} for user {user_id}")
 
@@ -316,6 +790,8 @@ class SecurityManager:
 
         # Reset rate limits for blocked user
         self._rate_limiter.reset_user_limits(user_id)
+        self._index_block(profile)
+        self._save_profile(profile)
 
         logger.warning(
             f"User  {user_id} blocked"
@@ -327,7 +803,9 @@ class SecurityManager:
         profile = self._get_user_profile(user_id)
         profile.is_blocked = False
         profile.blocked_until = None
-        profile.risk_score = max(0, profile.risk_score - 20)  # Reduce risk score
+        profile.adjust_risk_score(-20, self._risk_half_life)  # Reduce risk score
+        self._index_block(profile)
+        self._save_profile(profile)
 
         logger.info(f"User  {user_id} unblocked")
 
@@ -339,22 +817,36 @@ class SecurityManager:
 
         if profile.is_blocked:
             self.unblock_user(user_id)
+        else:
+            self._save_profile(profile)
 
         logger.info(f"User  {user_id} marked as trusted")
 
     def block_ip(self, ip_address: str) -> None:
-        """Block IP address"""
+        """Block an IP address or CIDR network such as 203.0.113.0/24"""
         self._blocked_ips.add(ip_address)
         logger.warning(f"IP address blocked: {ip_address}")
 
-    def unblock_ip(self, ip_address: str) -> None:
-        """Unblock IP address"""
-        self._blocked_ips.discard(ip_address)
+    def unblock_ip(self, ip_address: str) -> bool:
+        """Unblock an IP address or CIDR network; returns False if not blocked"""
+        if not self._blocked_ips.remove(ip_address):
+            logger.warning(f"IP address was not blocked: {ip_address}")
+            return False
         logger.info(f"IP address unblocked: {ip_address}")
+        return True
 
     def is_ip_blocked(self, ip_address: str) -> bool:
-        """Check if IP address is blocked"""
-        return ip_address in self._blocked_ips
+        """Check if IP address is blocked, directly or by a blocked network"""
+        return self._blocked_ips.contains(ip_address)
+
+    def load_ip_blocklist(self, path: str) -> int:
+        """Block every address or network listed in a file, one per line"""
+        return self._blocked_ips.load_file(path)
+
+    @property
+    def ip_blocklist(self) -> IPBlocklist:
+        """Blocked IPs, e.g. for ip_filter_middleware in the web servers"""
+        return self._blocked_ips
 
     def verify_webhook_signature(self, payload: bytes, signature: str) -> bool:
         """Verify webhook signature"""
@@ -372,6 +864,15 @@ class SecurityManager:
             logger.error(f"Webhook signature verification failed: {e}")
             return False
 
+    def record_payment(self, user_id: int, amount: int) -> None:
+        """Count a completed payment in the user's fraud check windows"""
+        current_time = time.time()
+        profile = self._get_user_profile(user_id)
+        profile.last_activity = current_time
+        profile.record_recent("payment_completion", current_time)
+        if amount > HIGH_AMOUNT_THRESHOLD:
+            profile.record_recent("high_amount_payment", current_time)
+
     def detect_payment_fraud(
         self, user_id: int, amount: int, payment_method: str = "telegram_stars"
     ) -> Tuple[bool, str]:
@@ -381,52 +882,41 @@ class SecurityManager:
         Returns:
             (is_fraudulent, reason)
         """
-        profile = self._get_user_profile(user_id)
+        profile = self._find_profile(user_id)
+        if profile is None:
+            # No security history: nothing can flag this payment
+            return False, ""
 
         # Check if user is blocked
         if profile.is_currently_blocked():
             return True, "User  is blocked"
 
         # Check high risk score
-        if profile.risk_score > self._max_risk_score:
+        current_time = time.time()
+        risk_score = profile.current_risk_score(self._risk_half_life, current_time)
+        if risk_score > self._max_risk_score:
             return True, "High risk score"
 
         # Check for rapid successive payments
-        recent_events = [
-            event
-            for event in profile.suspicious_activities
-            if (
-                event.event_type == "payment_completion"
-                and time.time() - event.timestamp < 300
-            )  # Last 5 minutes
-        ]
-
-        if len(recent_events) > 5:
+        limit = FRAUD_WINDOWS["payment_completion"][1]
+        if profile.count_recent("payment_completion", current_time) > limit:
             return True, "Too many recent payments"
 
         # Check for unusually high amounts
-        if amount > 1000:  # More than 1000 Stars
-            recent_high_payments = [
-                event
-                for event in profile.suspicious_activities
-                if (
-                    event.event_type == "high_amount_payment"
-                    and time.time() - event.timestamp < 3600
-                )  # Last hour
-            ]
-
-            if len(recent_high_payments) > 2:
+        if amount > HIGH_AMOUNT_THRESHOLD:
+            limit = FRAUD_WINDOWS["high_amount_payment"][1]
+            if profile.count_recent("high_amount_payment", current_time) > limit:
                 return True, "Multiple high-amount payments"
 
         return False, ""
 
     def get_user_risk_assessment(self, user_id: int) -> Dict[str, Any]:
         """Get comprehensive risk assessment for user"""
-        profile = self._get_user_profile(user_id)
+        profile = self._find_profile(user_id) or UserSecurityProfile(user_id=user_id)
 
         return {
             "user_id": user_id,
-            "risk_score": profile.risk_score,
+            "risk_score": round(profile.current_risk_score(self._risk_half_life), 2),
             "is_blocked": profile.is_currently_blocked(),
             "is_trusted": profile.trusted,
             "failed_attempts": profile.failed_attempts,
@@ -441,11 +931,10 @@ class SecurityManager:
         cleaned_count = 0
 
         # Clean old security events
-        old_events_count = len(self._security_events)
-        self._security_events = [
-            event for event in self._security_events if event.timestamp > cutoff_time
-        ]
-        cleaned_count += old_events_count - len(self._security_events)
+        events = self._security_events
+        while events and events[0].timestamp <= cutoff_time:
+            events.popleft()
+            cleaned_count += 1
 
         # Clean old user profile activities
         for profile in self._user_profiles.values():
@@ -456,10 +945,8 @@ class SecurityManager:
                 if activity.timestamp > cutoff_time
             ]
             cleaned_count += old_activities_count - len(profile.suspicious_activities)
-
-            # Decay risk scores for inactive users
-            if profile.last_activity < cutoff_time:
-                profile.risk_score = max(0, profile.risk_score * 0.5)
+            if old_activities_count != len(profile.suspicious_activities):
+                self._save_profile(profile)
 
         logger.info(f"Cleaned up {cleaned_count} old security records")
         return cleaned_count
@@ -471,20 +958,33 @@ class SecurityManager:
             for profile in self._user_profiles.values()
             if profile.is_currently_blocked()
         )
+        current_time = time.time()
         high_risk_users = sum(
-            1 for profile in self._user_profiles.values() if profile.risk_score > 50
+            1
+            for profile in self._user_profiles.values()
+            if profile.current_risk_score(self._risk_half_life, current_time) > 50
         )
         trusted_users = sum(
             1 for profile in self._user_profiles.values() if profile.trusted
         )
+        rate_limit_stats = self._rate_limiter.get_eviction_stats()
 
         return {
             "total_users": len(self._user_profiles),
             "blocked_users": blocked_users,
             "high_risk_users": high_risk_users,
             "trusted_users": trusted_users,
-            "blocked_ips": len(self._blocked_ips),
+            "blocked_ips": self._blocked_ips.get_stats()["networks"],
             "security_events": len(self._security_events),
             "auto_block_enabled": self._auto_block_enabled,
             "max_risk_score": self._max_risk_score,
+            "risk_half_life": self._risk_half_life,
+            "max_profiles": self._max_profiles,
+            "rate_limit_keys": rate_limit_stats["tracked_keys"],
+            "evictions": {
+                "profiles_idle": self._profile_idle_evictions,
+                "profiles_capacity": self._profile_capacity_evictions,
+                "rate_limit_idle": rate_limit_stats["idle_evictions"],
+                "rate_limit_capacity": rate_limit_stats["capacity_evictions"],
+            },
         }
@@ -0,0 +1,342 @@
+"""
+NEONPAY Storage - Durable state for stages, promos, subscriptions and security
+Provides a pluggable storage backend with in-memory and SQLite implementations
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Collection names
+PAYMENT_STAGES = "payment_stages"
+PROMO_CODES = "promo_codes"
+PROMO_CAMPAIGNS = "promo_campaigns"
+PROMO_CAMPAIGN_CODES = "promo_campaign_codes"
+PROMO_CAMPAIGN_USED = "promo_campaign_used"
+SUBSCRIPTION_PLANS = "subscription_plans"
+SUBSCRIPTIONS = "subscriptions"
+SECURITY_PROFILES = "security_profiles"
+BLOCKED_USERS = "blocked_users"
+PROCESSED_PAYMENTS = "processed_payments"
+PAYMENT_QUEUE = "payment_queue"
+
+
+def _to_record(record: Any) -> Dict[str, Any]:
+    """Get the dictionary form of a record or of an object with to_dict()"""
+    return record if isinstance(record, dict) else record.to_dict()
+
+
+def _dumps(record: Any) -> str:
+    """Serialise a record; values JSON cannot represent are stored as strings"""
+    return json.dumps(_to_record(record), default=str)
+
+
+class StorageBackend(ABC):
+    """
+    Key-value record store grouped into collections
+
+    Records are JSON-serialisable dictionaries. ``save`` also accepts any
+    object with a ``to_dict()`` method and converts it before returning,
+    so later changes to the object are only stored by another ``save``.
+    """
+
+    @abstractmethod
+    def save(
+        self, collection: str, key: str, record: Any, user_id: Optional[int] = None
+    ) -> None:
+        """Insert or replace a record, optionally indexed by user ID"""
+
+    @abstractmethod
+    def load(self, collection: str, key: str) -> Optional[Dict[str, Any]]:
+        """Get a record by key"""
+
+    @abstractmethod
+    def delete(self, collection: str, key: str) -> None:
+        """Delete a record if present"""
+
+    @abstractmethod
+    def load_all(self, collection: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Get all (key, record) pairs of a collection"""
+
+    @abstractmethod
+    def load_by_user(self, collection: str, user_id: int) -> List[Dict[str, Any]]:
+        """Get all records of a collection saved for a user"""
+
+    @abstractmethod
+    def delete_older_than(self, collection: str, cutoff: float) -> int:
+        """Delete records last saved before a Unix time; returns how many"""
+
+    def flush(self) -> None:
+        """Write any buffered changes"""
+        # Backends without a write buffer have nothing to do
+        return None
+
+    def close(self) -> None:
+        """Flush and release resources"""
+        self.flush()
+
+
+class MemoryStorage(StorageBackend):
+    """In-process storage backend, mainly for tests and ephemeral setups"""
+
+    def __init__(self) -> None:
+        # collection -> key -> (user_id, JSON data, saved at)
+        self._collections: Dict[str, Dict[str, Tuple[Optional[int], str, float]]] = {}
+
+    def save(
+        self, collection: str, key: str, record: Any, user_id: Optional[int] = None
+    ) -> None:
+        """Insert or replace a record, optionally indexed by user ID"""
+        # Stored as JSON so callers get the same types back as from SQLite
+        data = _dumps(record)
+        entry = (user_id, data, time.time())
+        self._collections.setdefault(collection, {})[key] = entry
+
+    def load(self, collection: str, key: str) -> Optional[Dict[str, Any]]:
+        """Get a record by key"""
+        entry = self._collections.get(collection, {}).get(key)
+        return json.loads(entry[1]) if entry else None
+
+    def delete(self, collection: str, key: str) -> None:
+        """Delete a record if present"""
+        self._collections.get(collection, {}).pop(key, None)
+
+    def load_all(self, collection: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Get all (key, record) pairs of a collection"""
+        return [
+            (key, json.loads(data))
+            for key, (_, data, _) in self._collections.get(collection, {}).items()
+        ]
+
+    def load_by_user(self, collection: str, user_id: int) -> List[Dict[str, Any]]:
+        """Get all records of a collection saved for a user"""
+        return [
+            json.loads(data)
+            for owner, data, _ in self._collections.get(collection, {}).values()
+            if owner == user_id
+        ]
+
+    def delete_older_than(self, collection: str, cutoff: float) -> int:
+        """Delete records last saved before a Unix time; returns how many"""
+        records = self._collections.get(collection, {})
+        old = [key for key, (_, _, saved_at) in records.items() if saved_at < cutoff]
+        for key in old:
+            del records[key]
+        return len(old)
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    SQLite storage backend with write-behind batching
+
+    Uses WAL journaling and a single ``records`` table keyed by
+    (collection, key), with an index on (collection, user_id). Saves and
+    deletes are buffered and written in one transaction once
+    ``batch_size`` changes are pending, and a background thread writes
+    whatever is left every ``flush_interval`` seconds. Changes to the
+    ``write_through`` collections, by default the payment queue and the
+    processed payment log, are written before the call returns. Reads
+    see buffered changes. Call ``close()`` on shutdown to write the final
+    batch.
+    """
+
+    _CREATE_TABLE = (
+        "CREATE TABLE IF NOT EXISTS records ("
+        "collection TEXT NOT NULL, key TEXT NOT NULL, user_id INTEGER, "
+        "data TEXT NOT NULL, updated_at REAL NOT NULL, "
+        "PRIMARY KEY (collection, key)) WITHOUT ROWID"
+    )
+    _CREATE_USER_INDEX = (
+        "CREATE INDEX IF NOT EXISTS records_user "
+        "ON records (collection, user_id) WHERE user_id IS NOT NULL"
+    )
+    # Constant statements are prepared once and reused from sqlite3's cache
+    _UPSERT = (
+        "INSERT OR REPLACE INTO records (collection, key, user_id, data, updated_at) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+    _DELETE = "DELETE FROM records WHERE collection = ? AND key = ?"
+    _SELECT = "SELECT data FROM records WHERE collection = ? AND key = ?"
+    _SELECT_ALL = "SELECT key, data FROM records WHERE collection = ?"
+    _SELECT_BY_USER = (
+        "SELECT key, data FROM records WHERE collection = ? AND user_id = ?"
+    )
+    _DELETE_OLDER = "DELETE FROM records WHERE collection = ? AND updated_at < ?"
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        synchronous: str = "NORMAL",
+        write_through: Iterable[str] = (PAYMENT_QUEUE, PROCESSED_PAYMENTS),
+    ) -> None:
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+
+        if flush_interval < 0:
+            raise ValueError("Flush interval must be non-negative")
+
+        if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Invalid synchronous mode: {synchronous}")
+
+        self._path = path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._write_through = frozenset(write_through)
+        # Adapters may call in from worker threads
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous.upper()}")
+        self._conn.execute(self._CREATE_TABLE)
+        self._conn.execute(self._CREATE_USER_INDEX)
+
+        # (collection, key) -> (user_id, JSON data), or None for a delete
+        self._pending: Dict[Tuple[str, str], Optional[Tuple[Optional[int], str]]] = {}
+        self._last_flush = time.monotonic()
+        self._writes = 0
+        self._batches = 0
+
+        # Writes buffered changes even when no further save comes along
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically,
+                name="neonpay-storage-flush",
+                daemon=True,
+            )
+            self._flusher.start()
+
+        logger.info(f"SQLite storage opened: {path}")
+
+    def save(
+        self, collection: str, key: str, record: Any, user_id: Optional[int] = None
+    ) -> None:
+        """Buffer an insert or replace"""
+        # Serialised on the caller's thread, which owns the object, so the
+        # background flush never reads state that is being changed
+        data = _dumps(record)
+        with self._lock:
+            self._pending[(collection, key)] = (user_id, data)
+            self._maybe_flush(collection)
+
+    def delete(self, collection: str, key: str) -> None:
+        """Buffer a delete"""
+        with self._lock:
+            self._pending[(collection, key)] = None
+            self._maybe_flush(collection)
+
+    def _maybe_flush(self, collection: str) -> None:
+        if (
+            collection in self._write_through
+            or len(self._pending) >= self._batch_size
+            or time.monotonic() - self._last_flush >= self._flush_interval
+        ):
+            self.flush()
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self._flush_interval):
+            try:
+                with self._lock:
+                    if self._pending and not self._closed.is_set():
+                        self.flush()
+            except Exception as e:
+                logger.error(f"Background storage flush failed: {e}")
+
+    def load(self, collection: str, key: str) -> Optional[Dict[str, Any]]:
+        """Get a record by key"""
+        with self._lock:
+            if (collection, key) in self._pending:
+                entry = self._pending[(collection, key)]
+                return json.loads(entry[1]) if entry else None
+
+            row = self._conn.execute(self._SELECT, (collection, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_all(self, collection: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Get all (key, record) pairs of a collection"""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(self._SELECT_ALL, (collection,)).fetchall()
+        return [(key, json.loads(data)) for key, data in rows]
+
+    def load_by_user(self, collection: str, user_id: int) -> List[Dict[str, Any]]:
+        """Get all records of a collection saved for a user"""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                self._SELECT_BY_USER, (collection, user_id)
+            ).fetchall()
+        return [json.loads(data) for _, data in rows]
+
+    def delete_older_than(self, collection: str, cutoff: float) -> int:
+        """Delete records last written before a Unix time; returns how many"""
+        with self._lock:
+            self.flush()
+            return self._conn.execute(self._DELETE_OLDER, (collection, cutoff)).rowcount
+
+    def flush(self) -> None:
+        """Write all buffered changes in one transaction"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+
+            now = time.time()
+            upserts = []
+            deletes = []
+            for (collection, key), entry in self._pending.items():
+                if entry is None:
+                    deletes.append((collection, key))
+                else:
+                    user_id, data = entry
+                    upserts.append((collection, key, user_id, data, now))
+
+            self._conn.execute("BEGIN")
+            try:
+                if upserts:
+                    self._conn.executemany(self._UPSERT, upserts)
+                if deletes:
+                    self._conn.executemany(self._DELETE, deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            self._writes += len(self._pending)
+            self._batches += 1
+            self._pending.clear()
+
+    def close(self) -> None:
+        """Flush pending writes and close the database"""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self._lock:
+            self.flush()
+            self._conn.close()
+        logger.info(f"SQLite storage closed: {self._path}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get storage statistics"""
+        with self._lock:
+            return {
+                "path": self._path,
+                "pending_writes": len(self._pending),
+                "written": self._writes,
+                "batches": self._batches,
+                "batch_size": self._batch_size,
+                "flush_interval": self._flush_interval,
+                "write_through": sorted(self._write_through),
+            }
@@ -4,14 +4,20 @@ Handles subscription-based payments with automatic renewal
 """
 
 import asyncio
+import heapq
 import logging
 import time
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, fields
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .storage import SUBSCRIPTION_PLANS, SUBSCRIPTIONS, StorageBackend
 
 logger = logging.getLogger(__name__)
 
+# Extra delay so the scheduler wakes just after a deadline, not on it
+_SCHEDULER_SLACK = 0.01
+
 
 class SubscriptionStatus(Enum):
     """Subscription status enumeration"""
@@ -95,6 +101,17 @@ class SubscriptionPlan:
             if not isinstance(self.max_subscribers, int) or self.max_subscribers <= 0:
                 raise ValueError("Max subscribers must be a positive integer")
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dictionary"""
+        data = asdict(self)
+        data["period"] = self.period.value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SubscriptionPlan":
+        """Create a plan from to_dict() output"""
+        return cls(**{**data, "period": SubscriptionPeriod(data["period"])})
+
 
 @dataclass
 class Subscription:
@@ -125,6 +142,22 @@ class Subscription:
         if self.plan.trial_days > 0 and self.trial_ends_at is None:
             self.trial_ends_at = time.time() + (self.plan.trial_days * 24 * 60 * 60)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serialisable dictionary, referencing the plan by ID"""
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "plan"}
+        data["plan_id"] = self.plan.plan_id
+        data["status"] = self.status.value
+        data["metadata"] = dict(self.metadata)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], plan: SubscriptionPlan) -> "Subscription":
+        """Create a subscription from to_dict() output"""
+        data = dict(data)
+        del data["plan_id"]
+        data["status"] = SubscriptionStatus(data["status"])
+        return cls(plan=plan, **data)
+
     def is_in_trial(self) -> bool:
         """Check if subscription is in trial period"""
         if not self.trial_ends_at:
@@ -173,7 +206,12 @@ class SubscriptionManager:
     Handles subscription plans, user subscriptions, and automatic renewals
     """
 
-    def __init__(self, max_plans: int = 100, max_subscriptions: int = 10000) -> None:
+    def __init__(
+        self,
+        max_plans: int = 100,
+        max_subscriptions: int = 10000,
+        storage: Optional[StorageBackend] = None,
+    ) -> None:
         self._plans: Dict[str, SubscriptionPlan] = {}
         self._subscriptions: Dict[str, Subscription] = {}
         self._user_subscriptions: Dict[int, List[str]] = (
@@ -185,8 +223,68 @@ class SubscriptionManager:
         self._max_subscriptions = max_subscriptions
         self._auto_renewal_enabled = True
 
+        # Min-heaps of (deadline, subscription_id). Entries are checked
+        # against _scheduled when popped, so rescheduling just pushes anew
+        self._renewal_queue: List[Tuple[float, str]] = []
+        self._expiration_queue: List[Tuple[float, str]] = []
+        # subscription_id -> [next_billing_at, expires_at] currently queued
+        self._scheduled: Dict[str, List[Optional[float]]] = {}
+        self._scheduler_task: Optional[asyncio.Task] = None
+        self._scheduler_wakeup: Optional[asyncio.Event] = None
+        self._scheduler_running = False
+
+        # Incremental counters, updated on every status change
+        self._status_counts: Dict[SubscriptionStatus, int] = {
+            status: 0 for status in SubscriptionStatus
+        }
+        self._plan_active_counts: Dict[str, int] = {}
+        self._total_revenue = 0
+
+        # Persistent backend; None keeps state in memory only
+        self._storage = storage
+        if storage:
+            self._load(storage)
+
         logger.info("SubscriptionManager initialized")
 
+    def _load(self, storage: StorageBackend) -> None:
+        """Restore plans and subscriptions, rebuilding indexes and counters"""
+        for plan_id, data in storage.load_all(SUBSCRIPTION_PLANS):
+            self._plans[plan_id] = SubscriptionPlan.from_dict(data)
+
+        for subscription_id, data in storage.load_all(SUBSCRIPTIONS):
+            plan = self._plans.get(data["plan_id"])
+            if not plan:
+                logger.warning(
+                    f"Skipping subscription {subscription_id}: "
+                    f"plan '{data['plan_id']}' not found"
+                )
+                continue
+
+            subscription = Subscription.from_dict(data, plan)
+            self._subscriptions[subscription_id] = subscription
+            self._user_subscriptions.setdefault(subscription.user_id, []).append(
+                subscription_id
+            )
+            self._count_status(subscription, 1)
+            self._total_revenue += subscription.total_paid
+            self.reschedule(subscription_id)
+
+        if self._plans:
+            logger.info(
+                f"Loaded {len(self._plans)} plans and "
+                f"{len(self._subscriptions)} subscriptions from storage"
+            )
+
+    def _save(self, subscription: Subscription) -> None:
+        if self._storage:
+            self._storage.save(
+                SUBSCRIPTIONS,
+                subscription.subscription_id,
+                subscription,
+                user_id=subscription.user_id,
+            )
+
     def create_plan(
         self,
         plan_id: str,
@@ -222,6 +320,8 @@ class SubscriptionManager:
         )
 
         self._plans[plan_id] = plan
+        if self._storage:
+            self._storage.save(SUBSCRIPTION_PLANS, plan_id, plan)
         logger.info(f"Created subscription plan: {plan_id}")
 
         return plan
@@ -264,12 +364,7 @@ class SubscriptionManager:
 
         # Check plan subscriber limit
         if plan.max_subscribers:
-            active_subs = sum(
-                1
-                for sub in self._subscriptions.values()
-                if sub.plan.plan_id == plan_id and sub.is_active()
-            )
-            if active_subs >= plan.max_subscribers:
+            if self._plan_active_counts.get(plan_id, 0) >= plan.max_subscribers:
                 raise ValueError(f"Plan '{plan_id}' has reached maximum subscribers")
 
         # Generate subscription ID if not provided
@@ -298,6 +393,9 @@ class SubscriptionManager:
             subscription.next_billing_at = subscription.trial_ends_at
 
         self._subscriptions[subscription_id] = subscription
+        self._count_status(subscription, 1)
+        self.reschedule(subscription_id)
+        self._save(subscription)
 
         # Add to user subscriptions
         if user_id not in self._user_subscriptions:
@@ -355,15 +453,17 @@ class SubscriptionManager:
             return False
 
         if immediate:
-            subscription.status = SubscriptionStatus.CANCELLED
+            self._set_status(subscription, SubscriptionStatus.CANCELLED)
             subscription.expires_at = time.time()
         else:
-            subscription.status = SubscriptionStatus.CANCELLED
+            self._set_status(subscription, SubscriptionStatus.CANCELLED)
             # Let it expire at next billing date
             if subscription.next_billing_at:
                 subscription.expires_at = subscription.next_billing_at
 
         subscription.cancelled_at = time.time()
+        self.reschedule(subscription_id)
+        self._save(subscription)
 
         logger.info(f"Cancelled subscription: {subscription_id}")
         return True
@@ -374,7 +474,8 @@ class SubscriptionManager:
         if not subscription or not subscription.is_active():
             return False
 
-        subscription.status = SubscriptionStatus.PAUSED
+        self._set_status(subscription, SubscriptionStatus.PAUSED)
+        self._save(subscription)
         logger.info(f"Paused subscription: {subscription_id}")
         return True
 
@@ -384,8 +485,10 @@ class SubscriptionManager:
         if not subscription or subscription.status != SubscriptionStatus.PAUSED:
             return False
 
-        subscription.status = SubscriptionStatus.ACTIVE
+        self._set_status(subscription, SubscriptionStatus.ACTIVE)
         subscription.next_billing_at = subscription.calculate_next_billing_date()
+        self.reschedule(subscription_id)
+        self._save(subscription)
 
         logger.info(f"Resumed subscription: {subscription_id}")
         return True
@@ -398,7 +501,8 @@ class SubscriptionManager:
 
         subscription.payments_count += 1
         subscription.total_paid += amount
-        subscription.status = SubscriptionStatus.ACTIVE
+        self._total_revenue += amount
+        self._set_status(subscription, SubscriptionStatus.ACTIVE)
 
         # Update billing dates
         subscription.next_billing_at = subscription.calculate_next_billing_date()
@@ -407,6 +511,9 @@ class SubscriptionManager:
         if subscription.is_in_trial():
             subscription.trial_ends_at = time.time()
 
+        self.reschedule(subscription_id)
+        self._save(subscription)
+
         logger.info(
             f"Processed payment for subscription {subscription_id}: {amount} Stars"
         )
@@ -428,35 +535,140 @@ class SubscriptionManager:
         self._expiration_callbacks.append(callback)
         logger.info(f"Expiration callback registered: {callback.__name__}")
 
+    def _count_status(self, subscription: Subscription, delta: int) -> None:
+        """Add delta to the counters for the subscription's status"""
+        self._status_counts[subscription.status] += delta
+        if subscription.status == SubscriptionStatus.ACTIVE:
+            plan_id = subscription.plan.plan_id
+            self._plan_active_counts[plan_id] = (
+                self._plan_active_counts.get(plan_id, 0) + delta
+            )
+
+    def _set_status(
+        self, subscription: Subscription, status: SubscriptionStatus
+    ) -> None:
+        """Change subscription status, keeping counters in step"""
+        if subscription.status == status:
+            return
+
+        self._count_status(subscription, -1)
+        subscription.status = status
+        self._count_status(subscription, 1)
+
+    def get_plan_subscriber_count(self, plan_id: str) -> int:
+        """Get number of active subscribers of a plan"""
+        return self._plan_active_counts.get(plan_id, 0)
+
+    def reschedule(self, subscription_id: str) -> None:
+        """
+        Queue a subscription's renewal and expiration deadlines
+
+        Called on every state change made through the manager; call it
+        after changing next_billing_at or expires_at directly.
+        """
+        subscription = self._subscriptions.get(subscription_id)
+        if not subscription:
+            return
+
+        scheduled = self._scheduled.setdefault(subscription_id, [None, None])
+        for slot, queue, deadline in (
+            (0, self._renewal_queue, subscription.next_billing_at),
+            (1, self._expiration_queue, subscription.expires_at),
+        ):
+            if deadline is None or deadline == scheduled[slot]:
+                continue
+
+            scheduled[slot] = deadline
+            if self._scheduler_wakeup and (not queue or deadline < queue[0][0]):
+                self._scheduler_wakeup.set()
+            heapq.heappush(queue, (deadline, subscription_id))
+
+            # Drop stale entries once they dominate the queue
+            if len(queue) > 2 * len(self._scheduled) + 64:
+                self._rebuild_queue(slot)
+
+        if scheduled == [None, None]:
+            del self._scheduled[subscription_id]
+
+    def _rebuild_queue(self, slot: int) -> None:
+        queue: List[Tuple[float, str]] = []
+        for subscription_id, deadlines in self._scheduled.items():
+            deadline = deadlines[slot]
+            if deadline is not None:
+                queue.append((deadline, subscription_id))
+        heapq.heapify(queue)
+        if slot == 0:
+            self._renewal_queue = queue
+        else:
+            self._expiration_queue = queue
+
+    def _pop_due(self, slot: int, current_time: float) -> List[Subscription]:
+        """Pop subscriptions whose queued deadline has passed"""
+        queue = self._renewal_queue if slot == 0 else self._expiration_queue
+        due = []
+        while queue and queue[0][0] <= current_time:
+            deadline, subscription_id = heapq.heappop(queue)
+            scheduled = self._scheduled.get(subscription_id)
+            subscription = self._subscriptions.get(subscription_id)
+            if not scheduled or scheduled[slot] != deadline:
+                continue  # Superseded by a later reschedule
+
+            scheduled[slot] = None
+            if scheduled == [None, None] or not subscription:
+                del self._scheduled[subscription_id]
+            if subscription:
+                due.append(subscription)
+        return due
+
+    def next_deadline(self) -> Optional[float]:
+        """Earliest queued renewal or expiration deadline"""
+        heads = []
+        for slot, queue in enumerate((self._renewal_queue, self._expiration_queue)):
+            # Discard superseded entries so the head is a live deadline
+            while queue:
+                deadline, subscription_id = queue[0]
+                scheduled = self._scheduled.get(subscription_id)
+                if scheduled and scheduled[slot] == deadline:
+                    heads.append(deadline)
+                    break
+                heapq.heappop(queue)
+        return min(heads) if heads else None
+
+    async def _run_callbacks(
+        self,
+        callbacks: List[Callable[[Subscription], Any]],
+        subscription: Subscription,
+        kind: str,
+    ) -> None:
+        for callback in callbacks:
+            try:
+                if asyncio.iscoroutinefunction(callback):
+                    await callback(subscription)
+                else:
+                    callback(subscription)
+            except Exception as e:
+                logger.error(f"Error in {kind} callback: {e}")
+
     async def _check_renewals(self) -> List[Subscription]:
         """
         Check for subscriptions that need to be renewed
 
+        Only subscriptions whose billing date has passed are touched, and
+        each billing date is reported once.
+
         Returns:
             List of renewed subscriptions
         """
-        """Check for subscriptions that need renewal"""
-        current_time = time.time()
         renewals_needed = []
 
-        for subscription in self._subscriptions.values():
-            if (
-                subscription.is_active()
-                and subscription.next_billing_at
-                and current_time >= subscription.next_billing_at
-            ):
-
+        for subscription in self._pop_due(0, time.time()):
+            if subscription.is_active():
                 renewals_needed.append(subscription)
 
                 # Call renewal callbacks
-                for callback in self._renewal_callbacks:
-                    try:
-                        if asyncio.iscoroutinefunction(callback):
-                            await callback(subscription)
-                        else:
-                            callback(subscription)
-                    except Exception as e:
-                        logger.error(f"Error in renewal callback: {e}")
+                await self._run_callbacks(
+                    self._renewal_callbacks, subscription, "renewal"
+                )
 
         return renewals_needed
 
@@ -467,29 +679,86 @@ class SubscriptionManager:
         Returns:
             List of expired subscriptions
         """
-        """Check for expired subscriptions"""
         expired_subscriptions = []
 
-        for subscription in self._subscriptions.values():
-            if (
-                subscription.is_expired()
-                and subscription.status != SubscriptionStatus.EXPIRED
-            ):
-                subscription.status = SubscriptionStatus.EXPIRED
+        for subscription in self._pop_due(1, time.time()):
+            if not subscription.is_expired():
+                # Due exactly now; expiry needs the deadline to have passed
+                self.reschedule(subscription.subscription_id)
+                continue
+
+            if subscription.status != SubscriptionStatus.EXPIRED:
+                self._set_status(subscription, SubscriptionStatus.EXPIRED)
+                self._save(subscription)
                 expired_subscriptions.append(subscription)
 
                 # Call expiration callbacks
-                for callback in self._expiration_callbacks:
-                    try:
-                        if asyncio.iscoroutinefunction(callback):
-                            await callback(subscription)
-                        else:
-                            callback(subscription)
-                    except Exception as e:
-                        logger.error(f"Error in expiration callback: {e}")
+                await self._run_callbacks(
+                    self._expiration_callbacks, subscription, "expiration"
+                )
 
         return expired_subscriptions
 
+    async def start_scheduler(self, max_sleep: float = 300.0) -> None:
+        """
+        Start the background renewal and expiration scheduler
+
+        The task sleeps until the earliest queued deadline, waking early
+        when an earlier one is scheduled, and at least every max_sleep
+        seconds to follow wall clock adjustments.
+        """
+        if self._scheduler_running:
+            return
+
+        if max_sleep <= 0:
+            raise ValueError("Max sleep must be positive")
+
+        self._scheduler_running = True
+        self._scheduler_wakeup = asyncio.Event()
+        self._scheduler_task = asyncio.create_task(self._scheduler_loop(max_sleep))
+        logger.info("Started subscription scheduler")
+
+    async def stop_scheduler(self) -> None:
+        """Stop the background scheduler"""
+        self._scheduler_running = False
+        if self._scheduler_task:
+            self._scheduler_task.cancel()
+            try:
+                await self._scheduler_task
+            except asyncio.CancelledError:
+                pass
+            self._scheduler_task = None
+        self._scheduler_wakeup = None
+        logger.info("Stopped subscription scheduler")
+
+    async def _scheduler_loop(self, max_sleep: float) -> None:
+        """Fire due renewals and expirations, then sleep until the next one"""
+        while self._scheduler_running:
+            try:
+                await self._check_renewals()
+                await self._check_expirations()
+
+                deadline = self.next_deadline()
+                delay = max_sleep
+                if deadline is not None:
+                    delay = min(
+                        max(deadline - time.time(), 0) + _SCHEDULER_SLACK, max_sleep
+                    )
+
+                wakeup = self._scheduler_wakeup
+                if wakeup is None:
+                    break
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Subscription scheduler error: {e}")
+                await asyncio.sleep(1.0)
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Get subscription statistics
@@ -498,15 +767,15 @@ class SubscriptionManager:
             Dictionary containing subscription statistics
         """
         """Get subscription system statistics"""
-        active_subs = sum(1 for sub in self._subscriptions.values() if sub.is_active())
-        total_revenue = sum(sub.total_paid for sub in self._subscriptions.values())
-
         return {
             "total_plans": len(self._plans),
             "active_plans": sum(1 for plan in self._plans.values() if plan.active),
             "total_subscriptions": len(self._subscriptions),
-            "active_subscriptions": active_subs,
-            "total_revenue": total_revenue,
+            "active_subscriptions": self._status_counts[SubscriptionStatus.ACTIVE],
+            "subscriptions_by_status": {
+                status.value: count for status, count in self._status_counts.items()
+            },
+            "total_revenue": self._total_revenue,
             "total_users": len(self._user_subscriptions),
             "max_plans": self._max_plans,
             "max_subscriptions": self._max_subscriptions,
@@ -11,7 +11,7 @@ from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-import aiohttp
+from .connection_pool import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -101,14 +101,14 @@ class BotConnector:
     async def get_bot_info(self) -> Dict[str, Any]:
         """Get bot information"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/getMe") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        result = data.get("result", {})
-                        return result if isinstance(result, dict) else {}
-                    else:
-                        raise Exception(f"Failed to get bot info: {response.status}")
+            session = await get_http_session()
+            async with session.get(f"{self.base_url}/getMe") as response:
+                if response.status == 200:
+                    data = await response.json()
+                    result = data.get("result", {})
+                    return result if isinstance(result, dict) else {}
+                else:
+                    raise Exception(f"Failed to get bot info: {response.status}")
         except Exception as e:
             logger.error(f"Failed to get bot info for {self.bot_name}: {e}")
             return {}
@@ -119,9 +119,9 @@ class BotConnector:
             return False
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(endpoint, json=data) as response:
-                    return response.status in [200, 201]
+            session = await get_http_session()
+            async with session.post(endpoint, json=data) as response:
+                return response.status in [200, 201]
         except Exception as e:
             logger.error(f"Failed to send data to {endpoint}: {e}")
             return False
@@ -132,13 +132,13 @@ class BotConnector:
             return None
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(endpoint) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data if isinstance(data, dict) else None
-                    else:
-                        return None
+            session = await get_http_session()
+            async with session.get(endpoint) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return data if isinstance(data, dict) else None
+                else:
+                    return None
         except Exception as e:
             logger.error(f"Failed to receive data from {endpoint}: {e}")
             return None
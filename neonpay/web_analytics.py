@@ -12,6 +12,8 @@ from typing import Any, Dict, List, Optional
 from aiohttp import web
 from aiohttp.web import Request, Response
 
+from .ipfilter import IPBlocklist, ip_filter_middleware
+
 logger = logging.getLogger(__name__)
 
 
@@ -255,12 +257,24 @@ class AnalyticsWebHandler:
 
 
 def create_analytics_app(
-    multi_bot_analytics: Any, event_collector: Any, webhook_secret: Optional[str] = None
+    multi_bot_analytics: Any,
+    event_collector: Any,
+    webhook_secret: Optional[str] = None,
+    ip_blocklist: Optional[IPBlocklist] = None,
+    trust_forwarded: bool = False,
 ) -> web.Application:
-    """Create web application for analytics"""
+    """
+    Create web application for analytics
+
+    Requests from IPs in ``ip_blocklist`` are rejected before their body
+    is read.
+    """
     handler = AnalyticsWebHandler(multi_bot_analytics, event_collector, webhook_secret)
 
-    app = web.Application()
+    middlewares: List[Any] = []
+    if ip_blocklist is not None:
+        middlewares.append(ip_filter_middleware(ip_blocklist, trust_forwarded))
+    app = web.Application(middlewares=middlewares)
 
     # Add routes
     app.router.add_post("/analytics/collect", handler.handle_event_collection)
@@ -286,9 +300,17 @@ async def run_analytics_server(
     host: str = "localhost",
     port: int = 8081,
     webhook_secret: Optional[str] = None,
+    ip_blocklist: Optional[IPBlocklist] = None,
+    trust_forwarded: bool = False,
 ) -> None:
     """Run analytics web server"""
-    app = create_analytics_app(multi_bot_analytics, event_collector, webhook_secret)
+    app = create_analytics_app(
+        multi_bot_analytics,
+        event_collector,
+        webhook_secret,
+        ip_blocklist=ip_blocklist,
+        trust_forwarded=trust_forwarded,
+    )
 
     logger.info(f"Starting analytics server on {host}:{port}")
 
@@ -6,11 +6,13 @@ Provides HTTP endpoints for receiving sync data from other bots
 import asyncio
 import logging
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from aiohttp import web
 from aiohttp.web import Request, Response
 
+from .ipfilter import IPBlocklist, ip_filter_middleware
+
 logger = logging.getLogger(__name__)
 
 
@@ -342,12 +344,23 @@ class SyncWebHandler:
 
 
 def create_sync_app(
-    neonpay_instance: Any, webhook_secret: Optional[str] = None
+    neonpay_instance: Any,
+    webhook_secret: Optional[str] = None,
+    ip_blocklist: Optional[IPBlocklist] = None,
+    trust_forwarded: bool = False,
 ) -> web.Application:
-    """Create web application for synchronization"""
+    """
+    Create web application for synchronization
+
+    Requests from IPs in ``ip_blocklist`` are rejected before their body
+    is read.
+    """
     handler = SyncWebHandler(neonpay_instance, webhook_secret)
 
-    app = web.Application()
+    middlewares: List[Any] = []
+    if ip_blocklist is not None:
+        middlewares.append(ip_filter_middleware(ip_blocklist, trust_forwarded))
+    app = web.Application(middlewares=middlewares)
 
     # Add routes
     app.router.add_post("/sync/payment_stages", handler.handle_payment_stages_sync)
@@ -378,9 +391,16 @@ async def run_sync_server(
     host: str = "localhost",
     port: int = 8080,
     webhook_secret: Optional[str] = None,
+    ip_blocklist: Optional[IPBlocklist] = None,
+    trust_forwarded: bool = False,
 ) -> None:
     """Run synchronization web server"""
-    app = create_sync_app(neonpay_instance, webhook_secret)
+    app = create_sync_app(
+        neonpay_instance,
+        webhook_secret,
+        ip_blocklist=ip_blocklist,
+        trust_forwarded=trust_forwarded,
+    )
 
     logger.info(f"Starting sync server on {host}:{port}")
 
@@ -0,0 +1,27 @@
+import pytest
+
+from neonpay.adapters.base import PaymentAdapter
+from neonpay.core import PaymentStage
+
+
+class MockAdapter(PaymentAdapter):
+    def __init__(self):
+        self.sent_invoices = []
+        self.should_fail = False
+
+    async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
+        if self.should_fail:
+            return False
+        self.sent_invoices.append((user_id, stage))
+        return True
+
+    async def setup_handlers(self, payment_callback) -> None:
+        pass
+
+    def get_library_info(self) -> dict:
+        return {"name": "MockAdapter", "version": "1.0.0"}
+
+
+@pytest.fixture
+def mock_adapter():
+    return MockAdapter()
@@ -0,0 +1,380 @@
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+
+from neonpay.analytics import (
+    DAY,
+    MINUTE,
+    AnalyticsCollector,
+    AnalyticsDashboard,
+    AnalyticsEngine,
+    AnalyticsEvent,
+    TimeSeriesRollups,
+)
+from neonpay.event_store import ColumnarEventStore, EventSummary, TimeIndexedEvents
+from neonpay.multi_bot_analytics import MultiBotAnalyticsManager, MultiBotEvent
+
+
+@pytest.fixture
+def events():
+    rng = random.Random(42)
+    now = time.time()
+    result = []
+    for _ in range(3000):
+        # Keep clear of the window edge, which rollups resolve to the minute
+        timestamp = now - rng.uniform(0, 29.5 * DAY)
+        event_type = rng.choice(
+            ["product_view", "add_to_cart", "payment_started", "payment_completed"]
+        )
+        result.append(
+            AnalyticsEvent(
+                event_type=event_type,
+                user_id=rng.randint(1, 300),
+                amount=(
+                    rng.randint(1, 500) if event_type == "payment_completed" else None
+                ),
+                stage_id=rng.choice(["basic_plan", "premium_plan", None]),
+                timestamp=timestamp,
+            )
+        )
+    result.sort(key=lambda event: event.timestamp)
+    return result
+
+
+@pytest.fixture
+def engine(events):
+    collector = AnalyticsCollector()
+    for event in events:
+        collector.track_event(event)
+    return AnalyticsEngine(collector)
+
+
+class TestRollups:
+    def test_revenue_matches_raw_events(self, engine, events):
+        payments = [e for e in events if e.event_type == "payment_completed"]
+        daily = defaultdict(int)
+        hourly = defaultdict(int)
+        for event in payments:
+            date = datetime.fromtimestamp(event.timestamp)
+            daily[date.strftime("%Y-%m-%d")] += event.amount
+            hourly[date.strftime("%H:00")] += event.amount
+
+        revenue = engine.calculate_revenue(days=30)
+
+        assert revenue.total_revenue == sum(e.amount for e in payments)
+        assert revenue.total_transactions == len(payments)
+        assert revenue.daily_breakdown == dict(daily)
+        assert revenue.hourly_breakdown == dict(hourly)
+
+    def test_short_window_uses_fine_buckets(self, engine, events):
+        cutoff = time.time() - 2 * DAY + 120
+        payments = [
+            e
+            for e in events
+            if e.event_type == "payment_completed" and e.timestamp >= cutoff
+        ]
+        revenue = engine.calculate_revenue(days=2)
+        assert revenue.total_transactions == len(payments)
+
+    def test_conversion_matches_raw_events(self, engine, events):
+        conversion = engine.calculate_conversion_rate(days=30)
+        funnel = defaultdict(int)
+        for event in events:
+            funnel[event.event_type] += 1
+
+        assert conversion.total_visitors == len({e.user_id for e in events})
+        assert conversion.total_purchases == funnel["payment_completed"]
+        assert conversion.funnel_steps == dict(funnel)
+
+    def test_product_performance_matches_raw_events(self, engine, events):
+        performance = {p.product_id: p for p in engine.get_product_performance()}
+        for product_id in ("basic_plan", "premium_plan"):
+            views = sum(
+                1
+                for e in events
+                if e.stage_id == product_id and e.event_type == "product_view"
+            )
+            revenue = sum(
+                e.amount
+                for e in events
+                if e.stage_id == product_id and e.event_type == "payment_completed"
+            )
+            assert performance[product_id].views == views
+            assert performance[product_id].total_revenue == revenue
+
+    def test_old_events_outside_window(self, engine):
+        engine.collector.track_event(
+            AnalyticsEvent(
+                event_type="payment_completed",
+                user_id=1,
+                amount=100,
+                timestamp=time.time() - 60 * DAY,
+            )
+        )
+        before = engine.calculate_revenue(days=30).total_revenue
+        assert engine.calculate_revenue(days=90).total_revenue == before + 100
+
+    def test_late_bucket_pruned_in_time_order(self):
+        rollups = TimeSeriesRollups(minute_retention=10 * MINUTE)
+        for minute in (100, 95, 106):
+            rollups.add(AnalyticsEvent("product_view", 1, timestamp=minute * MINUTE))
+
+        # The late minute 95 bucket is past retention, minute 100 is not
+        assert sorted(rollups._levels[0][2]) == [100, 106]
+
+    def test_dashboard_report(self, engine):
+        report = AnalyticsDashboard(engine).generate_report(days=30)
+        assert report["revenue"]["total"] > 0
+        assert report["products"]
+
+
+class TestColumnarStore:
+    def test_get_events_matches_object_storage(self, events):
+        objects = AnalyticsCollector()
+        columnar = AnalyticsCollector(columnar=True)
+        for event in events:
+            objects.track_event(event)
+            columnar.track_event(event)
+
+        start = events[len(events) // 2].timestamp
+        assert columnar.get_event_count() == objects.get_event_count()
+        assert columnar._events is None
+        assert columnar.get_events(start_time=start) == objects.get_events(
+            start_time=start
+        )
+        assert columnar.get_events(event_type="add_to_cart") == objects.get_events(
+            event_type="add_to_cart"
+        )
+
+    def test_ring_buffer_keeps_newest_events(self):
+        store = ColumnarEventStore(capacity=3)
+        for i in range(5):
+            store.append(float(i), i, "product_view", extras={"metadata": {"i": i}})
+
+        assert len(store) == 3
+        rows = [store.row(slot) for slot in store.select()]
+        assert [row[0] for row in rows] == [2.0, 3.0, 4.0]
+        assert [row[6] for row in rows] == [{"metadata": {"i": i}} for i in (2, 3, 4)]
+
+    def test_summary_matches_object_summary(self):
+        store = ColumnarEventStore()
+        rows = [
+            (1000.0, "product_view", None, "basic"),
+            (2000.0, "payment_completed", 100, "basic"),
+            (3000.0, "payment_completed", None, None),
+            (90000.0, "payment_completed", 50, "premium"),
+        ]
+        for timestamp, event_type, amount, product_id in rows:
+            store.append(timestamp, 1, event_type, amount, product_id, bot_id="bot")
+
+        assert store.summarize(bot_id="bot") == EventSummary.from_events(rows)
+        assert store.summarize(bot_id="other").total_events == 0
+        assert store.summarize(start_time=2500).total_revenue == 50
+
+    def test_invalid_capacity(self):
+        with pytest.raises(ValueError):
+            ColumnarEventStore(capacity=0)
+
+
+class TestMultiBotColumnar:
+    @staticmethod
+    def _manager(columnar, now):
+        manager = MultiBotAnalyticsManager(columnar_storage=columnar)
+        rng = random.Random(7)
+        for _ in range(500):
+            event_type = rng.choice(["product_view", "payment_completed"])
+            bot_id = rng.choice(["bot_a", "bot_b"])
+            manager.collector.track_event(
+                MultiBotEvent(
+                    event_type=event_type,
+                    bot_id=bot_id,
+                    bot_name=bot_id,
+                    user_id=rng.randint(1, 50),
+                    amount=(
+                        rng.randint(1, 100)
+                        if event_type == "payment_completed"
+                        else None
+                    ),
+                    product_id=rng.choice(["basic", "premium"]),
+                    metadata={"source": "test"},
+                    timestamp=now - rng.uniform(0, 20 * DAY),
+                )
+            )
+        return manager
+
+    def test_reports_match_object_storage(self):
+        now = time.time()
+        objects = self._manager(columnar=False, now=now)
+        columnar = self._manager(columnar=True, now=now)
+
+        network = columnar.get_network_analytics()
+        assert network == objects.get_network_analytics()
+        assert network.total_events == 500
+        assert columnar.get_bot_analytics("bot_a") == objects.get_bot_analytics("bot_a")
+        assert columnar.get_stats() == objects.get_stats()
+        assert columnar.collector._events is None
+        assert not columnar.collector._bot_events
+
+    def test_get_events_restores_fields(self):
+        manager = self._manager(columnar=True, now=time.time())
+        manager.register_bot("bot_c", "Shop Bot")
+        manager.track_event("product_view", "bot_c", user_id=9, product_id="basic")
+
+        (event,) = manager.collector.get_events(bot_id="bot_c")
+        assert event.bot_name == "Shop Bot"
+        assert event.amount is None
+        assert event.metadata == {}
+
+
+def _event(timestamp, event_type="product_view"):
+    return AnalyticsEvent(event_type=event_type, user_id=1, timestamp=timestamp)
+
+
+class TestTimeIndex:
+    def test_window_and_type_index(self):
+        log = TimeIndexedEvents(maxlen=100)
+        for i in range(50):
+            log.append(_event(float(i), "payment_completed" if i % 5 else "add"))
+
+        assert [e.timestamp for e in log.window(10, 13)] == [10, 11, 12, 13]
+        assert [e.timestamp for e in log.window(10, 16, "add")] == [10, 15]
+        assert log.window(event_type="missing") == []
+
+    def test_out_of_order_inserts(self):
+        log = TimeIndexedEvents(maxlen=100)
+        for timestamp in (1, 5, 3, 4, 2, 5, 0):
+            log.append(_event(float(timestamp)))
+
+        assert [e.timestamp for e in log] == [0, 1, 2, 3, 4, 5, 5]
+        assert [e.timestamp for e in log.window(2, 4)] == [2, 3, 4]
+
+    def test_eviction_drops_oldest(self):
+        log = TimeIndexedEvents(maxlen=3)
+        for i in range(2000):
+            log.append(_event(float(i), "a" if i % 2 else "b"))
+
+        assert len(log) == 3
+        assert [e.timestamp for e in log] == [1997, 1998, 1999]
+        assert [e.timestamp for e in log.window(event_type="b")] == [1998]
+
+    @pytest.mark.parametrize("order", [range(10), [3, 1, 4, 0, 5, 9, 2, 6, 8, 7]])
+    def test_columnar_window(self, order):
+        store = ColumnarEventStore(capacity=6)
+        for timestamp in order:
+            store.append(float(timestamp), 1, "product_view")
+
+        kept = sorted(order[-6:])
+        selected = sorted(store.row(slot)[0] for slot in store.select(2.5, 7))
+        assert selected == [t for t in kept if 2.5 <= t <= 7]
+        assert store.summarize(start_time=2.5, end_time=7).total_events == len(selected)
+
+    def test_columnar_late_events_keep_bisecting(self):
+        store = ColumnarEventStore(capacity=1000)
+        for timestamp in range(500):
+            store.append(float(timestamp), 1, "product_view")
+        store.append(42.5, 2, "product_view")
+        for timestamp in range(500, 900):
+            store.append(float(timestamp), 1, "product_view")
+
+        ranges = store._ranges(40, 45)
+        assert sum(last - first for first, last in ranges) == 7
+        selected = [store.row(slot)[0] for slot in store.select(40, 45)]
+        assert selected == [40, 41, 42, 43, 44, 45, 42.5]
+        assert store.summarize(start_time=700, end_time=710).total_events == 11
+        assert store.get_stats()["late_events"] == 1
+
+
+class TestUniqueUsers:
+    def test_conversion_visitors_estimate(self, events):
+        collector = AnalyticsCollector(unique_users_error_rate=0.02)
+        for event in events:
+            collector.track_event(event)
+
+        conversion = AnalyticsEngine(collector).calculate_conversion_rate(days=30)
+        actual = len({e.user_id for e in events})
+        assert abs(conversion.total_visitors - actual) <= 0.06 * actual
+
+    def test_network_users_merge_across_bots(self):
+        manager = MultiBotAnalyticsManager(unique_users_error_rate=0.02)
+        for user_id in range(600):
+            manager.track_event("product_view", "bot_a", user_id)
+            if user_id % 2:
+                manager.track_event("product_view", "bot_b", user_id + 1000)
+
+        assert abs(manager.get_network_analytics().total_users - 900) <= 54
+        assert abs(manager.get_bot_analytics("bot_b").total_users - 300) <= 18
+
+
+class TestUserSessions:
+    def test_counters_replace_event_lists(self):
+        collector = AnalyticsCollector()
+        for timestamp, amount in ((100.0, None), (300.0, 50), (200.0, 25)):
+            collector.track_event(
+                AnalyticsEvent("payment_completed", 1, amount, timestamp=timestamp)
+            )
+
+        assert collector._user_sessions[1].to_dict() == {
+            "first_seen": 100.0,
+            "last_seen": 300.0,
+            "event_count": 3,
+            "total_spent": 75,
+        }
+
+    def test_idle_sessions_evicted(self):
+        collector = AnalyticsCollector(session_ttl=DAY)
+        collector.track_event(_event(0.0))
+        collector.track_event(AnalyticsEvent("product_view", 2, timestamp=0.5 * DAY))
+        collector.track_event(AnalyticsEvent("product_view", 3, timestamp=1.2 * DAY))
+
+        assert list(collector._user_sessions) == [2, 3]
+
+        with pytest.raises(ValueError):
+            AnalyticsCollector(session_ttl=0)
+
+    def test_active_sessions_with_late_events(self):
+        collector = AnalyticsCollector()
+        for user_id, timestamp in ((1, 10 * DAY), (2, 3 * DAY), (3, 12 * DAY)):
+            collector.track_event(
+                AnalyticsEvent("product_view", user_id, timestamp=timestamp)
+            )
+        # A late event still advances user 2 into the window
+        collector.track_event(AnalyticsEvent("product_view", 2, timestamp=11 * DAY))
+
+        active = dict(collector.iter_active_sessions(10.5 * DAY))
+        assert sorted(active) == [2, 3]
+        assert sorted(dict(collector.iter_active_sessions(0))) == [1, 2, 3]
+
+    def test_bot_sessions_count_distinct_products(self):
+        manager = MultiBotAnalyticsManager()
+        for event_type, product_id in (
+            ("product_view", "basic"),
+            ("product_view", "basic"),
+            ("product_view", "premium"),
+            ("payment_completed", "premium"),
+        ):
+            manager.track_event(event_type, "bot", 1, product_id=product_id)
+
+        activity = manager.get_bot_analytics("bot").user_activity[1]
+        assert activity["products_viewed"] == 2
+        assert activity["products_purchased"] == 1
+        assert activity["event_count"] == 4
+
+    def test_bot_session_product_sets_stay_bounded(self):
+        manager = MultiBotAnalyticsManager()
+        for product in range(300):
+            manager.track_event("product_view", "shop", 1, product_id=f"p{product}")
+        manager.track_event("product_view", "shop", 2, product_id="p299")
+        manager.track_event("product_view", "other", 3, product_id="p299")
+
+        sessions = manager.collector._user_sessions
+        assert sessions["shop"][1].viewed_products == set(range(300))
+        assert sessions["shop"][2].viewed_products == {299}
+        # Indices are per bot, so a small bot keeps a one-bit mask
+        assert sessions["other"][3].viewed_products == 1
+
+        activity = manager.get_bot_analytics("shop").user_activity
+        assert activity[1]["products_viewed"] == 300
+        assert activity[2]["products_viewed"] == 1
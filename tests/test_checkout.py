@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from neonpay.adapters.botapi_adapter import BotAPIAdapter
+from neonpay.checkout import LatencyHistogram, PreCheckoutPipeline, PreCheckoutRequest
+from neonpay.core import NeonPayCore
+from neonpay.security import SecurityManager
+
+
+def request(user_id=42, amount=10):
+    return PreCheckoutRequest("q1", user_id, amount, payload={"sku": "a"})
+
+
+class TestPreCheckoutPipeline:
+    async def test_validators_run_concurrently(self):
+        pipeline = PreCheckoutPipeline()
+
+        async def stock(req):
+            await asyncio.sleep(0.1)
+            return True
+
+        async def fraud(req):
+            await asyncio.sleep(0.1)
+
+        pipeline.add_validator(stock)
+        pipeline.add_validator(fraud)
+        started = time.monotonic()
+        assert await pipeline.check(request()) == (True, None)
+        assert time.monotonic() - started < 0.18
+
+        stats = pipeline.get_stats()
+        assert stats["approved"] == 1
+        assert stats["validator_latency"]["stock"]["count"] == 1
+
+    async def test_first_rejection_wins(self):
+        pipeline = PreCheckoutPipeline()
+        cancelled = []
+
+        async def slow(req):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        pipeline.add_validator(slow)
+        pipeline.add_validator(lambda req: (False, "Out of stock"), name="stock")
+
+        assert await pipeline.check(request()) == (False, "Out of stock")
+        await asyncio.sleep(0)
+        assert cancelled == [True]
+
+    @pytest.mark.parametrize("approve", [False, True])
+    async def test_deadline(self, approve):
+        pipeline = PreCheckoutPipeline(timeout=0.05, approve_on_timeout=approve)
+
+        async def hang(req):
+            await asyncio.sleep(5)
+
+        pipeline.add_validator(hang)
+        started = time.monotonic()
+        ok, _ = await pipeline.check(request())
+        assert ok is approve
+        assert time.monotonic() - started < 0.5
+        assert pipeline.get_stats()["timeouts"] == 1
+
+    async def test_blocking_sync_validator_meets_deadline(self):
+        pipeline = PreCheckoutPipeline(timeout=0.05)
+        pipeline.add_validator(lambda req: time.sleep(0.3), name="slow_db")
+        started = time.monotonic()
+        assert (await pipeline.check(request()))[0] is False
+        assert time.monotonic() - started < 0.2
+        assert pipeline.get_stats()["timeouts"] == 1
+
+        inline = PreCheckoutPipeline(timeout=0.05, threads=0)
+        inline.add_validator(lambda req: time.sleep(0.1), name="slow_db")
+        # Inline sync validators cannot be interrupted
+        assert await inline.check(request()) == (True, None)
+        pipeline.close()
+
+    async def test_blocked_user_fails_fast(self):
+        security = SecurityManager()
+        security.block_user(42, duration=60)
+        pipeline = PreCheckoutPipeline(security=security)
+        calls = []
+        pipeline.add_validator(calls.append)
+
+        ok, error = await pipeline.check(request())
+        assert not ok and error
+        assert calls == []
+        assert pipeline.get_stats()["blocked"] == 1
+
+        security.unblock_user(42)
+        assert (await pipeline.check(request()))[0]
+
+    async def test_failing_validator_rejects(self):
+        pipeline = PreCheckoutPipeline()
+
+        def broken(req):
+            raise RuntimeError("db down")
+
+        pipeline.add_validator(broken)
+        assert not (await pipeline.check(request()))[0]
+        assert pipeline.get_stats()["validator_errors"] == 1
+
+    def test_invalid_timeout(self):
+        with pytest.raises(ValueError):
+            PreCheckoutPipeline(timeout=10)
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(buckets=(1, 10, 100))
+    for latency in (0.5, 5, 5, 50, 500):
+        histogram.record(latency)
+
+    stats = histogram.to_dict()
+    assert stats["buckets"] == {"<=1": 1, "<=10": 2, "<=100": 1, ">100": 1}
+    assert stats["p50_ms"] == 10
+    assert stats["max_ms"] == 500
+
+
+async def test_adapter_answers_with_core_decision():
+    class Bot:
+        def __init__(self):
+            self.answers = []
+
+        def answer_pre_checkout_query(self, **kwargs):
+            self.answers.append(kwargs)
+
+    class User:
+        id = 42
+
+    class Query:
+        id = "q1"
+        from_user = User()
+        total_amount = 10
+        currency = "XTR"
+        invoice_payload = '{"sku": "b"}'
+
+    bot = Bot()
+    core = NeonPayCore(BotAPIAdapter(bot))
+    core.add_pre_checkout_validator(
+        lambda req: (req.payload["sku"] == "a", "Out of stock"), name="stock"
+    )
+    await core.setup()
+
+    await core.adapter.handle_pre_checkout_query(Query())
+    assert bot.answers == [
+        {"pre_checkout_query_id": "q1", "ok": False, "error_message": "Out of stock"}
+    ]
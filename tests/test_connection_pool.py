@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from neonpay.connection_pool import ConnectionPoolConfig, ConnectionPoolManager
+
+
+@pytest.fixture
+async def server_url():
+    async def handler(request):
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/"
+    await runner.cleanup()
+
+
+class TestConnectionPoolConfig:
+    def test_invalid_limit(self):
+        with pytest.raises(ValueError):
+            ConnectionPoolConfig(limit=-1)
+
+    def test_invalid_timeout(self):
+        with pytest.raises(ValueError):
+            ConnectionPoolConfig(request_timeout=0)
+
+
+class TestConnectionPoolManager:
+    @pytest.mark.asyncio
+    async def test_session_is_shared(self):
+        pool = ConnectionPoolManager()
+        first = await pool.get_session()
+        second = await pool.get_session()
+        assert first is second
+        await pool.close()
+        assert first.closed
+
+    @pytest.mark.asyncio
+    async def test_connections_are_reused(self, server_url):
+        pool = ConnectionPoolManager(ConnectionPoolConfig(limit_per_host=1))
+        session = await pool.get_session()
+        for _ in range(3):
+            async with session.get(server_url) as response:
+                assert response.status == 200
+                await response.read()
+
+        stats = pool.get_stats()
+        assert stats["requests"] == 3
+        assert stats["connections_created"] == 1
+        assert stats["connections_reused"] == 2
+        assert stats["open_connections"] == 1
+        await pool.close()
+        assert pool.get_stats()["session_open"] is False
+
+
+def test_session_from_old_loop_is_closed():
+    pool = ConnectionPoolManager()
+    old = asyncio.run(pool.get_session())
+
+    async def reuse():
+        session = await pool.get_session()
+        await pool.close()
+        return session
+
+    new = asyncio.run(reuse())
+    assert new is not old
+    assert old.closed
@@ -1,32 +1,8 @@
 import pytest
 
-from neonpay.adapters.base import PaymentAdapter
 from neonpay.core import NeonPayCore, PaymentResult, PaymentStage, PaymentStatus
 
 
-class MockAdapter(PaymentAdapter):
-    def __init__(self):
-        self.sent_invoices = []
-        self.should_fail = False
-
-    async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
-        if self.should_fail:
-            return False
-        self.sent_invoices.append((user_id, stage))
-        return True
-
-    async def setup_handlers(self, payment_callback) -> None:
-        pass
-
-    def get_library_info(self) -> dict:
-        return {"name": "MockAdapter", "version": "1.0.0"}
-
-
-@pytest.fixture
-def mock_adapter():
-    return MockAdapter()
-
-
 @pytest.fixture
 def neon_pay(mock_adapter):
     return NeonPayCore(mock_adapter)
@@ -154,3 +130,89 @@ class TestNeonPayCore:
         assert len(stages) == 2
         assert "stage1" in stages
         assert "stage2" in stages
+
+
+class TestBulkPayments:
+    @pytest.mark.asyncio
+    async def test_send_payments_bulk_streams_results(self, neon_pay, mock_adapter):
+        stage = PaymentStage(title="Test", description="Description", price=100)
+        neon_pay.create_payment_stage("test_stage", stage)
+
+        results = [
+            result
+            async for result in neon_pay.send_payments_bulk(
+                range(1, 51), "test_stage", concurrency=5, global_rate=10000
+            )
+        ]
+
+        assert len(results) == 50
+        assert all(result.success for result in results)
+        assert sorted(r.user_id for r in results) == list(range(1, 51))
+        assert len(mock_adapter.sent_invoices) == 50
+
+    @pytest.mark.asyncio
+    async def test_send_payments_bulk_reports_failures(self, neon_pay, mock_adapter):
+        stage = PaymentStage(title="Test", description="Description", price=100)
+        neon_pay.create_payment_stage("test_stage", stage)
+        neon_pay.block_user(2)
+        mock_adapter.should_fail = True
+
+        results = {
+            result.user_id: result
+            async for result in neon_pay.send_payments_bulk(
+                [1, 2, -5], "test_stage", global_rate=10000
+            )
+        }
+
+        assert results[1].success is False
+        assert results[2].error == "User is blocked"
+        assert results[-5].error == "Invalid user ID"
+
+    @pytest.mark.asyncio
+    async def test_send_payments_bulk_unknown_stage(self, neon_pay):
+        with pytest.raises(ValueError):
+            async for _ in neon_pay.send_payments_bulk([1], "missing"):
+                pass
+
+
+class TestStageDerivation:
+    def test_stage_is_immutable(self):
+        stage = PaymentStage(title="Item", description="An item", price=100)
+        with pytest.raises(AttributeError):
+            stage.price = 50
+
+    def test_with_price(self):
+        stage = PaymentStage(
+            title="Item", description="An item", price=100, payload={"a": 1}
+        )
+        cheaper = stage.with_price(50)
+        assert cheaper.price == 50 and stage.price == 100
+        assert cheaper.title == stage.title and cheaper.payload is stage.payload
+        with pytest.raises(ValueError):
+            stage.with_price(0)
+
+    def test_replace_validates_changed_fields(self):
+        stage = PaymentStage(title="Item", description="An item", price=100)
+        assert stage.replace(label="Buy").label == "Buy"
+        with pytest.raises(ValueError):
+            stage.replace(title="")
+        with pytest.raises(ValueError):
+            stage.replace(unknown=1)
+
+    def test_trusted_load(self):
+        records = {
+            "basic": {"title": "Basic", "description": "Basic plan", "price": 10},
+            "pro": PaymentStage(
+                title="Pro", description="Pro plan", price=90, label="Upgrade"
+            ).to_dict(),
+        }
+        stages = PaymentStage.load_many(records)
+        assert stages["basic"] == PaymentStage(
+            title="Basic", description="Basic plan", price=10
+        )
+        assert stages["pro"].label == "Upgrade"
+
+        with pytest.raises(ValueError):
+            PaymentStage.from_dict({"title": "No price"}, trusted=True)
+        with pytest.raises(ValueError):
+            PaymentStage.from_dict({**records["basic"], "price": 0})
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+import pytest
+
+from neonpay.core import NeonPayCore, PaymentResult
+from neonpay.dedup import PaymentDeduplicator
+from neonpay.storage import PROCESSED_PAYMENTS, MemoryStorage
+
+
+class TestPaymentDeduplicator:
+    def test_duplicates_rejected(self):
+        dedup = PaymentDeduplicator()
+        assert dedup.claim("charge-1", 42)
+        assert not dedup.claim("charge-1", 42)
+        assert dedup.claim("charge-2", 42)
+        assert dedup.get_stats()["duplicates_dropped"] == 1
+
+    def test_ids_expire_after_window(self):
+        dedup = PaymentDeduplicator(window=100, partitions=4)
+        with patch("neonpay.dedup.time.time", return_value=1000.0):
+            dedup.claim("old")
+        with patch("neonpay.dedup.time.time", return_value=1060.0):
+            assert not dedup.claim("old")
+        with patch("neonpay.dedup.time.time", return_value=1200.0):
+            assert dedup.claim("old")
+            assert dedup.get_stats()["tracked_ids"] == 1
+
+    def test_memory_bounded(self):
+        dedup = PaymentDeduplicator(partitions=4, max_entries=100)
+        for i in range(1000):
+            dedup.claim(f"charge-{i}")
+
+        stats = dedup.get_stats()
+        assert stats["tracked_ids"] <= 100
+        assert stats["capacity_evictions"] >= 900
+        assert not dedup.claim("charge-999")
+
+    def test_storage_catches_duplicates_after_restart(self):
+        storage = MemoryStorage()
+        PaymentDeduplicator(storage=storage).claim("charge-1", 42)
+
+        restarted = PaymentDeduplicator(storage=storage)
+        assert restarted.is_processed("charge-1")
+        assert not restarted.claim("charge-1", 42)
+
+    def test_new_ids_skip_storage_lookup(self):
+        storage = MemoryStorage()
+        first = PaymentDeduplicator(storage=storage, max_entries=1000)
+        for i in range(500):
+            first.claim(f"charge-{i}")
+
+        restarted = PaymentDeduplicator(storage=storage, max_entries=1000)
+        for i in range(500, 1000):
+            assert restarted.claim(f"charge-{i}")
+        # Only Bloom filter false positives reach storage
+        assert restarted.get_stats()["storage_lookups"] < 25
+
+        assert not restarted.claim("charge-42")
+        assert restarted.get_stats()["filter_bytes"] > 0
+
+    def test_stored_ids_expire_after_retention(self):
+        storage = MemoryStorage()
+        dedup = PaymentDeduplicator(window=100, storage=storage, retention=800)
+        with patch("neonpay.dedup.time.time", return_value=1000.0):
+            dedup.claim("old")
+        with patch("neonpay.dedup.time.time", return_value=1500.0):
+            # Outside the window, but still stored
+            assert not dedup.claim("old")
+        with patch("neonpay.dedup.time.time", return_value=2000.0):
+            assert dedup.claim("new")
+            assert storage.load(PROCESSED_PAYMENTS, "old") is None
+            stats = dedup.get_stats()
+            assert stats["storage_pruned"] == 1
+            assert stats["stored_filters"] == 1
+            assert dedup.claim("old")
+
+    def test_invalid_window(self):
+        with pytest.raises(ValueError):
+            PaymentDeduplicator(window=0)
+        with pytest.raises(ValueError):
+            PaymentDeduplicator(window=100, retention=50)
+
+
+async def test_redelivered_payment_handled_once(mock_adapter):
+    core = NeonPayCore(mock_adapter)
+    payments = []
+    core.on_payment(payments.append)
+    result = PaymentResult(user_id=42, amount=10, transaction_id="charge-1")
+
+    await core._handle_payment(result)
+    await core._handle_payment(result)
+    await core._handle_payment(PaymentResult(user_id=42, amount=10))
+
+    assert len(payments) == 2
+    assert core.get_stats()["dedup"]["duplicates_dropped"] == 1
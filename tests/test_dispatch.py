@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from neonpay.core import NeonPayCore, PaymentResult, PaymentStage
+from neonpay.dispatch import CallbackDispatcher
+from neonpay.storage import PAYMENT_QUEUE, MemoryStorage
+
+
+def payment(transaction_id="charge-1", user_id=42):
+    return PaymentResult(
+        user_id=user_id,
+        amount=10,
+        stage=PaymentStage("Item", "An item", 10),
+        transaction_id=transaction_id,
+    )
+
+
+class TestCallbackDispatcher:
+    async def test_callbacks_run_concurrently(self):
+        async def first(result):
+            await asyncio.sleep(0.1)
+
+        def second(result):
+            time.sleep(0.1)
+
+        dispatcher = CallbackDispatcher([first, second])
+        started = time.monotonic()
+        await dispatcher.dispatch(payment())
+        assert time.monotonic() - started < 0.18
+        await dispatcher.close()
+
+    async def test_sync_callbacks_run_off_the_loop(self):
+        threads = []
+        dispatcher = CallbackDispatcher(
+            [lambda r: threads.append(threading.get_ident())]
+        )
+        await dispatcher.dispatch(payment())
+        assert threads and threads[0] != threading.get_ident()
+        await dispatcher.close()
+
+        inline = CallbackDispatcher(
+            [lambda r: threads.append(threading.get_ident())], threads=0
+        )
+        await inline.dispatch(payment())
+        assert threads[-1] == threading.get_ident()
+
+    async def test_failures_and_timeouts_are_isolated(self):
+        calls = []
+
+        async def hang(result):
+            await asyncio.sleep(5)
+
+        def broken(result):
+            raise RuntimeError("db down")
+
+        dispatcher = CallbackDispatcher(
+            [hang, broken, lambda r: calls.append(r.user_id)], timeout=0.05
+        )
+        await dispatcher.dispatch(payment())
+
+        assert calls == [42]
+        stats = dispatcher.get_stats()
+        assert stats["callback_timeouts"] == 1
+        assert stats["callback_errors"] == 1
+        assert stats["callback_latency"]["hang"]["count"] == 1
+        await dispatcher.close()
+
+    async def test_queue_mode_returns_before_callbacks(self):
+        done = asyncio.Event()
+
+        async def slow(result):
+            await asyncio.sleep(0.05)
+            done.set()
+
+        storage = MemoryStorage()
+        dispatcher = CallbackDispatcher([slow], queue=True, storage=storage)
+        await dispatcher.submit(payment())
+        assert not done.is_set()
+        assert storage.load(PAYMENT_QUEUE, "charge-1")
+
+        await dispatcher.drain()
+        assert done.is_set()
+        assert storage.load(PAYMENT_QUEUE, "charge-1") is None
+        await dispatcher.close()
+
+    async def test_saved_payments_replayed_on_start(self):
+        storage = MemoryStorage()
+        storage.save(
+            PAYMENT_QUEUE, "charge-7", {"result": payment("charge-7", 7).to_dict()}
+        )
+        received = []
+
+        dispatcher = CallbackDispatcher([received.append], queue=True, storage=storage)
+        dispatcher.start()
+        await dispatcher.close()
+
+        assert [r.user_id for r in received] == [7]
+        assert received[0].stage.title == "Item"
+        assert dispatcher.get_stats()["replayed"] == 1
+        assert storage.load_all(PAYMENT_QUEUE) == []
+
+    def test_invalid_timeout(self):
+        with pytest.raises(ValueError):
+            CallbackDispatcher([], timeout=0)
+
+
+def test_payment_result_round_trip():
+    result = payment()
+    assert PaymentResult.from_dict(result.to_dict()) == result
+
+
+async def test_core_queue_mode_acknowledges_immediately(mock_adapter):
+    core = NeonPayCore(mock_adapter, enable_security=False, queue_callbacks=True)
+    received = []
+
+    async def slow(result):
+        await asyncio.sleep(0.05)
+        received.append(result.user_id)
+
+    core.on_payment(slow)
+    await core.setup()
+    await core._handle_payment(payment())
+    assert received == []
+
+    await core.close()
+    assert received == [42]
+    assert core.get_stats()["callbacks"]["dispatched"] == 1
@@ -0,0 +1,50 @@
+import pytest
+
+from neonpay.hyperloglog import HyperLogLog, precision_for_error
+
+
+@pytest.mark.parametrize("count", [0, 1, 50, 1000, 20000])
+def test_estimate_within_error_bounds(count):
+    sketch = HyperLogLog(precision=12)
+    for user_id in range(count):
+        sketch.add(user_id)
+        sketch.add(user_id)  # Duplicates do not count
+
+    assert abs(sketch.count() - count) <= max(2, 3 * sketch.error_rate * count)
+
+
+def test_merge_matches_union():
+    first = HyperLogLog(precision=10)
+    second = HyperLogLog(precision=10)
+    union = HyperLogLog(precision=10)
+    for user_id in range(5000):
+        (first if user_id % 3 else second).add(user_id)
+        union.add(user_id)
+    # A small sketch stays sparse and merges into a dense one
+    small = HyperLogLog(precision=10)
+    small.add(1)
+
+    merged = first.copy()
+    merged.merge(second)
+    merged.merge(small)
+    assert merged.count() == union.count()
+    assert first.count() < merged.count()
+
+
+def test_negative_ids():
+    sketch = HyperLogLog()
+    for user_id in range(-100, 0):
+        sketch.add(user_id)
+    assert abs(sketch.count() - 100) <= 5
+
+
+def test_precision_for_error():
+    assert precision_for_error(0.02) == 12
+    assert HyperLogLog.for_error_rate(0.05).error_rate <= 0.05
+
+    with pytest.raises(ValueError):
+        precision_for_error(0)
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=3)
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=10).merge(HyperLogLog(precision=11))
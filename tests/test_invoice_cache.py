@@ -0,0 +1,93 @@
+import gc
+import json
+
+import pytest
+
+from neonpay.adapters.botapi_adapter import BotAPIAdapter
+from neonpay.adapters.invoice_cache import InvoiceCache, PreparedInvoice
+from neonpay.core import PaymentStage
+
+
+class DummyBot:
+    def __init__(self):
+        self.calls = []
+
+    def send_invoice(self, **kwargs):
+        self.calls.append(kwargs)
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {},
+        {"tier": "gold", "nested": {"a": [1, 2]}, "note": "ü"},
+        {"user_id": 7},
+        {"amount": 1, "extra": True},
+        {"user_id": 7, "amount": 1},
+    ],
+)
+def test_user_payload_matches_json_dumps(payload):
+    stage = PaymentStage("Item", "An item", 25, payload=payload)
+    prepared = PreparedInvoice(stage, None)
+
+    for user_id in (1, 123456789):
+        expected = json.dumps({"user_id": user_id, "amount": 25, **payload})
+        assert prepared.user_payload(user_id, 25, payload) == expected
+
+
+def test_cache_reuses_entry_per_stage():
+    builds = []
+    cache = InvoiceCache(lambda stage: builds.append(stage) or stage.price)
+    stage = PaymentStage("Item", "An item", 10)
+
+    assert cache.get(stage) is cache.get(stage)
+    changed = stage.with_price(20)
+    assert cache.get(changed).request == 20
+    assert len(builds) == 2
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_promo_stages_bypass_cache():
+    cache = InvoiceCache(lambda stage: stage.price, max_size=1)
+    hot = PaymentStage("Item", "An item", 10)
+    cache.get(hot)
+    for reservation in ("r1", "r2", "r3"):
+        derived = hot.replace(
+            price=8, payload={"promo_code": "SAVE", "promo_reservation": reservation}
+        )
+        assert cache.get(derived).request == 8
+
+    assert cache.get(hot).request == 10
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["bypassed"]) == (1, 1, 3)
+
+
+def test_cache_drops_collected_and_old_stages():
+    cache = InvoiceCache(lambda stage: None, max_size=2)
+    kept = PaymentStage("Kept", "Kept", 1)
+    cache.get(kept)
+    cache.get(PaymentStage("Temp", "Temp", 1))
+    gc.collect()
+    assert cache.get_stats()["size"] == 1
+
+    cache.get(PaymentStage("A", "A", 1))
+    other = PaymentStage("B", "B", 1)
+    cache.get(other)
+    assert cache.get_stats()["size"] == 2
+
+
+async def test_adapter_invoice_follows_stage_changes():
+    bot = DummyBot()
+    adapter = BotAPIAdapter(bot)
+    stage = PaymentStage("Item", "An item", 10, payload={"sku": "a"})
+
+    await adapter.send_invoice(1, stage)
+    await adapter.send_invoice(2, stage)
+    await adapter.send_invoice(3, stage.with_price(15))
+
+    assert [json.loads(call["payload"]) for call in bot.calls] == [
+        {"user_id": 1, "amount": 10, "sku": "a"},
+        {"user_id": 2, "amount": 10, "sku": "a"},
+        {"user_id": 3, "amount": 15, "sku": "a"},
+    ]
+    assert bot.calls[2]["prices"] == [{"label": "Payment", "amount": 15}]
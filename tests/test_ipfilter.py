@@ -0,0 +1,90 @@
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from neonpay.ipfilter import IPBlocklist
+from neonpay.security import SecurityManager
+from neonpay.web_sync import create_sync_app
+
+
+class TestIPBlocklist:
+    def test_cidr_blocks_whole_range(self):
+        blocklist = IPBlocklist(["10.1.0.0/16", "192.0.2.7"])
+        assert blocklist.contains("10.1.255.3")
+        assert blocklist.contains("192.0.2.7")
+        assert not blocklist.contains("10.2.0.1")
+        assert not blocklist.contains("192.0.2.8")
+        assert blocklist.get_stats()["networks"] == 2
+
+    def test_ipv6_and_mapped_addresses(self):
+        blocklist = IPBlocklist(["2001:db8::/32", "203.0.113.0/24"])
+        assert blocklist.contains("2001:db8:1::1")
+        assert not blocklist.contains("2001:db9::1")
+        assert blocklist.contains("::ffff:203.0.113.9")
+
+    def test_remove_exact_network(self):
+        blocklist = IPBlocklist(["10.0.0.0/8", "10.1.0.0/16"])
+        assert blocklist.remove("10.0.0.0/8")
+        assert blocklist.contains("10.1.2.3")
+        assert not blocklist.contains("10.2.0.1")
+        assert not blocklist.remove("10.0.0.0/8")
+
+        assert blocklist.remove("10.1.0.0/16")
+        assert not blocklist.contains("10.1.2.3")
+        assert blocklist._roots[4].children == [None, None]
+
+    def test_invalid_entries(self):
+        blocklist = IPBlocklist()
+        with pytest.raises(ValueError):
+            blocklist.add("not-an-ip")
+        assert not blocklist.contains("garbage")
+
+    def test_load_file(self, tmp_path):
+        path = tmp_path / "blocklist.txt"
+        path.write_text(
+            "# botnet ranges\n198.51.100.0/24\n\n2001:db8::1  # single host\nbogus\n"
+        )
+        blocklist = IPBlocklist()
+        assert blocklist.load_file(str(path)) == 2
+        assert blocklist.contains("198.51.100.200")
+        assert blocklist.contains("2001:db8::1")
+
+
+def test_security_manager_blocks_networks():
+    security = SecurityManager()
+    security.block_ip("172.16.0.0/12")
+    assert security.is_ip_blocked("172.20.1.1")
+    assert not security.is_ip_blocked("172.32.0.1")
+
+    assert security.unblock_ip("172.16.0.0/12")
+    assert not security.is_ip_blocked("172.20.1.1")
+    assert security.get_security_stats()["blocked_ips"] == 0
+    assert not security.unblock_ip("172.16.0.0/12")
+    assert not security.unblock_ip("198.51.100.0/24")
+
+
+async def test_sync_server_rejects_blocked_ip_before_parsing():
+    blocklist = IPBlocklist(["127.0.0.0/8"])
+    app = create_sync_app(object(), ip_blocklist=blocklist)
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post("/sync/settings", data=b"{not json")
+        assert response.status == 403
+
+        blocklist.remove("127.0.0.0/8")
+        response = await client.get("/health")
+        assert response.status == 200
+
+
+async def test_forwarded_for_uses_proxy_appended_entry():
+    blocklist = IPBlocklist(["198.51.100.0/24"])
+    app = create_sync_app(object(), ip_blocklist=blocklist, trust_forwarded=True)
+    async with TestClient(TestServer(app)) as client:
+        # A blocked client cannot get through by prepending a spoofed entry
+        response = await client.get(
+            "/health", headers={"X-Forwarded-For": "203.0.113.5, 198.51.100.7"}
+        )
+        assert response.status == 403
+
+        response = await client.get(
+            "/health", headers={"X-Forwarded-For": "198.51.100.7, 203.0.113.5"}
+        )
+        assert response.status == 200
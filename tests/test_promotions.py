@@ -0,0 +1,313 @@
+import io
+import threading
+import time
+
+import pytest
+
+from neonpay.core import NeonPayCore, PaymentResult, PaymentStage
+from neonpay.promotions import (
+    CAMPAIGN_LOCK_STRIPES,
+    CAMPAIGN_USED_CHUNK_BYTES,
+    PromoSystem,
+)
+from neonpay.security import ActionType
+from neonpay.storage import PROMO_CAMPAIGN_USED, PROMO_CAMPAIGNS, MemoryStorage
+
+
+@pytest.fixture
+def promos():
+    promos = PromoSystem()
+    promos.create_promo_code("FLASH", "percentage", 50, max_uses=2)
+    return promos
+
+
+class TestReservations:
+    def test_reservations_count_against_limits(self, promos):
+        ok, first = promos.reserve_promo_code("FLASH", 1, 100)
+        assert ok and first.discounted_amount == 50
+        assert promos.reserve_promo_code("FLASH", 2, 100)[0]
+
+        ok, error = promos.reserve_promo_code("FLASH", 3, 100)
+        assert not ok and error == "Promo code usage limit reached"
+        # Per-user limit includes the user's own pending reservation
+        assert not promos.apply_promo_code("FLASH", 1, 100)[0]
+
+    def test_commit_and_release(self, promos):
+        _, reservation = promos.reserve_promo_code("FLASH", 1, 100)
+        _, released = promos.reserve_promo_code("FLASH", 2, 100)
+
+        assert promos.commit_promo_reservation(reservation.reservation_id)
+        assert not promos.commit_promo_reservation(reservation.reservation_id)
+        assert promos.release_promo_reservation(released.reservation_id)
+        assert not promos.commit_promo_reservation(released.reservation_id)
+
+        promo = promos.get_promo_code("FLASH")
+        assert promo.used_count == 1
+        assert promo.used_by == {1: 1}
+        assert promos.get_stats()["reserved_uses"] == 0
+
+    def test_expired_reservations_released(self, promos):
+        promos.reserve_promo_code("FLASH", 1, 100, ttl=-1)
+        promos.reserve_promo_code("FLASH", 2, 100, ttl=-1)
+
+        assert promos.reserve_promo_code("FLASH", 3, 100)[0]
+        assert promos.get_stats()["expired_reservations"] == 2
+
+    def test_cleanup_releases_idle_reservations(self, promos):
+        campaign = promos.create_campaign("idle", 10, "fixed_amount", 5)
+        promos.reserve_promo_code("FLASH", 2, 100)
+        promos.reserve_promo_code("FLASH", 1, 100, ttl=-1)
+        promos.reserve_promo_code(campaign.code_at(2), 1, 100, ttl=-1)
+        assert promos.get_stats()["reserved_uses"] == 3
+
+        # Neither code is touched again before the sweep
+        promos.cleanup_expired()
+        stats = promos.get_stats()
+        assert stats["reserved_uses"] == 1
+        assert stats["expired_reservations"] == 2
+        assert not campaign.is_reserved(2)
+        assert promos.expire_reservations() == 0
+
+    def test_concurrent_reservations_respect_max_uses(self):
+        promos = PromoSystem()
+        promos.create_promo_code("RUSH", "fixed_amount", 5, max_uses=50)
+        results = []
+        barrier = threading.Barrier(8)
+
+        def worker(offset):
+            barrier.wait()
+            for user_id in range(offset, offset + 100):
+                results.append(promos.reserve_promo_code("RUSH", user_id, 100)[0])
+
+        threads = [
+            threading.Thread(target=worker, args=(i * 100 + 1,)) for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results.count(True) == 50
+
+
+class TestCorePromoFlow:
+    async def test_use_consumed_at_payment(self, mock_adapter):
+        core = NeonPayCore(mock_adapter, enable_security=False)
+        core.create_payment_stage("item", PaymentStage("Item", "An item", 100))
+        core.create_promo_code("HALF", "percentage", 50)
+
+        assert await core.send_payment(42, "item", "HALF")
+        _, stage = mock_adapter.sent_invoices[0]
+        assert stage.price == 50
+        assert core.promotions.get_promo_code("HALF").used_count == 0
+
+        await core._handle_payment(
+            PaymentResult(user_id=42, amount=50, metadata=dict(stage.payload))
+        )
+        assert core.promotions.get_promo_code("HALF").used_by == {42: 1}
+
+    async def test_failed_send_releases_reservation(self, mock_adapter):
+        mock_adapter.should_fail = True
+        core = NeonPayCore(mock_adapter, enable_security=False)
+        core.create_payment_stage("item", PaymentStage("Item", "An item", 100))
+        core.create_promo_code("ONCE", "percentage", 50, max_uses=1)
+
+        assert not await core.send_payment(42, "item", "ONCE")
+        assert core.promotions.get_stats()["reserved_uses"] == 0
+        assert core.promotions.validate_promo_code("ONCE", 43, 100)[0]
+
+    async def test_lapsed_reservation_still_recorded(self, mock_adapter):
+        core = NeonPayCore(mock_adapter, enable_security=False)
+        core.create_payment_stage("item", PaymentStage("Item", "An item", 100))
+        core.create_promo_code("LATE", "percentage", 50)
+
+        await core.send_payment(42, "item", "LATE")
+        _, stage = mock_adapter.sent_invoices[0]
+        core.promotions.release_promo_reservation(stage.payload["promo_reservation"])
+
+        await core._handle_payment(
+            PaymentResult(user_id=42, amount=50, metadata=dict(stage.payload))
+        )
+        assert core.promotions.get_promo_code("LATE").used_count == 1
+
+    async def test_rejected_payment_settles_reservation(self, mock_adapter):
+        core = NeonPayCore(mock_adapter)
+        core.create_payment_stage("item", PaymentStage("Item", "An item", 100))
+        core.create_promo_code("HALF", "percentage", 50)
+        core.security.set_rate_limit(ActionType.PAYMENT_COMPLETION, 1, 60)
+
+        await core.send_payment(42, "item", "HALF")
+        _, stage = mock_adapter.sent_invoices[0]
+        # Uses up the completion limit, so the promo payment is rejected
+        await core._handle_payment(PaymentResult(user_id=42, amount=10))
+        await core._handle_payment(
+            PaymentResult(user_id=42, amount=50, metadata=dict(stage.payload))
+        )
+        assert core.promotions.get_stats()["reserved_uses"] == 0
+        assert core.promotions.get_promo_code("HALF").used_count == 1
+
+
+class TestCampaigns:
+    def test_codes_unique_and_single_use(self):
+        promos = PromoSystem(max_codes=1)
+        campaign = promos.create_campaign(
+            "spring", 5000, "percentage", 20, prefix="SPRING-", length=8
+        )
+        codes = [code for code, _ in campaign.iter_codes()]
+        assert len(set(codes)) == 5000
+        assert all(code.startswith("SPRING-") and len(code) == 15 for code in codes)
+
+        ok, price, template = promos.apply_promo_code(codes[10].lower(), 1, 100)
+        assert ok and price == 80 and template is campaign.template
+        ok, error, _ = promos.apply_promo_code(codes[10], 2, 100)
+        assert not ok and error == "Promo code has already been used"
+        assert not promos.validate_promo_code("SPRING-0000000", 1, 100)[0]
+        assert promos.get_stats()["campaign_uses"] == 1
+
+    def test_campaign_reservations(self):
+        promos = PromoSystem()
+        campaign = promos.create_campaign("flash", 10, "fixed_amount", 5)
+        code = campaign.code_at(3)
+
+        ok, reservation = promos.reserve_promo_code(code, 1, 100)
+        assert ok and reservation.campaign_id == "flash"
+        assert not promos.reserve_promo_code(code, 2, 100)[0]
+
+        assert promos.release_promo_reservation(reservation.reservation_id)
+        _, reservation = promos.reserve_promo_code(code, 2, 100)
+        assert promos.commit_promo_reservation(reservation.reservation_id)
+        assert campaign.is_used(3) and not campaign.is_reserved(3)
+
+    def test_campaign_locks_striped(self):
+        promos = PromoSystem()
+        campaign = promos.create_campaign("striped", 2000, length=6)
+        reservations = [
+            promos.reserve_promo_code(campaign.code_at(index), 1, 100)[1]
+            for index in (0, 7, 8, 8 * CAMPAIGN_LOCK_STRIPES)
+        ]
+        states = [promos._reservation_state(r) for r in reservations]
+        # One stripe per bitmap byte, wrapping around
+        assert states[0] is states[1] is states[3]
+        assert states[2] is not states[0]
+        for reservation in reservations:
+            promos.release_promo_reservation(reservation.reservation_id)
+
+        def redeem(indices):
+            for index in indices:
+                promos.apply_promo_code(campaign.code_at(index), 1, 100)
+
+        threads = [
+            threading.Thread(target=redeem, args=(range(start, 2000, 8),))
+            for start in range(1, 8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert campaign.used_count == 2000 - len(range(0, 2000, 8))
+        assert promos.get_stats()["campaign_uses"] == campaign.used_count
+
+    def test_export_import_round_trip(self):
+        promos = PromoSystem()
+        campaign = promos.create_campaign("winter", 1000, prefix="W", length=6)
+        promos.apply_promo_code(campaign.code_at(0), 1, 100)
+        output = io.StringIO()
+        assert promos.export_campaign("winter", output, chunk_size=64) == 1000
+
+        restored = PromoSystem().import_campaign(io.StringIO(output.getvalue()))
+        assert list(restored.iter_codes()) == list(campaign.iter_codes())
+        assert restored.used_count == 1
+
+    def test_overlapping_prefix_rejected(self):
+        promos = PromoSystem()
+        promos.create_campaign("a", 10, prefix="SALE", length=6)
+        with pytest.raises(ValueError):
+            promos.create_campaign("b", 10, prefix="SAL", length=7)
+
+    def test_campaign_persisted(self):
+        storage = MemoryStorage()
+        promos = PromoSystem(storage=storage)
+        campaign = promos.create_campaign("stored", 100, prefix="ST", length=6)
+        promos.apply_promo_code(campaign.code_at(5), 1, 100)
+
+        restored = PromoSystem(storage=storage).get_campaign("stored")
+        assert list(restored.iter_codes()) == list(campaign.iter_codes())
+        assert restored.is_used(5)
+
+    def test_redemption_saves_only_its_chunk(self):
+        storage = MemoryStorage()
+        promos = PromoSystem(storage=storage)
+        campaign = promos.create_campaign("big", 20000, length=6)
+        definition = storage.load(PROMO_CAMPAIGNS, "big")
+        assert storage.load_all(PROMO_CAMPAIGN_USED) == []
+
+        index = 8 * CAMPAIGN_USED_CHUNK_BYTES + 3
+        promos.apply_promo_code(campaign.code_at(index), 1, 100)
+        promos.record_promo_use(campaign.code_at(index + 1), 1)
+        assert storage.load(PROMO_CAMPAIGNS, "big") == definition
+        assert [key for key, _ in storage.load_all(PROMO_CAMPAIGN_USED)] == ["big:1"]
+
+        restored = PromoSystem(storage=storage)
+        assert restored.get_campaign("big").used_count == 2
+        assert restored.get_campaign("big").is_used(index + 1)
+        assert restored.get_stats()["campaign_uses"] == 2
+
+        restored.delete_campaign("big")
+        assert storage.load_all(PROMO_CAMPAIGN_USED) == []
+
+    def test_usage_limits_rejected(self):
+        promos = PromoSystem()
+        with pytest.raises(ValueError):
+            promos.create_campaign("spring", 5, max_uses=1)
+        with pytest.raises(ValueError):
+            promos.create_campaign("spring", 5, user_limit=2)
+        assert promos.get_campaign("spring") is None
+
+    def test_import_rejects_duplicate_codes(self):
+        promos = PromoSystem()
+        campaign = promos.create_campaign("dupes", 5, length=6)
+        output = io.StringIO()
+        promos.export_campaign("dupes", output)
+        code = campaign.code_at(2)
+        data = output.getvalue().replace("dupes", "copy") + f"{code},0\n"
+
+        with pytest.raises(ValueError, match=code):
+            promos.import_campaign(io.StringIO(data))
+
+
+class TestExpiryAndStats:
+    def test_cleanup_removes_only_expired(self):
+        promos = PromoSystem()
+        now = time.time()
+        promos.create_promo_code("OLD", "fixed_amount", 5, expires_at=now - 10)
+        promos.create_promo_code("NEW", "fixed_amount", 5, expires_at=now + 3600)
+        promos.create_promo_code("FOREVER", "fixed_amount", 5)
+        extended = promos.create_promo_code(
+            "EXTENDED", "fixed_amount", 5, expires_at=now - 5
+        )
+        extended.expires_at = now + 60
+
+        assert promos.cleanup_expired() == ["OLD"]
+        assert promos.cleanup_expired() == []
+        assert promos.get_promo_code("EXTENDED") is extended
+        assert promos.get_stats()["total_codes"] == 3
+
+    def test_counters_track_changes(self):
+        promos = PromoSystem()
+        promos.create_promo_code("A", "fixed_amount", 5, user_limit=3)
+        promos.create_promo_code("B", "fixed_amount", 5)
+        promos.apply_promo_code("A", 1, 100)
+        promos.apply_promo_code("A", 2, 100)
+        _, reservation = promos.reserve_promo_code("B", 1, 100)
+        promos.commit_promo_reservation(reservation.reservation_id)
+        promos.deactivate_promo_code("B")
+        promos.deactivate_promo_code("B")
+
+        stats = promos.get_stats()
+        assert stats["active_codes"] == 1
+        assert stats["total_uses"] == 3
+
+        promos.delete_promo_code("A")
+        stats = promos.get_stats()
+        assert stats["active_codes"] == 0
+        assert stats["total_uses"] == 1
@@ -0,0 +1,155 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from neonpay.adapters.raw_api_adapter import RawAPIAdapter
+from neonpay.connection_pool import ConnectionPoolManager
+from neonpay.core import NeonPayCore, PaymentStage
+
+
+def payment_update(update_id, user_id=42, amount=10, payload=None):
+    return {
+        "update_id": update_id,
+        "message": {
+            "from": {"id": user_id},
+            "successful_payment": {
+                "currency": "XTR",
+                "total_amount": amount,
+                "invoice_payload": json.dumps(payload or {}),
+                "telegram_payment_charge_id": f"charge-{update_id}",
+            },
+        },
+    }
+
+
+@pytest.fixture
+async def telegram():
+    """Fake Bot API serving queued updates and recording calls"""
+    state = {"updates": [], "calls": []}
+
+    async def handler(request):
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        state["calls"].append((method, data))
+        if method == "getUpdates":
+            offset = int(data["offset"])
+            updates = [u for u in state["updates"] if u["update_id"] >= offset]
+            if not updates and int(data["timeout"]):
+                await asyncio.sleep(0.05)
+            return web.json_response({"ok": True, "result": updates})
+        return web.json_response({"ok": True, "result": True})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    pool = ConnectionPoolManager()
+
+    adapter = RawAPIAdapter("123:ABC", connection_pool=pool, webhook_secret="s3cret")
+    adapter.api_url = f"http://127.0.0.1:{port}/bot123:ABC"
+    state["adapter"] = adapter
+    yield state
+    await adapter.close()
+    await pool.close()
+    await runner.cleanup()
+
+
+async def test_polling_dispatches_payments_to_core(telegram):
+    adapter = telegram["adapter"]
+    core = NeonPayCore(adapter, enable_security=False)
+    core.create_payment_stage("item", PaymentStage("Item", "An item", 10))
+    payments = []
+    core.on_payment(payments.append)
+    await core.setup()
+
+    telegram["updates"] = [
+        payment_update(1, payload={"stage": "item"}),
+        {
+            "update_id": 2,
+            "pre_checkout_query": {
+                "id": "q1",
+                "from": {"id": 42},
+                "currency": "XTR",
+                "total_amount": 10,
+                "invoice_payload": "{}",
+            },
+        },
+        payment_update(3, user_id=7, amount=5),
+    ]
+    adapter.start_polling(poll_timeout=1)
+    for _ in range(100):
+        if len(payments) == 2:
+            break
+        await asyncio.sleep(0.01)
+    await adapter.stop_polling()
+
+    assert sorted(p.user_id for p in payments) == [7, 42]
+    assert payments[0].transaction_id.startswith("charge-")
+    methods = [method for method, _ in telegram["calls"]]
+    assert "answerPreCheckoutQuery" in methods
+    # The batch is confirmed by the following getUpdates call
+    assert telegram["calls"][-1][1]["offset"] == "4"
+    assert adapter.get_update_stats()["updates_received"] == 3
+
+
+async def test_webhook_checks_secret_and_dispatches(telegram):
+    adapter = telegram["adapter"]
+    payments = []
+    await adapter.setup_handlers(payments.append)
+    body = json.dumps(payment_update(1)).encode()
+
+    def request(token):
+        req = make_mocked_request(
+            "POST",
+            "/webhook",
+            headers={"X-Telegram-Bot-Api-Secret-Token": token},
+        )
+        req.read = lambda: asyncio.sleep(0, body)
+        return req
+
+    assert (await adapter.handle_webhook(request("wrong"))).status == 401
+    assert (await adapter.handle_webhook(request("s3cret"))).status == 200
+    await asyncio.sleep(0)
+    assert [p.amount for p in payments] == [10]
+
+    # Without a secret, webhook updates are refused outright
+    adapter.webhook_secret = None
+    assert (await adapter.handle_webhook(request(""))).status == 401
+    await asyncio.sleep(0)
+    assert len(payments) == 1
+
+
+async def test_webhook_requires_secret():
+    adapter = RawAPIAdapter("123:ABC", webhook_url="https://example.com/hook")
+    with pytest.raises(ValueError):
+        adapter.create_webhook_app()
+    with pytest.raises(ValueError):
+        await adapter.set_webhook()
+
+    adapter.webhook_secret = "s3cret"
+    assert adapter.create_webhook_app().router.routes()
+
+
+async def test_dispatch_concurrency_is_bounded():
+    adapter = RawAPIAdapter("123:ABC", max_concurrent_updates=2)
+    running = 0
+    peak = 0
+
+    async def callback(result):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await adapter.setup_handlers(callback)
+    await adapter.process_updates([payment_update(i) for i in range(1, 7)])
+
+    assert peak == 2
+    assert adapter.get_update_stats()["payments_received"] == 6
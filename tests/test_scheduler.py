@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import pytest
+
+from neonpay.adapters.base import PaymentAdapter
+from neonpay.core import NeonPayCore, PaymentStage
+from neonpay.errors import NeonPayError, RateLimitError
+from neonpay.scheduler import OutboundScheduler, SendPriority, retry_after_from_error
+
+
+class RecordingAdapter(PaymentAdapter):
+    def __init__(self, rate_limited: int = 0):
+        self.sent = []
+        self.rate_limited = rate_limited
+
+    async def send_invoice(self, user_id: int, stage: PaymentStage) -> bool:
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise RateLimitError("Too many requests", retry_after=0.05)
+        self.sent.append((user_id, time.monotonic()))
+        return True
+
+    async def setup_handlers(self, payment_callback) -> None:
+        pass
+
+    def get_library_info(self) -> dict:
+        return {"name": "RecordingAdapter", "version": "1.0.0"}
+
+
+class TestRetryAfter:
+    def test_reads_wrapped_library_errors(self):
+        class ApiTelegramException(Exception):
+            result_json = {"ok": False, "parameters": {"retry_after": 7}}
+
+        try:
+            try:
+                raise ApiTelegramException()
+            except ApiTelegramException as e:
+                raise NeonPayError("Telegram API error") from e
+        except NeonPayError as wrapped:
+            assert retry_after_from_error(wrapped) == 7
+
+        assert retry_after_from_error(RateLimitError("slow", retry_after=3)) == 3
+        assert retry_after_from_error(ValueError("other")) is None
+
+
+class TestOutboundScheduler:
+    async def test_priority_lanes_served_first(self):
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_interval=0)
+        order = []
+
+        async def call(name):
+            order.append(name)
+
+        bulk = [
+            asyncio.ensure_future(
+                scheduler.submit(i, call, f"bulk{i}", priority=SendPriority.BULK)
+            )
+            for i in range(3)
+        ]
+        critical = asyncio.ensure_future(
+            scheduler.submit(99, call, "renewal", priority=SendPriority.CRITICAL)
+        )
+        await asyncio.gather(critical, *bulk)
+        await scheduler.close()
+
+        assert order[0] == "renewal"
+
+    async def test_busy_chat_does_not_block_others(self):
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_interval=0.2)
+        sent = []
+
+        async def call(chat_id):
+            sent.append(chat_id)
+
+        jobs = [scheduler.submit(1, call, 1) for _ in range(2)]
+        jobs += [scheduler.submit(chat_id, call, chat_id) for chat_id in (2, 3)]
+        started = time.monotonic()
+        await asyncio.gather(*jobs)
+        await scheduler.close()
+
+        assert sent == [1, 2, 3, 1]
+        assert time.monotonic() - started >= 0.2
+
+    async def test_global_rate_spacing(self):
+        scheduler = OutboundScheduler(global_rate=50, per_chat_interval=0)
+        adapter = RecordingAdapter()
+        stage = PaymentStage("Item", "An item", 10)
+
+        await asyncio.gather(
+            *(scheduler.send_invoice(adapter, i, stage) for i in range(1, 6))
+        )
+        await scheduler.close()
+
+        times = [sent_at for _, sent_at in adapter.sent]
+        assert times[-1] - times[0] >= 4 / 50 * 0.9
+
+    async def test_rate_limited_call_retried_after_pause(self):
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_interval=0)
+        adapter = RecordingAdapter(rate_limited=1)
+        stage = PaymentStage("Item", "An item", 10)
+
+        started = time.monotonic()
+        assert await scheduler.send_invoice(adapter, 1, stage)
+        assert time.monotonic() - started >= 0.05
+        assert scheduler.get_stats()["rate_limited"] == 1
+        await scheduler.close()
+
+    async def test_retries_exhausted_raises(self):
+        scheduler = OutboundScheduler(
+            global_rate=1000, per_chat_interval=0, max_retries=1
+        )
+        adapter = RecordingAdapter(rate_limited=5)
+        stage = PaymentStage("Item", "An item", 10)
+
+        with pytest.raises(RateLimitError):
+            await scheduler.send_invoice(adapter, 1, stage)
+        await scheduler.close()
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            OutboundScheduler(global_rate=0)
+
+
+class TestCoreScheduling:
+    async def test_send_payment_goes_through_scheduler(self):
+        adapter = RecordingAdapter(rate_limited=1)
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_interval=0)
+        core = NeonPayCore(adapter, enable_security=False, scheduler=scheduler)
+        core.create_payment_stage("item", PaymentStage("Item", "An item", 10))
+
+        assert await core.send_payment(42, "item", priority=SendPriority.CRITICAL)
+        assert [user_id for user_id, _ in adapter.sent] == [42]
+        assert core.scheduler.get_stats()["sent"] == 1
+        await scheduler.close()
+
+    async def test_bulk_send_with_promo_goes_through_scheduler(self):
+        adapter = RecordingAdapter()
+        scheduler = OutboundScheduler(global_rate=1000, per_chat_interval=0)
+        core = NeonPayCore(adapter, enable_security=False, scheduler=scheduler)
+        core.create_payment_stage("item", PaymentStage("Item", "An item", 10))
+        core.create_promo_code("BULK", "percentage", 50, max_uses=2)
+
+        results = [
+            result
+            async for result in core.send_payments_bulk(
+                [1, 2, 3], "item", promo_code="BULK"
+            )
+        ]
+
+        sent = sorted(r.user_id for r in results if r.success)
+        assert len(sent) == 2
+        assert [r.error for r in results if not r.success] == ["Promo code rejected"]
+        assert sorted(user_id for user_id, _ in adapter.sent) == sent
+        assert scheduler.get_stats()["sent"] == 2
+        await scheduler.close()
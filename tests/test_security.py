@@ -0,0 +1,241 @@
+import time
+
+import pytest
+
+from neonpay.core import NeonPayCore, PaymentResult
+from neonpay.security import (
+    ActionType,
+    RateLimitAlgorithm,
+    RateLimiter,
+    SecurityManager,
+    ThreatLevel,
+    UserSecurityProfile,
+)
+
+
+@pytest.fixture(params=list(RateLimitAlgorithm))
+def limiter(request):
+    limiter = RateLimiter(request.param)
+    limiter.set_limit(ActionType.PAYMENT_REQUEST, 3, 60)
+    return limiter
+
+
+class TestRateLimiter:
+    def test_allows_up_to_limit(self, limiter):
+        for _ in range(3):
+            assert limiter.is_allowed(1, ActionType.PAYMENT_REQUEST) == (True, None)
+
+        is_allowed, retry_after = limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)
+        assert is_allowed is False
+        assert retry_after is not None and 0 < retry_after <= 61
+
+    def test_users_are_isolated(self, limiter):
+        for _ in range(3):
+            limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)
+        assert limiter.is_allowed(2, ActionType.PAYMENT_REQUEST)[0] is True
+
+    def test_remaining_requests(self, limiter):
+        assert limiter.get_remaining_requests(1, ActionType.PAYMENT_REQUEST) == 3
+        limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)
+        assert limiter.get_remaining_requests(1, ActionType.PAYMENT_REQUEST) == 2
+        assert limiter.get_remaining_requests(1, ActionType.API_CALL) is None
+
+    def test_remaining_does_not_track_new_keys(self, limiter):
+        limiter.get_remaining_requests(42, ActionType.PAYMENT_REQUEST)
+        assert len(limiter) == 0
+
+    def test_reset_user_limits(self, limiter):
+        for _ in range(3):
+            limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)
+        limiter.reset_user_limits(1)
+        assert limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)[0] is True
+
+    def test_unlimited_action(self, limiter):
+        assert limiter.is_allowed(1, ActionType.API_CALL) == (True, None)
+
+    def test_gcra_refills_over_time(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("neonpay.security.time.time", lambda: now[0])
+        limiter = RateLimiter("gcra")
+        limiter.set_limit(ActionType.PAYMENT_REQUEST, 3, 60)
+
+        for _ in range(3):
+            assert limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)[0] is True
+        assert limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)[0] is False
+
+        now[0] += 20  # one emission interval
+        assert limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)[0] is True
+        assert limiter.is_allowed(1, ActionType.PAYMENT_REQUEST)[0] is False
+
+    def test_invalid_algorithm(self):
+        with pytest.raises(ValueError):
+            RateLimiter("leaky")
+
+
+class TestSecurityManager:
+    def test_rate_limit_algorithm_option(self):
+        manager = SecurityManager(rate_limit_algorithm=RateLimitAlgorithm.GCRA)
+        for _ in range(10):
+            assert manager.check_rate_limit(1, ActionType.PAYMENT_REQUEST)[0]
+        assert manager.check_rate_limit(1, ActionType.PAYMENT_REQUEST)[0] is False
+
+
+class TestFraudDetection:
+    def test_rapid_payments_flagged_within_window(self, monkeypatch):
+        now = [time.time()]
+        monkeypatch.setattr("neonpay.security.time.time", lambda: now[0])
+        manager = SecurityManager(auto_block_enabled=False, max_risk_score=1000)
+        for _ in range(6):
+            manager.report_suspicious_activity(
+                1, "payment_completion", ThreatLevel.LOW, "Payment"
+            )
+        assert manager.detect_payment_fraud(1, 10) == (
+            True,
+            "Too many recent payments",
+        )
+
+        now[0] += 301
+        assert manager.detect_payment_fraud(1, 10) == (False, "")
+
+    def test_high_amount_payments_only_checked_for_high_amounts(self):
+        manager = SecurityManager(auto_block_enabled=False, max_risk_score=1000)
+        for _ in range(3):
+            manager.report_suspicious_activity(
+                1, "high_amount_payment", ThreatLevel.LOW, "Big payment"
+            )
+        assert manager.detect_payment_fraud(1, 500) == (False, "")
+        assert manager.detect_payment_fraud(1, 5000)[0] is True
+
+    async def test_completed_payments_feed_counters(self, mock_adapter):
+        core = NeonPayCore(mock_adapter)
+        payments = []
+        core.on_payment(payments.append)
+        for i in range(8):
+            await core._handle_payment(
+                PaymentResult(user_id=5, amount=50000, transaction_id=f"charge-{i}")
+            )
+
+        # Three high-amount payments pass, the fourth is flagged
+        assert len(payments) == 3
+        profile = core.security._find_profile(5)
+        assert profile.count_recent("payment_completion", time.time()) == 3
+        assert profile.suspicious_activities[0].event_type == "fraudulent_payment"
+
+    def test_counters_rebuilt_from_saved_profile(self):
+        manager = SecurityManager(auto_block_enabled=False, max_risk_score=1000)
+        for _ in range(6):
+            manager.report_suspicious_activity(
+                1, "payment_completion", ThreatLevel.LOW, "Payment"
+            )
+        profile = manager._find_profile(1)
+        restored = UserSecurityProfile.from_dict(profile.to_dict())
+        assert restored.count_recent("payment_completion", time.time()) == 6
+
+    def test_global_event_log_is_bounded(self, monkeypatch):
+        now = [time.time()]
+        monkeypatch.setattr("neonpay.security.time.time", lambda: now[0])
+        manager = SecurityManager(auto_block_enabled=False)
+        for _ in range(10005):
+            manager.report_suspicious_activity(1, "probe", ThreatLevel.LOW, "Probe")
+        assert manager.get_security_stats()["security_events"] == 10000
+
+        now[0] += 31 * 24 * 60 * 60
+        manager.cleanup_old_data(max_age_days=30)
+        assert manager.get_security_stats()["security_events"] == 0
+
+
+class TestRiskDecay:
+    def test_score_halves_every_half_life(self, monkeypatch):
+        now = [time.time()]
+        monkeypatch.setattr("neonpay.security.time.time", lambda: now[0])
+        manager = SecurityManager(risk_half_life=3600)
+        manager.report_suspicious_activity(1, "probe", ThreatLevel.HIGH, "Probe")
+        assert manager.get_user_risk_assessment(1)["risk_score"] == 15
+
+        now[0] += 3600
+        assert manager.get_user_risk_assessment(1)["risk_score"] == 7.5
+
+        # New activity adds to the decayed score
+        manager.report_suspicious_activity(1, "probe", ThreatLevel.HIGH, "Probe")
+        assert manager.get_user_risk_assessment(1)["risk_score"] == 22.5
+
+    def test_decayed_score_no_longer_flags_payments(self, monkeypatch):
+        now = [time.time()]
+        monkeypatch.setattr("neonpay.security.time.time", lambda: now[0])
+        manager = SecurityManager(
+            auto_block_enabled=False, max_risk_score=40, risk_half_life=60
+        )
+        manager.report_suspicious_activity(1, "probe", ThreatLevel.CRITICAL, "Probe")
+        assert manager.detect_payment_fraud(1, 10) == (True, "High risk score")
+
+        now[0] += 60
+        assert manager.detect_payment_fraud(1, 10) == (False, "")
+
+    def test_custom_threat_weights(self):
+        manager = SecurityManager(threat_weights={ThreatLevel.LOW: 30})
+        manager.report_suspicious_activity(1, "probe", ThreatLevel.LOW, "Probe")
+        assert manager.get_user_risk_assessment(1)["risk_score"] == 30
+
+        with pytest.raises(ValueError):
+            SecurityManager(threat_weights={ThreatLevel.LOW: -1})
+        with pytest.raises(ValueError):
+            SecurityManager(risk_half_life=0)
+
+
+class TestEviction:
+    def test_idle_rate_limit_keys_are_evicted(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("neonpay.security.time.time", lambda: now[0])
+        limiter = RateLimiter()
+        limiter.set_limit(ActionType.PAYMENT_REQUEST, 3, 60)
+
+        for user_id in range(1, 101):
+            limiter.is_allowed(user_id, ActionType.PAYMENT_REQUEST)
+        assert len(limiter) == 100
+
+        now[0] += 120
+        for user_id in range(1000, 1100):
+            limiter.is_allowed(user_id, ActionType.PAYMENT_REQUEST)
+
+        stats = limiter.get_eviction_stats()
+        assert stats["idle_evictions"] == 100
+        assert len(limiter) == 100
+
+    def test_rate_limit_key_cap(self):
+        limiter = RateLimiter(max_keys=10)
+        limiter.set_limit(ActionType.PAYMENT_REQUEST, 3, 60)
+        for user_id in range(1, 101):
+            limiter.is_allowed(user_id, ActionType.PAYMENT_REQUEST)
+        assert len(limiter) == 10
+        assert limiter.get_eviction_stats()["capacity_evictions"] == 90
+
+    def test_rate_limit_checks_do_not_create_profiles(self):
+        manager = SecurityManager()
+        for user_id in range(1, 1001):
+            manager.check_rate_limit(user_id, ActionType.PAYMENT_REQUEST)
+            manager.detect_payment_fraud(user_id, 100)
+        assert manager.get_security_stats()["total_users"] == 0
+
+    def test_profile_cap_keeps_blocked_users(self):
+        manager = SecurityManager(max_profiles=10)
+        manager.block_user(1)
+        manager.trust_user(2)
+        for user_id in range(3, 50):
+            manager.unblock_user(user_id)
+
+        stats = manager.get_security_stats()
+        assert stats["total_users"] <= 10
+        assert manager.is_user_blocked(1)
+        assert manager.get_user_risk_assessment(2)["is_trusted"] is True
+        evictions = stats["evictions"]
+        assert evictions["profiles_idle"] + evictions["profiles_capacity"] > 0
+
+    def test_idle_sweep_keeps_access_order(self):
+        manager = SecurityManager(max_profiles=3)
+        for user_id in (1, 2, 3):
+            manager.report_suspicious_activity(user_id, "probe", ThreatLevel.LOW, "")
+        # Touch user 1 so user 2 becomes least recently used
+        manager.report_suspicious_activity(1, "probe", ThreatLevel.LOW, "")
+        manager.report_suspicious_activity(4, "probe", ThreatLevel.LOW, "")
+
+        assert list(manager._user_profiles) == [3, 1, 4]
@@ -0,0 +1,224 @@
+import time
+
+import pytest
+
+from neonpay.core import NeonPayCore, PaymentStage
+from neonpay.promotions import PromoSystem
+from neonpay.security import SecurityManager, ThreatLevel
+from neonpay.storage import (
+    PAYMENT_QUEUE,
+    SECURITY_PROFILES,
+    MemoryStorage,
+    SQLiteStorage,
+)
+from neonpay.subscriptions import SubscriptionManager, SubscriptionStatus
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryStorage()
+    else:
+        backend = SQLiteStorage(str(tmp_path / "neonpay.db"))
+        yield backend
+        backend.close()
+
+
+class TestSQLiteStorage:
+    def test_reads_see_buffered_writes(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "db"), batch_size=100, flush_interval=60)
+        storage.save("items", "a", {"value": 1}, user_id=7)
+        storage.delete("items", "missing")
+
+        assert storage.get_stats()["pending_writes"] == 2
+        assert storage.load("items", "a") == {"value": 1}
+        assert storage.load_by_user("items", 7) == [{"value": 1}]
+        assert storage.get_stats()["pending_writes"] == 0
+
+        storage.delete("items", "a")
+        assert storage.load("items", "a") is None
+        storage.close()
+
+    def test_batches_writes(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "db"), batch_size=10, flush_interval=60)
+        for i in range(25):
+            storage.save("items", str(i % 5), {"value": i})
+
+        # Repeated saves of a key coalesce while buffered
+        assert storage.get_stats()["batches"] == 0
+        storage.flush()
+        assert storage.get_stats()["written"] == 5
+        assert dict(storage.load_all("items"))["4"] == {"value": 24}
+        storage.close()
+
+    def test_data_survives_reopen(self, tmp_path):
+        path = str(tmp_path / "db")
+        storage = SQLiteStorage(path, flush_interval=60)
+        storage.save("items", "a", {"value": 1})
+        storage.close()
+
+        reopened = SQLiteStorage(path)
+        assert reopened.load("items", "a") == {"value": 1}
+        reopened.close()
+
+    def test_save_buffers_a_snapshot(self, tmp_path):
+        class Record:
+            def __init__(self):
+                self.values = {"a": 1}
+
+            def to_dict(self):
+                return {"values": dict(self.values)}
+
+        storage = SQLiteStorage(str(tmp_path / "db"), flush_interval=60)
+        record = Record()
+        storage.save("items", "a", record)
+        # Changed after the save; stored only by the next save
+        record.values["b"] = 2
+        storage.flush()
+        assert storage.load("items", "a") == {"values": {"a": 1}}
+        storage.close()
+
+    def test_background_flush(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "db"), flush_interval=0.05)
+        storage.save("items", "a", {"value": 1})
+        deadline = time.monotonic() + 2
+        while storage.get_stats()["pending_writes"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert storage.get_stats()["pending_writes"] == 0
+        storage.close()
+
+    def test_write_through_collections(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "db"), flush_interval=60)
+        storage.save("items", "a", {"value": 1})
+        storage.save(PAYMENT_QUEUE, "charge-1", {"result": {}})
+
+        # Written together with the earlier buffered change
+        assert storage.get_stats()["pending_writes"] == 0
+        storage.delete(PAYMENT_QUEUE, "charge-1")
+        assert storage.get_stats()["pending_writes"] == 0
+        storage.close()
+
+    def test_invalid_batch_size(self, tmp_path):
+        with pytest.raises(ValueError):
+            SQLiteStorage(str(tmp_path / "db"), batch_size=0)
+
+
+def test_delete_older_than(storage):
+    storage.save("items", "old", {"value": 1})
+    storage.save("other", "old", {"value": 2})
+
+    assert storage.delete_older_than("items", time.time() - 60) == 0
+    assert storage.delete_older_than("items", time.time() + 60) == 1
+    assert storage.load_all("items") == []
+    assert storage.load("other", "old") == {"value": 2}
+
+
+class TestWarmRestart:
+    def test_core_state_restored(self, storage, mock_adapter):
+        core = NeonPayCore(mock_adapter, storage=storage)
+        core.create_payment_stage(
+            "premium",
+            PaymentStage("Premium", "Premium access", 100, payload={"tier": 1}),
+        )
+        core.create_payment_stage("basic", PaymentStage("Basic", "Basic access", 10))
+        core.remove_payment_stage("basic")
+        core.create_promo_code("SAVE10", "percentage", 10, user_limit=2)
+        core.promotions.apply_promo_code("SAVE10", 42, 100)
+        core.create_subscription_plan(
+            "monthly", "Monthly", "Monthly plan", 50, "monthly"
+        )
+        subscription = core.subscribe_user(42, "monthly")
+        core.subscriptions.process_payment(subscription.subscription_id, 50)
+        core.flush_storage()
+
+        restored = NeonPayCore(mock_adapter, storage=storage)
+
+        assert list(restored.list_payment_stages()) == ["premium"]
+        assert restored.get_payment_stage("premium").payload == {"tier": 1}
+
+        promo = restored.promotions.get_promo_code("SAVE10")
+        assert promo.used_count == 1
+        assert promo.used_by == {42: 1}
+        assert promo.is_valid(42, 100)[0]
+
+        [restored_sub] = restored.get_user_subscriptions(42)
+        assert restored_sub.plan is restored.subscriptions.get_plan("monthly")
+        assert restored_sub.status == SubscriptionStatus.ACTIVE
+        assert restored_sub.next_billing_at == subscription.next_billing_at
+        stats = restored.subscriptions.get_stats()
+        assert stats["active_subscriptions"] == 1
+        assert stats["total_revenue"] == 50
+        assert restored.subscriptions.next_deadline() == subscription.next_billing_at
+
+    async def test_core_close_flushes_storage(self, tmp_path, mock_adapter):
+        storage = SQLiteStorage(str(tmp_path / "db"), flush_interval=60)
+        core = NeonPayCore(mock_adapter, storage=storage)
+        core.create_payment_stage("basic", PaymentStage("Basic", "Basic access", 10))
+        assert storage.get_stats()["pending_writes"] == 1
+
+        await core.close()
+        assert storage.get_stats()["pending_writes"] == 0
+        storage.close()
+
+    def test_promo_changes_persisted(self, storage):
+        promos = PromoSystem(storage=storage)
+        promos.create_promo_code("OFF", "fixed_amount", 5)
+        promos.create_promo_code("GONE", "fixed_amount", 5)
+        promos.deactivate_promo_code("OFF")
+        promos.delete_promo_code("GONE")
+
+        restored = PromoSystem(storage=storage)
+        assert restored.get_promo_code("GONE") is None
+        assert not restored.get_promo_code("OFF").active
+
+    def test_cancelled_subscription_restored(self, storage):
+        manager = SubscriptionManager(storage=storage)
+        manager.create_plan("monthly", "Monthly", "Monthly plan", 50, "monthly")
+        manager.subscribe_user(1, "monthly", "sub")
+        manager.cancel_subscription("sub")
+
+        restored = SubscriptionManager(storage=storage)
+        subscription = restored.get_subscription("sub")
+        assert subscription.status == SubscriptionStatus.CANCELLED
+        assert subscription.cancelled_at is not None
+        assert restored.get_plan_subscriber_count("monthly") == 0
+
+
+class TestSecurityProfiles:
+    def test_block_survives_restart(self, storage):
+        security = SecurityManager(storage=storage)
+        security.block_user(1, duration=3600)
+        security.trust_user(2)
+
+        restored = SecurityManager(storage=storage)
+        assert restored.is_user_blocked(1)
+        assert restored.get_user_risk_assessment(2)["is_trusted"]
+        assert not restored.is_user_blocked(3)
+
+    def test_block_checks_skip_profiles(self, storage):
+        security = SecurityManager(storage=storage)
+        security.block_user(1)
+        security.block_user(2, duration=3600)
+        security.unblock_user(2)
+        security.report_suspicious_activity(3, "login", ThreatLevel.LOW, "Odd")
+
+        restored = SecurityManager(storage=storage)
+        assert restored.is_user_blocked(1)
+        assert not restored.is_user_blocked(2)
+        assert not restored.is_user_blocked(3)
+        # Answered from the blocked-user index alone
+        assert not restored._user_profiles
+
+    def test_evicted_profile_read_back(self, storage):
+        security = SecurityManager(storage=storage, max_profiles=1)
+        security.report_suspicious_activity(
+            1, "payment_completion", ThreatLevel.HIGH, "Suspicious"
+        )
+        security.report_suspicious_activity(2, "login", ThreatLevel.LOW, "Odd")
+        assert 1 not in security._user_profiles
+
+        assessment = security.get_user_risk_assessment(1)
+        assert assessment["risk_score"] == 15
+        assert assessment["suspicious_activities_count"] == 1
+        assert storage.load_by_user(SECURITY_PROFILES, 1)[0]["user_id"] == 1
@@ -0,0 +1,144 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from neonpay.subscriptions import SubscriptionManager, SubscriptionStatus
+
+
+@pytest.fixture
+def manager():
+    manager = SubscriptionManager()
+    manager.create_plan("monthly", "Monthly", "Monthly plan", 100, "monthly")
+    return manager
+
+
+class TestScheduler:
+    async def test_only_due_subscriptions_renew(self, manager):
+        due = manager.subscribe_user(1, "monthly", "sub_due")
+        later = manager.subscribe_user(2, "monthly", "sub_later")
+        due.next_billing_at = time.time() - 1
+        manager.reschedule("sub_due")
+
+        assert await manager._check_renewals() == [due]
+        # Each billing date is reported once
+        assert await manager._check_renewals() == []
+        assert later.status == SubscriptionStatus.ACTIVE
+
+    async def test_superseded_deadlines_ignored(self, manager):
+        subscription = manager.subscribe_user(1, "monthly", "sub")
+        subscription.next_billing_at = time.time() - 1
+        manager.reschedule("sub")
+        manager.process_payment("sub", 100)
+
+        assert await manager._check_renewals() == []
+        assert manager.next_deadline() == subscription.next_billing_at
+
+    async def test_paused_and_cancelled_not_renewed(self, manager):
+        paused = manager.subscribe_user(1, "monthly", "paused")
+        cancelled = manager.subscribe_user(2, "monthly", "cancelled")
+        for subscription in (paused, cancelled):
+            subscription.next_billing_at = time.time() - 1
+            manager.reschedule(subscription.subscription_id)
+        manager.pause_subscription("paused")
+        manager.cancel_subscription("cancelled")
+
+        assert await manager._check_renewals() == []
+
+    async def test_immediate_cancel_expires(self, manager):
+        expired = []
+        manager.on_expiration(expired.append)
+        manager.subscribe_user(1, "monthly", "sub")
+        manager.cancel_subscription("sub", immediate=True)
+        await asyncio.sleep(0.001)
+
+        assert [s.subscription_id for s in await manager._check_expirations()] == [
+            "sub"
+        ]
+        assert manager.get_subscription("sub").status == SubscriptionStatus.EXPIRED
+        assert len(expired) == 1
+
+    async def test_driver_fires_on_deadline(self, manager):
+        renewed = asyncio.Event()
+        manager.on_renewal(lambda subscription: renewed.set())
+        await manager.start_scheduler(max_sleep=5)
+        try:
+            subscription = manager.subscribe_user(1, "monthly", "sub")
+            await asyncio.sleep(0.01)
+            # An earlier deadline wakes the sleeping driver
+            subscription.next_billing_at = time.time() + 0.05
+            manager.reschedule("sub")
+            await asyncio.wait_for(renewed.wait(), timeout=1)
+        finally:
+            await manager.stop_scheduler()
+
+    def test_stale_entries_compacted(self, manager):
+        subscription = manager.subscribe_user(1, "monthly", "sub")
+        for offset in range(500):
+            subscription.next_billing_at = time.time() + 1000 + offset
+            manager.reschedule("sub")
+
+        assert len(manager._renewal_queue) <= 2 * 1 + 64 + 1
+
+    async def test_schedule_entry_dropped_when_both_deadlines_fire(self, manager):
+        subscription = manager.subscribe_user(1, "monthly", "sub")
+        subscription.next_billing_at = time.time() - 2
+        subscription.expires_at = time.time() - 1
+        manager.reschedule("sub")
+
+        await manager._check_renewals()
+        assert "sub" in manager._scheduled
+        await manager._check_expirations()
+        assert "sub" not in manager._scheduled
+        assert manager.next_deadline() is None
+
+        # A new deadline schedules it again
+        subscription.next_billing_at = time.time() + 100
+        subscription.expires_at = time.time() + 200
+        manager.reschedule("sub")
+        assert manager.next_deadline() == subscription.next_billing_at
+
+
+class TestCounters:
+    def test_counters_match_full_scan(self, manager):
+        manager.create_plan("trial", "Trial", "Trial plan", 50, "weekly", trial_days=7)
+        rng = random.Random(3)
+        for i in range(200):
+            manager.subscribe_user(i, rng.choice(["monthly", "trial"]), f"sub_{i}")
+
+        for _ in range(600):
+            subscription_id = f"sub_{rng.randrange(200)}"
+            action = rng.choice(["cancel", "pause", "resume", "pay"])
+            if action == "cancel":
+                manager.cancel_subscription(subscription_id, immediate=True)
+            elif action == "pause":
+                manager.pause_subscription(subscription_id)
+            elif action == "resume":
+                manager.resume_subscription(subscription_id)
+            else:
+                manager.process_payment(subscription_id, rng.randint(1, 100))
+
+        subscriptions = list(manager._subscriptions.values())
+        stats = manager.get_stats()
+        assert stats["active_subscriptions"] == sum(
+            s.is_active() for s in subscriptions
+        )
+        assert stats["total_revenue"] == sum(s.total_paid for s in subscriptions)
+        for status in SubscriptionStatus:
+            assert stats["subscriptions_by_status"][status.value] == sum(
+                s.status == status for s in subscriptions
+            )
+        assert manager.get_plan_subscriber_count("monthly") == sum(
+            s.is_active() and s.plan.plan_id == "monthly" for s in subscriptions
+        )
+
+    async def test_max_subscribers_uses_active_count(self, manager):
+        manager.create_plan("vip", "VIP", "VIP plan", 500, "monthly", max_subscribers=1)
+        manager.subscribe_user(1, "vip", "vip_1")
+        with pytest.raises(ValueError):
+            manager.subscribe_user(2, "vip", "vip_2")
+
+        manager.cancel_subscription("vip_1", immediate=True)
+        manager.subscribe_user(2, "vip", "vip_2")
+        assert manager.get_plan_subscriber_count("vip") == 1